@@ -29,6 +29,8 @@ from pathlib import Path
 from pyfaidx import Fasta
 from collections import defaultdict
 
+from sequence_arrays import window_coordinates
+
 # Set paths
 BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
 DATA_DIR = BASE_DIR / 'data'
@@ -114,25 +116,16 @@ def extract_2kb_sequence(genome, chromosome, start, end, strand, variant_seq):
     ncbi_chr = CHR_MAP[chromosome]
     
     try:
-        # Calculate center and extract 2048bp window
+        # 2048bp window centered on variant (1024bp on each side, pinned at 0)
+        # and where the variant goes inside it; stage 05 reuses this arithmetic
         variant_len = len(variant_seq)
-        center = (start + end) // 2
-        
-        # Define 2048bp window centered on variant (1024bp on each side)
-        window_start = center - 1024
-        window_end = center + 1024
-        
-        # Ensure we don't go negative
-        if window_start < 0:
-            window_start = 0
-            window_end = 2048
+        window_start, window_end, variant_start_in_window = (
+            int(v) for v in window_coordinates(start, end, variant_len)
+        )
         
         # Extract full 2048bp from genome (using 0-based coordinates)
         full_seq = str(genome[ncbi_chr][window_start:window_end])
         
-        # Calculate where to insert the variant in the 2048bp window
-        variant_offset_in_window = center - window_start
-        variant_start_in_window = variant_offset_in_window - variant_len // 2
         variant_end_in_window = variant_start_in_window + variant_len
         
         # Replace the center region with variant sequence
@@ -272,6 +265,10 @@ def main():
     print("="*60)
     combined_data = pd.concat([pool6_data, pool7_data], ignore_index=True)
     
+    # Integer key for every variant; later stages join on this instead of
+    # variant_id strings (variant_id is shared by all mutants of one site)
+    combined_data['variant_idx'] = np.arange(len(combined_data), dtype=np.int64)
+    
     print(f"\nTotal variants processed: {len(combined_data):,}")
     
     # Summary statistics
@@ -302,7 +299,7 @@ def main():
     
     # Select columns to save
     output_cols = [
-        'variant_id', 'variant_name', 'sequence_2kb', 'variant_seq',
+        'variant_idx', 'variant_id', 'variant_name', 'sequence_2kb', 'variant_seq',
         'chromosome', 'start', 'end', 'strand', 'tf_info',
         'log2_ratio', 'activity', 'rna_count', 'dna_count', 'pool'
     ]
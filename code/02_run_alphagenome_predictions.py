@@ -18,10 +18,92 @@ This script:
 4. Collects multiple prediction metrics (DNase, CAGE, RNA-seq)
 5. Saves predictions alongside MPRA measurements
 6. Can resume from last checkpoint if interrupted
+7. Streams every prediction into online correlation accumulators and
+   refreshes benchmark_summary_partial.csv at each checkpoint
+
+With --mode variant, each record is submitted as a (reference window,
+alternative allele) pair through AlphaGenome's variant prediction API: one
+predict_variant call returns REF and ALT tracks for DNase, RNA-seq and CAGE
+together. ALT summaries fill the usual metric columns and REF summaries the
+wt_* columns. Records sharing a site (same window and alleles) reuse one
+request. The interval is sent in the MPRA (mm9) coordinates, but the
+server's mouse reference is not mm9, so the predicted window and REF
+allele can differ from the mm9 sequence: stage 05 only uses the wt_*
+columns with --use-variant-wt and otherwise reconstructs WT from mm9.
+check_variant_predictions.py checks the REF/ALT summary mapping offline.
+
+With --ontologies, each sequence is predicted for every listed cell type in
+one predict_sequence call (all three output types, all ontology terms).
+Per-ontology summaries are written to the long-format
+alphagenome_predictions_by_ontology.csv (one row per variant × ontology);
+the first ontology also fills the usual metric columns for stages 03-06.
+
+The scalar metrics average every returned track of an output type together.
+Per-track mean, max and center values are kept as well and written as one
+variant × track matrix per output type (track_summaries_{dnase,rna,cage}.csv)
+with the track metadata in track_metadata.csv, for stage 03 --per-track.
+
+With --batch-size N (sequence mode), sequences are submitted N at a time
+through the client's multi-sequence interface, all three output types per
+request; members that fail are retried one at a time. Each batch's latency
+is logged to batch_latency.csv (see prediction_batches.py).
+
+With --shard i/N only the records whose variant_name hashes to shard i are
+predicted; checkpoints and results go to shards/shard_{i:03d}_of_{N:03d}/
+with a manifest, and prediction_shards.py validates and merges the N
+shards. Shards always read the stage 01 output, since that is the table
+the merge checks them against (--input is rejected with --shard).
+
+Requests go through a ClientPool (client_pool.py): every key listed in
+ALPHA_GENOME_API_KEYS is used, calls go to the least-loaded healthy key, and
+keys that hit their quota are quarantined for --key-cooldown seconds.
+--channels opens several client connections per key; batched requests are
+then fanned out over them, with per-client latency in the usage report.
+Per-key utilization is printed and saved to api_key_usage.csv.
+
+--record CASSETTE stores every API response with its latency in a local
+cassette (api_cassette.py); --replay CASSETTE answers the same requests from
+it, without an API key, sleeping for the recorded latency scaled by
+--replay-speed, for deterministic offline performance runs.
+
+Failed records are queued (failed_queue.csv) and retried one request at a
+time after the main pass, in --retry-rounds rounds with exponential backoff;
+records that still fail go to dead_letter.csv with their error class, and
+--retry-failed later re-attempts only those (see failed_work.py).
+
+Records are predicted in --schedule order (prediction_schedule.py): input
+order by default, interleaved across pool, chromosome and TF with
+--schedule stratified so every checkpoint's partial summary is
+representative, or --priority-tfs first.
+--max-variants N predicts only the first N records of the schedule. Final
+results are written in input order.
+
+--stop-when-ci dnase_center=0.05 ... stops the run once the confidence
+interval of every listed correlation is narrow enough (checked every
+--stop-check-every records); the stopping point, intervals and sample
+composition are written to early_stopping.json (sequential_stopping.py).
+It requires --schedule stratified: input order and priority order both
+put a biased prefix of the library first.
+
+Request latency (p50/p95/p99 per output type), requests per second,
+requests in flight, errors, retries and cache hit rate are appended to
+telemetry.jsonl and written as a Prometheus textfile every
+--telemetry-interval seconds (prediction_telemetry.py); progress lines show
+the ETA from the live throughput.
+
+With --chunk-size N the input is streamed N records at a time in input
+order and each chunk's results are appended to the result files before the
+next chunk is read; result rows carry no sequence, the retry pass patches
+recovered records into the files in place, and the final summary is read
+back in chunks, so peak memory stays flat in the number of variants
+(chunked_tables.py; measured by benchmark_streaming_memory.py). A restarted
+run continues after the last record written. --input and --output-dir point
+the stage at another prepared table and result directory.
 """
 
 import os
 import sys
+import argparse
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -34,7 +116,28 @@ from datetime import datetime
 from dotenv import load_dotenv
 from alphagenome.data import genome
 from alphagenome.models import dna_client
-from alphagenome.models import variant_scorers
+
+from streaming_stats import StratifiedAccumulators, PREDICTION_METRICS
+from client_pool import ClientPool, load_api_keys, DEFAULT_COOLDOWN
+from api_cassette import cassette_client_factory, REPLAY_KEY
+from sequence_arrays import window_coordinates
+from prediction_shards import parse_shard, shard_of, shard_directory, write_manifest, SHARD_KEY
+from failed_work import (
+    FailedWorkQueue, retry_queue, dead_letter, FAILED_QUEUE_NAME, DEAD_LETTER_NAME,
+    DEFAULT_RETRY_ROUNDS, DEFAULT_BACKOFF,
+)
+from prediction_schedule import (
+    schedule_order, stratum_labels, composition_gap, composition_table, SCHEDULE_POLICIES, DEFAULT_POLICY, DEFAULT_STRATA, DEFAULT_SEED,
+)
+from sequential_stopping import (
+    StoppingRule, parse_target, write_stopping_record, STOPPING_FILE, STOPPING_TRACE_FILE,
+    DEFAULT_CONFIDENCE, DEFAULT_MIN_VARIANTS, DEFAULT_CHECK_EVERY,
+)
+from prediction_telemetry import Telemetry, TELEMETRY_FILE, PROMETHEUS_FILE, DEFAULT_INTERVAL, format_duration
+from chunked_tables import CsvAppender, patch_csv, truncate_csv, write_json_atomic, column_summary, peak_rss_mb
+from prediction_batches import (
+    predict_batch, log_batch_latency, latency_summary, DEFAULT_MAX_WORKERS
+)
 
 # Set paths
 BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
@@ -47,17 +150,69 @@ CHECKPOINT_DIR = OUTPUT_DIR / 'checkpoints'
 CHECKPOINT_DIR.mkdir(exist_ok=True)
 CHECKPOINT_INTERVAL = 100  # Save every 100 sequences
 
-# Load API key
+# Genome reference (variant mode reads REF alleles from it)
+GENOME_FILE = BASE_DIR / 'data' / 'mm9_ref' / 'mm9_genome.fna'
+
+# Chromosome name mapping (UCSC to NCBI RefSeq)
+CHR_MAP = {
+    'chr1': 'NC_000067.5', 'chr2': 'NC_000068.6', 'chr3': 'NC_000069.5',
+    'chr4': 'NC_000070.5', 'chr5': 'NC_000071.5', 'chr6': 'NC_000072.5',
+    'chr7': 'NC_000073.5', 'chr8': 'NC_000074.5', 'chr9': 'NC_000075.5',
+    'chr10': 'NC_000076.5', 'chr11': 'NC_000077.5', 'chr12': 'NC_000078.5',
+    'chr13': 'NC_000079.5', 'chr14': 'NC_000080.5', 'chr15': 'NC_000081.5',
+    'chr16': 'NC_000082.5', 'chr17': 'NC_000083.5', 'chr18': 'NC_000084.5',
+    'chr19': 'NC_000085.5', 'chrX': 'NC_000086.6', 'chrY': 'NC_000087.6'
+}
+
+# Prediction summaries written per record (wt_* copies in variant mode)
+SUMMARY_METRICS = [
+    'dnase_mean', 'dnase_max', 'dnase_center',
+    'rna_mean', 'rna_max', 'rna_center',
+    'cage_mean', 'cage_max', 'cage_center',
+]
+
+# (metric prefix, output attribute) for the three requested track types
+TRACK_OUTPUTS = [('dnase', 'dnase'), ('rna', 'rna_seq'), ('cage', 'cage')]
+
+# K562 is an erythroleukemia cell line; the default single cell type
+DEFAULT_ONTOLOGY = 'EFO:0002067'
+
+# Per-ontology prediction columns are named '{metric}@{ontology term}'
+ONTOLOGY_SEPARATOR = '@'
+
+# Per-track values are carried as '{output}_{stat}[{track index}]' columns in
+# checkpoints and split into track_summaries_{output}.csv at the end
+TRACK_METADATA_FILE = OUTPUT_DIR / 'track_metadata.csv'
+
+# Track metadata of each output type, captured from the first response
+TRACK_METADATA = {}
+
+# Latency of every batched submission (--batch-size)
+BATCH_LATENCY_FILE = OUTPUT_DIR / 'batch_latency.csv'
+
+# Live correlation summary refreshed at every checkpoint; accumulator state
+# is overwritten in place (only the latest checkpoint's state is needed)
+PARTIAL_SUMMARY_FILE = OUTPUT_DIR / 'benchmark_summary_partial.csv'
+ACCUMULATOR_STATE_FILE = CHECKPOINT_DIR / 'accumulators_state.json'
+
+# Progress of a --chunk-size run: records written and the last variant_idx
+STREAM_STATE_FILE = CHECKPOINT_DIR / 'stream_state.json'
+
+# Pause after every request (or batch) to stay clear of rate limits; 0 when replaying a cassette
+REQUEST_PAUSE = 0.05
+
+# Where this run's results, checkpoints and side outputs go (a shard directory with --shard)
+RUN_DIR = OUTPUT_DIR
+
+# Load API keys (ALPHA_GENOME_API_KEYS for a pool, or a single ALPHA_GENOME_API_KEY)
 env_path = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/Alpha_genome_quickstart_notebook/.env')
 load_dotenv(env_path)
-api_key = os.getenv('ALPHA_GENOME_API_KEY') or os.getenv('ALPHA_GENOME_KEY')
 
-if not api_key:
-    raise RuntimeError('Missing ALPHA_GENOME_API_KEY in environment. Check the .env file.')
+# ClientPool over all API keys; created in main() from the command-line options
+dna_model = None
 
-print("Initializing AlphaGenome model...")
-dna_model = dna_client.create(api_key)
-print("✓ Model initialized")
+# Request latency, throughput and cache telemetry; replaced in main() by one that writes files
+TELEMETRY = Telemetry()
 
 def predict_for_sequence(sequence, variant_id, cell_line='K562'):
     """
@@ -85,6 +240,7 @@ def predict_for_sequence(sequence, variant_id, cell_line='K562'):
         
         # Extract prediction values (average over the sequence)
         dnase_values = output_dnase.dnase.values
+        add_track_summaries(predictions, 'dnase', output_dnase.dnase)
         predictions['dnase_mean'] = float(np.mean(dnase_values))
         predictions['dnase_max'] = float(np.max(dnase_values))
         predictions['dnase_center'] = float(np.mean(dnase_values[900:1100]))  # Central region
@@ -97,6 +253,7 @@ def predict_for_sequence(sequence, variant_id, cell_line='K562'):
         )
         
         rna_values = output_rna.rna_seq.values
+        add_track_summaries(predictions, 'rna', output_rna.rna_seq)
         predictions['rna_mean'] = float(np.mean(rna_values))
         predictions['rna_max'] = float(np.max(rna_values))
         predictions['rna_center'] = float(np.mean(rna_values[900:1100]))
@@ -109,6 +266,7 @@ def predict_for_sequence(sequence, variant_id, cell_line='K562'):
         )
         
         cage_values = output_cage.cage.values
+        add_track_summaries(predictions, 'cage', output_cage.cage)
         predictions['cage_mean'] = float(np.mean(cage_values))
         predictions['cage_max'] = float(np.max(cage_values))
         predictions['cage_center'] = float(np.mean(cage_values[900:1100]))
@@ -120,6 +278,7 @@ def predict_for_sequence(sequence, variant_id, cell_line='K562'):
         print(f"  Error predicting {variant_id}: {e}")
         predictions['success'] = False
         predictions['error'] = str(e)
+        predictions['error_class'] = type(e).__name__
         # Fill with NaN
         for key in ['dnase_mean', 'dnase_max', 'dnase_center',
                     'rna_mean', 'rna_max', 'rna_center',
@@ -128,11 +287,301 @@ def predict_for_sequence(sequence, variant_id, cell_line='K562'):
     
     return predictions
 
-def save_checkpoint(results_df, checkpoint_num, start_time):
-    """Save checkpoint to disk."""
+def add_track_summaries(predictions, name, tracks, strand='+'):
+    """
+    Add per-track mean, max and central-200bp values of one output type to
+    predictions, and remember the tracks' metadata the first time it is seen.
+    """
+    values = tracks.values
+    if strand == '-':
+        values = values[::-1]
+    per_track = {
+        'mean': np.mean(values, axis=0),
+        'max': np.max(values, axis=0),
+        'center': np.mean(values[900:1100], axis=0),
+    }
+    for stat, track_values in per_track.items():
+        for j, value in enumerate(track_values):
+            predictions[f'{name}_{stat}[{j}]'] = float(value)
+    if name not in TRACK_METADATA and getattr(tracks, 'metadata', None) is not None:
+        TRACK_METADATA[name] = tracks.metadata.reset_index(drop=True)
+
+def split_track_summaries(results_df):
+    """
+    Write the per-track columns as one variant × track matrix per output type
+    (plus track_metadata.csv) and return results_df without them.
+    """
+    track_cols = [c for c in results_df.columns if c.endswith(']')]
+    for name, _ in TRACK_OUTPUTS:
+        cols = [c for c in track_cols if c.startswith(f'{name}_')]
+        if cols:
+            results_df[['variant_idx'] + cols].to_csv(RUN_DIR / f'track_summaries_{name}.csv', index=False)
+    
+    write_track_metadata()
+    
+    if track_cols:
+        n_tracks = sum(c.split('_', 1)[1].startswith('center[') for c in track_cols)
+        print(f"✓ Saved per-track summaries for {n_tracks} tracks (track_summaries_*.csv)")
+    return results_df.drop(columns=track_cols)
+
+def write_track_metadata():
+    """Write the captured track metadata of every output type to track_metadata.csv."""
+    if TRACK_METADATA:
+        metadata = []
+        for name, meta in TRACK_METADATA.items():
+            meta = meta.copy()
+            meta.insert(0, 'output_type', name)
+            meta.insert(1, 'track_index', np.arange(len(meta)))
+            metadata.append(meta)
+        pd.concat(metadata, ignore_index=True).to_csv(TRACK_METADATA_FILE, index=False)
+
+def summarize_tracks(output, strand, prefix=''):
+    """
+    Mean, max and central-200bp summaries of the DNase, RNA-seq and CAGE tracks.
+    Variant-mode tracks are on the forward strand; minus-strand tracks are
+    reversed so positions match the strand-oriented sequence_2kb windows.
+    """
+    summaries = {}
+    for name, attr in TRACK_OUTPUTS:
+        values = getattr(output, attr).values
+        if strand == '-':
+            values = values[::-1]
+        if not prefix:
+            add_track_summaries(summaries, name, getattr(output, attr), strand)
+        summaries[f'{prefix}{name}_mean'] = float(np.mean(values))
+        summaries[f'{prefix}{name}_max'] = float(np.max(values))
+        summaries[f'{prefix}{name}_center'] = float(np.mean(values[900:1100]))
+    return summaries
+
+def summarize_ontology_output(output, ontology_terms, per_term=True):
+    """
+    Summaries of one response holding DNase, RNA-seq and CAGE tracks for one
+    or more ontology terms. Tracks are split by their ontology_curie metadata;
+    '{metric}@{term}' columns are added when per_term is set, and the first
+    term's summaries always fill the plain metric names.
+    """
+    summaries = {}
+    for name, attr in TRACK_OUTPUTS:
+        tracks = getattr(output, attr)
+        add_track_summaries(summaries, name, tracks)
+        curies = tracks.metadata['ontology_curie'].to_numpy()
+        for t, term in enumerate(ontology_terms):
+            values = tracks.values[:, curies == term]
+            if values.size == 0:
+                # No track of this type for this cell type
+                summary = (np.nan, np.nan, np.nan)
+            else:
+                summary = (float(np.mean(values)), float(np.max(values)),
+                           float(np.mean(values[900:1100])))
+            for stat, value in zip(('mean', 'max', 'center'), summary):
+                if per_term:
+                    summaries[f'{name}_{stat}{ONTOLOGY_SEPARATOR}{term}'] = value
+                if t == 0:
+                    summaries[f'{name}_{stat}'] = value
+    return summaries
+
+def predict_sequence_batch(sequences, variant_ids, ontology_terms=None, max_workers=DEFAULT_MAX_WORKERS,
+                           batch_size=None):
+    """
+    Predict a group of sequences with one multi-sequence submission (all three
+    output types, every ontology term); failed members are retried one at a
+    time by predict_batch. The batch latency is appended to BATCH_LATENCY_FILE.
+    Returns one prediction dictionary per sequence.
+    """
+    terms = list(ontology_terms) if ontology_terms else [DEFAULT_ONTOLOGY]
+    outputs, stats = predict_batch(
+        dna_model, sequences,
+        [dna_client.OutputType.DNASE, dna_client.OutputType.RNA_SEQ, dna_client.OutputType.CAGE],
+        terms, max_workers
+    )
+    log_batch_latency(BATCH_LATENCY_FILE, stats, batch_size or len(sequences))
+    TELEMETRY.count_retries(stats['n_retried'])
+    
+    results = []
+    for variant_id, output in zip(variant_ids, outputs):
+        predictions = {'variant_id': variant_id}
+        if isinstance(output, Exception):
+            print(f"  Error predicting {variant_id}: {output}")
+            predictions['success'] = False
+            predictions['error'] = str(output)
+            predictions['error_class'] = type(output).__name__
+            for key in SUMMARY_METRICS:
+                predictions[key] = np.nan
+                for term in (ontology_terms or []):
+                    predictions[f'{key}{ONTOLOGY_SEPARATOR}{term}'] = np.nan
+        else:
+            predictions.update(summarize_ontology_output(output, terms, per_term=bool(ontology_terms)))
+            predictions['success'] = True
+            predictions['error'] = None
+        results.append(predictions)
+    return results
+
+def predict_for_ontologies(sequence, variant_id, ontology_terms):
+    """
+    Run AlphaGenome on one 2048bp sequence for several cell types at once.
+    A single request asks for DNase, RNA-seq and CAGE in every ontology term;
+    tracks are split by their ontology_curie metadata and summarized per term.
+    Returns a dictionary with '{metric}@{term}' columns, plus the first
+    term's summaries under the plain metric names.
+    """
+    predictions = {}
+    predictions['variant_id'] = variant_id
+    
+    try:
+        if len(sequence) != 2048:
+            raise ValueError(f"Sequence length is {len(sequence)}, expected 2048")
+        
+        output = dna_model.predict_sequence(
+            sequence=sequence,
+            requested_outputs=[dna_client.OutputType.DNASE,
+                               dna_client.OutputType.RNA_SEQ,
+                               dna_client.OutputType.CAGE],
+            ontology_terms=list(ontology_terms)
+        )
+        predictions.update(summarize_ontology_output(output, ontology_terms))
+        predictions['success'] = True
+        predictions['error'] = None
+        
+    except Exception as e:
+        print(f"  Error predicting {variant_id}: {e}")
+        predictions['success'] = False
+        predictions['error'] = str(e)
+        predictions['error_class'] = type(e).__name__
+        for key in SUMMARY_METRICS:
+            predictions[key] = np.nan
+            for term in ontology_terms:
+                predictions[f'{key}{ONTOLOGY_SEPARATOR}{term}'] = np.nan
+    
+    return predictions
+
+def ontology_long_table(results_df, ontology_terms):
+    """
+    Reshape '{metric}@{term}' columns into one row per variant × ontology.
+    """
+    id_cols = [c for c in ['variant_idx', 'variant_id', 'variant_name', 'mpra_log2_ratio', 'success']
+               if c in results_df.columns]
+    frames = []
+    for term in ontology_terms:
+        columns = {f'{key}{ONTOLOGY_SEPARATOR}{term}': key for key in SUMMARY_METRICS}
+        frame = results_df[id_cols + list(columns)].rename(columns=columns)
+        frame.insert(1, 'ontology_term', term)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def load_genome():
+    """mm9 reference for REF alleles (variant mode)."""
+    from pyfaidx import Fasta
+    
+    print(f"Loading genome from: {GENOME_FILE}")
+    return Fasta(str(GENOME_FILE))
+
+def build_variant_requests(df, genome_ref=None, verbose=True):
+    """
+    Genomic interval and REF/ALT variant for every record, using the same
+    window arithmetic stage 01 used to build sequence_2kb.
+    REF bases come from mm9 (one lookup per distinct site); ALT is variant_seq
+    on the forward strand, exactly as stage 01 inserted it. The streaming
+    pass opens the genome once and passes it in for every chunk.
+    
+    Returns:
+        list of (Interval, Variant) tuples, None where REF could not be read
+    """
+    if genome_ref is None:
+        genome_ref = load_genome()
+    
+    alt_alleles = df['variant_seq'].astype(str).str.upper().to_numpy()
+    variant_len = np.array([len(v) for v in alt_alleles], dtype=np.int64)
+    window_start, window_end, variant_start = window_coordinates(
+        df['start'].to_numpy(), df['end'].to_numpy(), variant_len
+    )
+    ref_start = window_start + variant_start
+    
+    reference = {}
+    requests = []
+    for chrom, w_start, w_end, r_start, alt in zip(
+        df['chromosome'], window_start, window_end, ref_start, alt_alleles
+    ):
+        site = (chrom, int(r_start), len(alt))
+        if site not in reference:
+            try:
+                ref = str(genome_ref[CHR_MAP.get(chrom, chrom)][site[1]:site[1] + site[2]]).upper()
+                reference[site] = ref if len(ref) == len(alt) else None
+            except (KeyError, ValueError):
+                reference[site] = None
+        ref = reference[site]
+        if ref is None:
+            requests.append(None)
+            continue
+        requests.append((
+            genome.Interval(chromosome=chrom, start=int(w_start), end=int(w_end)),
+            # genome.Variant positions are 1-based
+            genome.Variant(chromosome=chrom, position=int(r_start) + 1,
+                           reference_bases=ref, alternate_bases=alt),
+        ))
+    
+    n_failed = sum(r is None for r in requests)
+    if verbose:
+        print(f"✓ Built {len(requests) - n_failed:,} variant requests "
+              f"({len(reference):,} distinct sites, {n_failed} without a REF allele)")
+    return requests
+
+def predict_for_variant(interval, variant, variant_id, strand, ontology_term=DEFAULT_ONTOLOGY):
+    """
+    Run one AlphaGenome variant prediction: REF and ALT tracks for DNase,
+    RNA-seq and CAGE come back from a single request.
+    Returns a dictionary of ALT summaries plus wt_* REF summaries.
+    """
+    predictions = {}
+    predictions['variant_id'] = variant_id
+    
+    try:
+        output = dna_model.predict_variant(
+            interval=interval,
+            variant=variant,
+            organism=dna_client.Organism.MUS_MUSCULUS,
+            requested_outputs=[dna_client.OutputType.DNASE,
+                               dna_client.OutputType.RNA_SEQ,
+                               dna_client.OutputType.CAGE],
+            ontology_terms=[ontology_term]
+        )
+        predictions.update(summarize_tracks(output.alternate, strand))
+        predictions.update(summarize_tracks(output.reference, strand, prefix='wt_'))
+        predictions['success'] = True
+        predictions['error'] = None
+        
+    except Exception as e:
+        print(f"  Error predicting {variant_id}: {e}")
+        predictions['success'] = False
+        predictions['error'] = str(e)
+        predictions['error_class'] = type(e).__name__
+        for key in SUMMARY_METRICS:
+            predictions[key] = np.nan
+            predictions[f'wt_{key}'] = np.nan
+    
+    return predictions
+
+def use_run_directory(run_dir):
+    """Send checkpoints, partial summaries and all result files to run_dir."""
+    global RUN_DIR, CHECKPOINT_DIR, PARTIAL_SUMMARY_FILE, ACCUMULATOR_STATE_FILE
+    global TRACK_METADATA_FILE, BATCH_LATENCY_FILE, STREAM_STATE_FILE
+    RUN_DIR = run_dir
+    CHECKPOINT_DIR = run_dir / 'checkpoints'
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    PARTIAL_SUMMARY_FILE = run_dir / 'benchmark_summary_partial.csv'
+    ACCUMULATOR_STATE_FILE = CHECKPOINT_DIR / 'accumulators_state.json'
+    STREAM_STATE_FILE = CHECKPOINT_DIR / 'stream_state.json'
+    TRACK_METADATA_FILE = run_dir / 'track_metadata.csv'
+    BATCH_LATENCY_FILE = run_dir / 'batch_latency.csv'
+
+def save_checkpoint(results_df, checkpoint_num, start_time, accumulators=None):
+    """Save checkpoint (and streaming accumulator state) to disk."""
     checkpoint_file = CHECKPOINT_DIR / f'checkpoint_{checkpoint_num:04d}.csv'
     results_df.to_csv(checkpoint_file, index=False)
     
+    if accumulators is not None:
+        accumulators.save(ACCUMULATOR_STATE_FILE, checkpoint_num=checkpoint_num)
+        accumulators.summary().to_csv(PARTIAL_SUMMARY_FILE, index=False)
+    
     elapsed = time.time() - start_time
     state = {
         'checkpoint_num': checkpoint_num,
@@ -159,21 +608,204 @@ def load_latest_checkpoint():
     print(f"✓ Loaded checkpoint {checkpoint_num} with {len(df)} predictions")
     return df, len(df)
 
-def process_all_sequences(df, resume_from=0):
+def load_latest_accumulators(existing_results=None):
+    """
+    Restore streaming accumulators saved with the latest checkpoint.
+    Falls back to folding in the existing checkpoint rows when the saved
+    state is missing or belongs to a different checkpoint.
+    """
+    checkpoint_files = sorted(CHECKPOINT_DIR.glob('checkpoint_*[0-9].csv'))
+    if ACCUMULATOR_STATE_FILE.exists() and checkpoint_files:
+        accumulators = StratifiedAccumulators.load(ACCUMULATOR_STATE_FILE)
+        latest_num = int(checkpoint_files[-1].stem.split('_')[1])
+        if accumulators.state.get('checkpoint_num') == latest_num:
+            print(f"✓ Restored streaming accumulators for checkpoint {latest_num}")
+            return accumulators
+    
+    accumulators = StratifiedAccumulators()
+    if existing_results is not None:
+        for record in existing_results.to_dict('records'):
+            accumulators.update(record)
+    return accumulators
+
+def missing_reference_predictions(variant_id):
+    """Failed variant-mode predictions for a record whose REF allele could not be read."""
+    return {'variant_id': variant_id, 'success': False, 'error': 'reference allele unavailable',
+            'error_class': 'MissingReference',
+            **{key: np.nan for key in SUMMARY_METRICS},
+            **{f'wt_{key}': np.nan for key in SUMMARY_METRICS}}
+
+def predict_single(row, ontology_terms=None, variant_request=None, variant_mode=False):
+    """One record's predictions from an individual request (no batching or request sharing)."""
+    if variant_mode:
+        if variant_request is None:
+            return missing_reference_predictions(row['variant_id'])
+        interval, variant = variant_request
+        return predict_for_variant(interval, variant, row['variant_id'], row['strand'])
+    if ontology_terms is not None:
+        return predict_for_ontologies(row['sequence_2kb'], row['variant_id'], ontology_terms)
+    return predict_for_sequence(row['sequence_2kb'], row['variant_id'])
+
+def predict_record(df, idx, variant_requests=None, ontology_terms=None, batch_size=1,
+                   max_workers=DEFAULT_MAX_WORKERS, batch_predictions=None, variant_cache=None):
+    """
+    Predictions for row idx of df (a valid 2048bp record). With batch_size > 1
+    (sequence mode), the next batch_size valid rows are submitted together
+    when the loop first reaches one of them and wait in batch_predictions.
+    In variant mode, records sharing a request reuse its result through
+    variant_cache. Otherwise each record is one (multi-ontology) request.
+    """
+    row = df.iloc[idx]
+    sequence = row['sequence_2kb']
+    variant_id = row['variant_id']
+    
+    if batch_size > 1 and variant_requests is None:
+        if idx not in batch_predictions:
+            batch_rows = [
+                i for i in range(idx, min(idx + batch_size, len(df)))
+                if isinstance(df['sequence_2kb'].iat[i], str) and len(df['sequence_2kb'].iat[i]) == 2048
+            ]
+            batch_results = predict_sequence_batch(
+                [df['sequence_2kb'].iat[i] for i in batch_rows],
+                [df['variant_id'].iat[i] for i in batch_rows],
+                ontology_terms, max_workers, batch_size
+            )
+            batch_predictions.update(zip(batch_rows, batch_results))
+            time.sleep(REQUEST_PAUSE)
+        return batch_predictions.pop(idx)
+    if ontology_terms is not None:
+        return predict_for_ontologies(sequence, variant_id, ontology_terms)
+    if variant_requests is None:
+        return predict_for_sequence(sequence, variant_id)
+    if variant_requests[idx] is None:
+        return missing_reference_predictions(variant_id)
+    
+    interval, variant = variant_requests[idx]
+    request_key = (interval.chromosome, interval.start, variant.position,
+                   variant.reference_bases, variant.alternate_bases, row['strand'])
+    TELEMETRY.cache_lookup(hit=request_key in variant_cache)
+    if request_key not in variant_cache:
+        variant_cache[request_key] = predict_for_variant(interval, variant, variant_id, row['strand'])
+    return {**variant_cache[request_key], 'variant_id': variant_id}
+
+def combine_with_record(row, idx, preds, include_sequence=True):
+    """
+    Result row: the input record's annotations and MPRA values plus its
+    predictions. The streaming pass leaves sequence_2kb out (include_sequence=False)
+    and copies it from the input chunk when the rows are written.
+    """
+    result = {
+        'variant_idx': int(row['variant_idx']) if 'variant_idx' in row else idx,
+        'variant_id': row['variant_id'],
+        'variant_name': row['variant_name'],
+        'chromosome': row['chromosome'],
+        'start': row['start'],
+        'end': row['end'],
+        'strand': row['strand'],
+        'variant_seq': row['variant_seq'],
+        'tf_info': row['tf_info'],
+        'sequence_2kb': row['sequence_2kb'],
+        'pool': row['pool'],
+        'mpra_log2_ratio': row['log2_ratio'],
+        'mpra_activity': row['activity'],
+        'mpra_rna_count': row['rna_count'],
+        'mpra_dna_count': row['dna_count'],
+        **preds
+    }
+    if not include_sequence:
+        del result['sequence_2kb']
+    return result
+
+def replace_records(results_df, records):
+    """results_df with the rows of the given result dicts replaced (matched on variant_idx, order kept)."""
+    records = list(records)
+    if not records:
+        return results_df
+    order = results_df['variant_idx'].to_numpy()
+    fixed = pd.DataFrame(records)
+    merged = pd.concat([results_df[~results_df['variant_idx'].isin(fixed['variant_idx'])], fixed],
+                       ignore_index=True)
+    return merged.set_index('variant_idx', drop=False).loc[order].reset_index(drop=True)
+
+def retry_failed_records(df, failed_queue, rounds=DEFAULT_RETRY_ROUNDS, base_delay=DEFAULT_BACKOFF,
+                         ontology_terms=None, variant_requests=None, wait_first=True):
+    """
+    Retry the queued failures one request at a time with exponential backoff
+    and move the ones that still fail to the dead-letter file.
+    variant_requests (variant mode) must align with df's rows.
+    
+    Returns:
+        list of recovered result dicts
+    """
+    position = pd.Series(np.arange(len(df)), index=df['variant_idx'].to_numpy())
+    failed_queue.keep_only(position.index)
+    
+    def attempt(variant_idx):
+        TELEMETRY.count_retries()
+        i = int(position[variant_idx])
+        row = df.iloc[i]
+        request = variant_requests[i] if variant_requests is not None else None
+        return combine_with_record(row, i, predict_single(row, ontology_terms, request, variant_requests is not None))
+    
+    print(f"\nRetrying {len(failed_queue):,} failed records ({rounds} rounds, backoff from {base_delay:g}s)...")
+    recovered = retry_queue(failed_queue, attempt, rounds, base_delay, wait_first)
+    n_dead = len(failed_queue)
+    dead = dead_letter(failed_queue, RUN_DIR / DEAD_LETTER_NAME, resolved=recovered)
+    print(f"✓ Recovered {len(recovered):,} records; {n_dead:,} moved to {DEAD_LETTER_NAME}")
+    if len(dead):
+        print(f"  Dead-lettered records by error class ({len(dead):,} total):")
+        for error_class, count in dead['error_class'].value_counts().items():
+            print(f"    {error_class:<24s} {count:,}")
+    return list(recovered.values())
+
+def load_final_results():
+    """Saved results of this run directory, with the per-track columns joined back in."""
+    results_df = pd.read_csv(RUN_DIR / 'alphagenome_predictions_all_variants.csv')
+    for name, _ in TRACK_OUTPUTS:
+        track_file = RUN_DIR / f'track_summaries_{name}.csv'
+        if track_file.exists():
+            results_df = results_df.merge(pd.read_csv(track_file), on='variant_idx', how='left')
+    return results_df
+
+def process_all_sequences(df, resume_from=0, accumulators=None, variant_requests=None,
+                          ontology_terms=None, batch_size=1, max_workers=DEFAULT_MAX_WORKERS,
+                          failed_queue=None, existing_results=None, stopping_rule=None,
+                          check_every=DEFAULT_CHECK_EVERY):
     """
     Process all sequences with checkpointing and progress tracking.
     VERSION 2: Handles 6,963 sequences with automatic checkpointing.
+    Each result is folded into the streaming accumulators as it lands.
+    With variant_requests (variant mode), each record is one predict_variant
+    call, and records sharing a request reuse its result. With several
+    ontology_terms, each record is one multi-ontology predict_sequence call.
+    With batch_size > 1, the next batch_size valid sequences are predicted
+    together in one predict_sequences submission when the loop reaches them.
+    Failed records are added to failed_queue (saved with every checkpoint).
+    Results of a resumed run start from existing_results, so checkpoints
+    and the returned table cover every record predicted so far.
+    With a stopping_rule, its CI targets are checked every check_every
+    records and the loop stops once all are met. With batch_size > 1 a
+    due check waits for the end of the current batch, so records already
+    predicted in it are kept rather than paid for and dropped.
     """
+    if accumulators is None:
+        accumulators = StratifiedAccumulators()
     results = []
+    if existing_results is not None:
+        results.extend(existing_results.to_dict('records'))
+    variant_cache = {}
+    batch_predictions = {}
+    check_due = False
     start_time = time.time()
     total = len(df)
     
     print(f"\nProcessing {total:,} sequences...")
     print(f"Starting from sequence {resume_from}")
     print(f"Checkpointing every {CHECKPOINT_INTERVAL} sequences")
-    print(f"Estimated time: ~{(total - resume_from) * 3.6:.1f} seconds ({(total - resume_from) * 3.6 / 3600:.1f} hours)")
+    print("ETA is estimated from the live throughput in every progress line")
     print("="*60)
     
+    TELEMETRY.records_total = total - resume_from
     for idx in range(resume_from, total):
         row = df.iloc[idx]
         
@@ -185,55 +817,522 @@ def process_all_sequences(df, resume_from=0):
             print(f"  Skipping invalid sequence at index {idx}: {variant_id}")
             continue
         
-        # Progress update every 50 sequences
+        # Progress update every 50 sequences, ETA from the live throughput
         if idx % 50 == 0:
             elapsed = time.time() - start_time
             if idx > resume_from:
-                rate = elapsed / (idx - resume_from)
-                remaining = (total - idx) * rate
-                eta_str = time.strftime("%H:%M:%S", time.gmtime(remaining))
-                elapsed_str = time.strftime("%H:%M:%S", time.gmtime(elapsed))
+                elapsed_str = format_duration(elapsed)
                 print(f"Progress: {idx:,}/{total:,} ({100*idx/total:.1f}%) | "
-                      f"Elapsed: {elapsed_str} | ETA: {eta_str}")
+                      f"Elapsed: {elapsed_str} | {TELEMETRY.progress_line()}")
         
         # Run predictions
-        preds = predict_for_sequence(sequence, variant_id)
+        preds = predict_record(df, idx, variant_requests, ontology_terms, batch_size, max_workers,
+                               batch_predictions, variant_cache)
         
         # Combine with original data
-        result = {
-            'variant_id': variant_id,
-            'variant_name': row['variant_name'],
-            'chromosome': row['chromosome'],
-            'start': row['start'],
-            'end': row['end'],
-            'strand': row['strand'],
-            'variant_seq': row['variant_seq'],
-            'tf_info': row['tf_info'],
-            'sequence_2kb': sequence,
-            'pool': row['pool'],
-            'mpra_log2_ratio': row['log2_ratio'],
-            'mpra_activity': row['activity'],
-            'mpra_rna_count': row['rna_count'],
-            'mpra_dna_count': row['dna_count'],
-            **preds
-        }
+        result = combine_with_record(row, idx, preds)
         
         results.append(result)
+        TELEMETRY.record_done()
+        TELEMETRY.maybe_flush()
+        if preds['success']:
+            accumulators.update(result)
+        elif failed_queue is not None:
+            failed_queue.add(result)
         
         # Checkpoint every N sequences
         if (idx + 1) % CHECKPOINT_INTERVAL == 0:
             checkpoint_num = (idx + 1) // CHECKPOINT_INTERVAL
             results_df = pd.DataFrame(results)
-            checkpoint_file = save_checkpoint(results_df, checkpoint_num, start_time)
+            checkpoint_file = save_checkpoint(results_df, checkpoint_num, start_time, accumulators)
+            if failed_queue is not None:
+                failed_queue.save()
             print(f"✓ Checkpoint saved: {checkpoint_file.name} ({len(results_df):,} sequences)")
+            print(f"  Partial summary refreshed: {PARTIAL_SUMMARY_FILE.name}")
         
-        # Brief pause to avoid rate limiting
-        time.sleep(0.05)
+        # Sequential early stopping: stop paying for predictions once the CIs are narrow enough
+        check_due = check_due or len(results) % check_every == 0
+        if stopping_rule is not None and check_due and not batch_predictions:
+            check_due = False
+            if stopping_rule.check(accumulators, len(results)):
+                print(f"\n✓ Every CI target met after {len(results):,} records; stopping early")
+                break
+        
+        # Brief pause to avoid rate limiting (once per request, not per batched record)
+        if batch_size <= 1:
+            time.sleep(REQUEST_PAUSE)
+    
+    if batch_size > 1 and variant_requests is None:
+        summary = latency_summary(BATCH_LATENCY_FILE)
+        if summary is not None:
+            print("\nBatch latency (all runs logged in batch_latency.csv):")
+            print(summary.to_string(index=False))
+    
+    if variant_requests is not None:
+        print(f"✓ Variant mode: {len(variant_cache):,} predict_variant requests "
+              f"for {len(results):,} records (REF and ALT per request)")
+    
+    # Final refresh so the partial summary reflects every prediction
+    accumulators.summary().to_csv(PARTIAL_SUMMARY_FILE, index=False)
     
     return pd.DataFrame(results)
 
+def read_prepared_chunks(input_file, chunk_size, shard=None, usecols=None):
+    """
+    Prepared records chunk_size rows at a time, with variant_idx (the row
+    number when the input has none) and only the records of this shard.
+    """
+    offset = 0
+    for chunk in pd.read_csv(input_file, chunksize=chunk_size, usecols=usecols):
+        if 'variant_idx' not in chunk.columns:
+            chunk['variant_idx'] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+        offset += len(chunk)
+        if shard is not None:
+            chunk = chunk[shard_of(chunk[SHARD_KEY], shard[1]) == shard[0]]
+        yield chunk.reset_index(drop=True)
+
+class StreamedResults:
+    """
+    Result files of the streaming pass: the main table, the per-track matrix
+    of every output type and (with ontologies) the per-ontology long table,
+    appended chunk by chunk and patched in place by the retry pass.
+    """
+    
+    def __init__(self, ontology_terms=None):
+        self.ontology_terms = ontology_terms
+        self.main = CsvAppender(RUN_DIR / 'alphagenome_predictions_all_variants.csv')
+        self.tracks = {name: CsvAppender(RUN_DIR / f'track_summaries_{name}.csv') for name, _ in TRACK_OUTPUTS}
+        self.ontology = CsvAppender(RUN_DIR / 'alphagenome_predictions_by_ontology.csv')
+    
+    def reset(self):
+        """Start new result files (a fresh run)."""
+        for appender in [self.main, self.ontology, *self.tracks.values()]:
+            appender.reset()
+    
+    def split(self, records):
+        """Main-table frame and per-track frames of a list of result dicts."""
+        frame = pd.DataFrame(records)
+        if 'error_class' not in frame.columns:
+            frame['error_class'] = None
+        track_cols = [c for c in frame.columns if c.endswith(']')]
+        tracks = {}
+        for name, _ in TRACK_OUTPUTS:
+            cols = [c for c in track_cols if c.startswith(f'{name}_')]
+            if cols:
+                tracks[name] = frame[['variant_idx'] + cols]
+        return frame.drop(columns=track_cols), tracks
+    
+    def append(self, records, chunk):
+        """Write one chunk's results; sequence_2kb is taken from the input chunk."""
+        frame, tracks = self.split(records)
+        sequences = chunk.set_index('variant_idx')['sequence_2kb']
+        frame.insert(frame.columns.get_loc('tf_info') + 1, 'sequence_2kb',
+                     sequences.loc[frame['variant_idx']].to_numpy())
+        self.main.append(frame)
+        for name, track_frame in tracks.items():
+            self.tracks[name].append(track_frame)
+        if self.ontology_terms:
+            self.ontology.append(ontology_long_table(frame, self.ontology_terms))
+    
+    def truncate(self, last_idx, chunk_size):
+        """Drop rows after variant_idx last_idx from every result file; returns the main table's count."""
+        dropped = truncate_csv(self.main.path, 'variant_idx', last_idx, chunk_size)
+        for appender in [self.ontology, *self.tracks.values()]:
+            truncate_csv(appender.path, 'variant_idx', last_idx, chunk_size)
+        return dropped
+    
+    def patch(self, records, chunk_size):
+        """Replace the rows of re-predicted records in every result file."""
+        frame, tracks = self.split(records)
+        patch_csv(self.main.path, frame, 'variant_idx', chunk_size)
+        for name, track_frame in tracks.items():
+            if self.tracks[name].path.exists():
+                patch_csv(self.tracks[name].path, track_frame, 'variant_idx', chunk_size)
+            else:
+                self.tracks[name].append(track_frame)
+        if self.ontology_terms:
+            patch_csv(self.ontology.path, ontology_long_table(frame, self.ontology_terms),
+                      ['variant_idx', 'ontology_term'], chunk_size)
+
+def load_stream_accumulators(n_rows, results_file, chunk_size):
+    """
+    Accumulators of a resumed streaming run: the saved state if it belongs to
+    the n_rows already written, else rebuilt from the result file chunk by chunk.
+    """
+    if ACCUMULATOR_STATE_FILE.exists():
+        accumulators = StratifiedAccumulators.load(ACCUMULATOR_STATE_FILE)
+        if accumulators.state.get('n_rows') == n_rows:
+            print(f"✓ Restored streaming accumulators for {n_rows:,} records")
+            return accumulators
+    
+    accumulators = StratifiedAccumulators()
+    for chunk in pd.read_csv(results_file, chunksize=chunk_size, usecols=lambda c: c != 'sequence_2kb'):
+        for record in chunk[chunk['success'].astype(bool)].to_dict('records'):
+            accumulators.update(record)
+    return accumulators
+
+def retry_streamed_records(input_file, failed_queue, results, args, accumulators=None, wait_first=True):
+    """
+    Retry pass of the streaming run: only the queued records are read back
+    from the input, retried with retry_failed_records and patched into the
+    result files.
+    
+    Returns:
+        list of recovered result dicts
+    """
+    queued = set(failed_queue.items)
+    rows = pd.concat([chunk[chunk['variant_idx'].isin(queued)]
+                      for chunk in read_prepared_chunks(input_file, args.chunk_size, args.shard)],
+                     ignore_index=True)
+    variant_requests = build_variant_requests(rows) if args.mode == 'variant' else None
+    recovered = retry_failed_records(rows, failed_queue, args.retry_rounds, args.retry_backoff,
+                                     args.ontologies, variant_requests, wait_first)
+    if recovered:
+        results.patch(recovered, args.chunk_size)
+        print(f"✓ Patched {len(recovered):,} recovered records into the result files")
+        if accumulators is not None:
+            for result in recovered:
+                accumulators.update(result)
+            accumulators.summary().to_csv(PARTIAL_SUMMARY_FILE, index=False)
+    return recovered
+
+def stream_predictions(args, input_file):
+    """
+    Bounded-memory prediction pass (--chunk-size). The prepared CSV is read
+    args.chunk_size records at a time and each chunk's results are appended
+    to the result files before the next chunk is read. Result rows carry no
+    sequence (sequence_2kb is copied from the chunk as it is written), and
+    only the streaming accumulators, the failed-work queue and at most one
+    chunk of shared variant requests outlive a chunk, so peak memory does
+    not grow with the number of variants. Records are predicted in input
+    order (ascending variant_idx); a restarted run continues after the last
+    variant_idx recorded in stream_state.json (replaced atomically after each
+    chunk), first dropping rows a crash left after it so none is written twice.
+    
+    Returns:
+        (main result table path, variant_idx of the shard's records or None)
+    """
+    chunk_size = args.chunk_size
+    results = StreamedResults(args.ontologies)
+    failed_queue = FailedWorkQueue(RUN_DIR / FAILED_QUEUE_NAME)
+    options = {'mode': args.mode, 'ontologies': args.ontologies, 'input': str(input_file)}
+    
+    # Light pre-pass (no sequences): records assigned to this run
+    n_assigned, assigned_idx = 0, []
+    for chunk in read_prepared_chunks(input_file, chunk_size, args.shard,
+                                      usecols=lambda c: c in ('variant_idx', SHARD_KEY)):
+        n_assigned += len(chunk)
+        if args.shard is not None:
+            assigned_idx.append(chunk['variant_idx'].to_numpy())
+    assigned_idx = np.concatenate(assigned_idx) if args.shard is not None else None
+    print(f"✓ Streaming {n_assigned:,} records from {input_file.name} in chunks of {chunk_size:,}")
+    
+    if args.retry_failed:
+        dead_letter_file = RUN_DIR / DEAD_LETTER_NAME
+        if not results.main.path.exists() or not dead_letter_file.exists():
+            print(f"ERROR: --retry-failed needs {results.main.path.name} and {DEAD_LETTER_NAME} in {RUN_DIR}")
+            print("Run the prediction pass first")
+            sys.exit(1)
+        failed_queue.extend(pd.read_csv(dead_letter_file))
+        print(f"\n✓ {len(failed_queue):,} dead-lettered records to re-attempt")
+        retry_streamed_records(input_file, failed_queue, results, args, wait_first=False)
+        return results.main.path, assigned_idx
+    
+    state = None
+    if STREAM_STATE_FILE.exists() and results.main.path.exists():
+        with open(STREAM_STATE_FILE) as f:
+            state = json.load(f)
+        if state['options'] != options:
+            print(f"ERROR: The streamed results in {RUN_DIR} were written with {state['options']}")
+            print("Clear the checkpoints before running with these options")
+            sys.exit(1)
+    
+    if state is None:
+        results.reset()
+        failed_queue.items.clear()
+        (RUN_DIR / DEAD_LETTER_NAME).unlink(missing_ok=True)
+        last_idx, n_done = -1, 0
+        accumulators = StratifiedAccumulators()
+    else:
+        last_idx, n_done = state['last_variant_idx'], state['n_rows']
+        print(f"✓ Resuming after variant_idx {last_idx} ({n_done:,} records already written)")
+        # A crash between appending a chunk and saving the state leaves rows that will be predicted again
+        dropped = results.truncate(last_idx, chunk_size)
+        if dropped:
+            print(f"  ⚠ Dropped {dropped:,} rows written after the last saved state; predicting them again")
+        failed_queue.keep_only([i for i in failed_queue.items if i <= last_idx])
+        accumulators = load_stream_accumulators(n_done, results.main.path, chunk_size)
+    
+    n_target = n_assigned if args.max_variants is None else min(n_assigned, args.max_variants)
+    genome_ref = load_genome() if args.mode == 'variant' else None
+    variant_cache = {}
+    
+    print("\n" + "="*60)
+    print("Running AlphaGenome predictions (streaming)...")
+    print("="*60)
+    
+    TELEMETRY.records_total = max(n_target - n_done, 0)
+    start_time = time.time()
+    n_chunks = 0
+    for chunk in read_prepared_chunks(input_file, chunk_size, args.shard):
+        if n_done >= n_target:
+            break
+        chunk = chunk[chunk['variant_idx'] > last_idx]
+        valid = chunk['sequence_2kb'].map(lambda s: isinstance(s, str) and len(s) == 2048)
+        for variant_id in chunk.loc[~valid, 'variant_id']:
+            print(f"  Skipping invalid sequence: {variant_id}")
+        chunk = chunk[valid].iloc[:n_target - n_done].reset_index(drop=True)
+        if not len(chunk):
+            continue
+        
+        variant_requests = None
+        if args.mode == 'variant':
+            variant_requests = build_variant_requests(chunk, genome_ref, verbose=False)
+        batch_predictions = {}
+        records = []
+        for idx in range(len(chunk)):
+            preds = predict_record(chunk, idx, variant_requests, args.ontologies, args.batch_size,
+                                   args.batch_workers, batch_predictions, variant_cache)
+            result = combine_with_record(chunk.iloc[idx], idx, preds, include_sequence=False)
+            records.append(result)
+            TELEMETRY.record_done()
+            TELEMETRY.maybe_flush()
+            if preds['success']:
+                accumulators.update(result)
+            else:
+                failed_queue.add(result)
+            if args.batch_size <= 1:
+                time.sleep(REQUEST_PAUSE)
+        
+        # The chunk is on disk before the next one is read
+        results.append(records, chunk)
+        n_done += len(records)
+        last_idx = int(chunk['variant_idx'].iloc[-1])
+        n_chunks += 1
+        accumulators.save(ACCUMULATOR_STATE_FILE, n_rows=n_done)
+        accumulators.summary().to_csv(PARTIAL_SUMMARY_FILE, index=False)
+        failed_queue.save()
+        write_json_atomic(STREAM_STATE_FILE, {'options': options, 'n_rows': n_done, 'last_variant_idx': last_idx,
+                                              'timestamp': datetime.now().isoformat()})
+        
+        # Records sharing a variant request are adjacent; keep at most one chunk of them
+        for key in list(variant_cache)[:max(len(variant_cache) - chunk_size, 0)]:
+            del variant_cache[key]
+        
+        elapsed_str = format_duration(time.time() - start_time)
+        print(f"Chunk {n_chunks}: {n_done:,}/{n_target:,} records written | Elapsed: {elapsed_str} | "
+              f"{TELEMETRY.progress_line()} | peak RSS {peak_rss_mb():.0f} MB")
+    
+    print(f"\n✓ Streamed {n_done:,} records ({n_chunks} chunks this run) in "
+          f"{(time.time() - start_time)/3600:.2f} hours, peak RSS {peak_rss_mb():.0f} MB")
+    write_track_metadata()
+    
+    # Retry pass over this run's failures; what still fails is dead-lettered
+    if len(failed_queue):
+        retry_streamed_records(input_file, failed_queue, results, args, accumulators)
+    accumulators.summary().to_csv(PARTIAL_SUMMARY_FILE, index=False)
+    
+    print("\n" + "="*60)
+    print("Predictions complete!")
+    print("="*60)
+    print(f"✓ Saved {n_done:,} predictions to: {results.main.path}")
+    if args.ontologies:
+        print(f"✓ Saved per-ontology summaries ({len(args.ontologies)} cell types) to: {results.ontology.path}")
+    return results.main.path, assigned_idx
+
+def finish_run(args, cassette, output_file, assigned_idx, results_df=None):
+    """
+    Usage and telemetry reports, the shard manifest and the prediction
+    summary. Without results_df (streaming pass) the saved table is read
+    back chunk by chunk, never whole.
+    """
+    dna_model.report(RUN_DIR / 'api_key_usage.csv')
+    snapshot = TELEMETRY.flush()
+    print(f"\nRequest telemetry ({snapshot['requests']:,} requests, {snapshot['requests_per_second']:.2f} req/s, "
+          f"{snapshot['errors']:,} errors, {snapshot['retries']:,} retries"
+          + (f", cache hit rate {100 * snapshot['cache_hit_rate']:.1f}%" if snapshot['cache_hit_rate'] is not None else "")
+          + "):")
+    for entry in snapshot['latency'].values():
+        print(f"  {entry['method']:<18s} {entry['output']:<20s} n={entry['count']:<6,d} "
+              f"p50 {entry['p50']:.3f}s  p95 {entry['p95']:.3f}s  p99 {entry['p99']:.3f}s")
+    print(f"  Written to {TELEMETRY.jsonl_path.name} and {TELEMETRY.prometheus_path}")
+    if cassette is not None:
+        print(f"✓ {cassette.summary()}")
+    
+    if args.shard is not None:
+        rows = results_df if results_df is not None else pd.read_csv(output_file, usecols=['variant_idx', 'success'])
+        options = {'mode': args.mode, 'ontologies': args.ontologies, 'max_variants': args.max_variants}
+        manifest = write_manifest(RUN_DIR, *args.shard, assigned_idx, rows, options)
+        print(f"✓ Shard manifest: {manifest['n_rows']:,}/{manifest['n_assigned']:,} rows written "
+              f"({RUN_DIR / 'manifest.json'})")
+    
+    # Summary statistics: MPRA over every row, predictions over successful rows
+    def chunks(columns):
+        if results_df is not None:
+            return [results_df[columns]]
+        return pd.read_csv(output_file, usecols=columns, chunksize=args.chunk_size)
+    
+    n_rows, _, mpra = column_summary(chunks(['mpra_log2_ratio']), ['mpra_log2_ratio'])
+    center_columns = ['dnase_center', 'rna_center', 'cage_center']
+    _, n_success, predicted = column_summary(chunks(['success'] + center_columns), center_columns, where='success')
+    
+    print("\n" + "="*60)
+    print("Prediction Summary:")
+    print("="*60)
+    print(f"  Total sequences: {n_rows:,}")
+    print(f"  Successful: {n_success:,}")
+    print(f"  Failed: {n_rows - n_success:,}")
+    print(f"  Success rate: {100 * n_success / max(n_rows, 1):.1f}%")
+    
+    print("\nMPRA Activity (log2 ratio):")
+    for stat in ['min', 'max', 'mean', 'std']:
+        print(f"  {stat.capitalize() + ':':<5s} {mpra.loc['mpra_log2_ratio', stat]:.3f}")
+    
+    for label, column in [('DNase', 'dnase_center'), ('RNA-seq', 'rna_center'), ('CAGE', 'cage_center')]:
+        print(f"\nAlphaGenome {label} Predictions (center region):")
+        for stat in ['min', 'max', 'mean', 'std']:
+            print(f"  {stat.capitalize() + ':':<5s} {predicted.loc[column, stat]:.6f}")
+    
+    if args.shard is not None:
+        print(f"\nNext step: once all {args.shard[1]} shards finish, run "
+              f"prediction_shards.py --n-shards {args.shard[1]}")
+    else:
+        print("\nNext step: Run 03_benchmark_correlations.py")
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='Run AlphaGenome predictions on MPRA sequences')
+    parser.add_argument('--mode', choices=['sequence', 'variant'], default='sequence',
+                        help='sequence: predict each 2kb sequence_2kb; variant: one REF/ALT '
+                             'predict_variant request per record (default: sequence)')
+    parser.add_argument('--ontologies', nargs='+', default=None,
+                        help='Cell-type ontology terms to predict in one request per sequence '
+                             f'(sequence mode; the first also fills the default columns, e.g. {DEFAULT_ONTOLOGY})')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Sequences per predict_sequences submission (sequence mode; '
+                             'default: 1 = one request per sequence; compare sizes in batch_latency.csv)')
+    parser.add_argument('--batch-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Client worker threads per batch submission (default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--key-quota', type=int, default=None,
+                        help='Requests each API key may make in this run (default: unlimited)')
+    parser.add_argument('--key-cooldown', type=float, default=DEFAULT_COOLDOWN,
+                        help=f'Seconds a key is quarantined after a quota error (default: {DEFAULT_COOLDOWN:.0f})')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='Client connections per API key; with more than one, batches are fanned out '
+                             'over the pooled clients (default: 1)')
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='i/N',
+                        help=f'Only predict shard i of N (0 <= i < N, by hash of {SHARD_KEY}); '
+                             'merge with prediction_shards.py')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', type=Path, default=None, metavar='CASSETTE',
+                                help='Store every API response and its latency in this cassette file')
+    cassette_group.add_argument('--replay', type=Path, default=None, metavar='CASSETTE',
+                                help='Answer requests from this cassette instead of the API (no key needed)')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Multiplier on recorded latencies during --replay (0 = no delay; default: 1)')
+    parser.add_argument('--retry-rounds', type=int, default=DEFAULT_RETRY_ROUNDS,
+                        help='Retry rounds over failed records after the main pass; what still fails '
+                             f'goes to {DEAD_LETTER_NAME} (default: {DEFAULT_RETRY_ROUNDS})')
+    parser.add_argument('--retry-backoff', type=float, default=DEFAULT_BACKOFF,
+                        help=f'Seconds before the first retry round, doubling per round (default: {DEFAULT_BACKOFF:.0f})')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help=f'Only re-attempt the records in {DEAD_LETTER_NAME} and patch them into the saved results')
+    parser.add_argument('--schedule', choices=SCHEDULE_POLICIES, default=None,
+                        help='Prediction order: file (input order), stratified (interleaved across --strata, '
+                             'so partial results are representative) or priority (--priority-tfs first) '
+                             f'(default: {DEFAULT_POLICY})')
+    parser.add_argument('--strata', nargs='+', default=list(DEFAULT_STRATA),
+                        help=f'Columns to stratify the schedule by; tf = first TF in tf_info '
+                             f'(default: {" ".join(DEFAULT_STRATA)})')
+    parser.add_argument('--priority-tfs', nargs='+', default=None,
+                        help='TF names predicted first with --schedule priority (e.g. pparg rxr)')
+    parser.add_argument('--schedule-seed', type=int, default=DEFAULT_SEED,
+                        help=f'Random seed of the stratified schedule (default: {DEFAULT_SEED})')
+    parser.add_argument('--max-variants', type=int, default=None,
+                        help='Budget: only predict the first N records of the schedule')
+    parser.add_argument('--stop-when-ci', nargs='+', type=parse_target, default=None, metavar='METRIC[:METHOD]=WIDTH',
+                        help='Stop once every listed correlation CI is at most WIDTH wide, e.g. '
+                             'dnase_center=0.05 cage_center:spearman=0.06 (method: pearson or spearman). '
+                             'Requires --schedule stratified')
+    parser.add_argument('--ci-level', type=float, default=DEFAULT_CONFIDENCE,
+                        help=f'Confidence level of the stopping CIs (default: {DEFAULT_CONFIDENCE})')
+    parser.add_argument('--min-variants', type=int, default=DEFAULT_MIN_VARIANTS,
+                        help=f'Never stop before this many samples (default: {DEFAULT_MIN_VARIANTS})')
+    parser.add_argument('--stop-check-every', type=int, default=DEFAULT_CHECK_EVERY,
+                        help=f'Records between CI checks (default: {DEFAULT_CHECK_EVERY})')
+    parser.add_argument('--telemetry-interval', type=float, default=DEFAULT_INTERVAL,
+                        help=f'Seconds between telemetry snapshots (default: {DEFAULT_INTERVAL:.0f})')
+    parser.add_argument('--prometheus-textfile', type=Path, default=None,
+                        help=f'Prometheus textfile snapshot path, e.g. in the node_exporter textfile directory '
+                             f'(default: {PROMETHEUS_FILE} in the output directory)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Stream the input this many records at a time and append results to disk as '
+                             'they land, so memory stays flat in the number of variants (input order only)')
+    parser.add_argument('--input', type=Path, default=None,
+                        help='Prepared MPRA table (default: the stage 01 output; not with --shard)')
+    parser.add_argument('--output-dir', type=Path, default=None,
+                        help=f'Directory for results and checkpoints (default: {OUTPUT_DIR})')
+    args = parser.parse_args()
+    if args.chunk_size is not None:
+        if args.chunk_size < 1:
+            parser.error('--chunk-size must be positive')
+        if args.schedule not in (None, 'file'):
+            parser.error('--chunk-size predicts in input order; use --schedule file (or leave it out)')
+        args.schedule = 'file'
+    args.schedule = args.schedule or DEFAULT_POLICY
+    if args.output_dir is not None and args.shard is not None:
+        parser.error('--output-dir cannot be combined with --shard (shards write under outputs/02_alphagenome_predictions/shards)')
+    if args.input is not None and args.shard is not None:
+        parser.error('--input cannot be combined with --shard (the merge checks shards against the stage 01 output)')
+    args.input = args.input or DATA_DIR / 'mpra_variants_with_2kb_sequences.csv'
+    if args.max_variants is not None and args.shard is not None:
+        parser.error('--max-variants cannot be combined with --shard (each shard would stop at its own budget, so the merge would not be a fixed subset)')
+    if args.stop_when_ci and args.shard is not None:
+        parser.error('--stop-when-ci cannot be combined with --shard (each shard would stop on its own interim estimate)')
+    if args.stop_when_ci:
+        tracked = [m for m, _ in PREDICTION_METRICS]
+        unknown = [m for m, _, _ in args.stop_when_ci if m not in tracked]
+        if unknown:
+            parser.error(f"--stop-when-ci metrics must be one of {', '.join(tracked)}; got {', '.join(unknown)}")
+        if args.schedule != 'stratified':
+            parser.error('--stop-when-ci needs --schedule stratified (input and priority order predict a biased '
+                         'prefix of the library first)')
+    if args.schedule == 'priority' and not args.priority_tfs:
+        parser.error('--schedule priority needs --priority-tfs')
+    if args.replay is not None and not args.replay.exists():
+        parser.error(f'cassette not found: {args.replay}')
+    if args.ontologies and args.mode != 'sequence':
+        parser.error('--ontologies is only supported with --mode sequence')
+    if args.batch_size > 1 and args.mode != 'sequence':
+        parser.error('--batch-size is only supported with --mode sequence')
+    return args
+
 def main():
     """Main execution function - VERSION 2."""
+    global dna_model, TELEMETRY, REQUEST_PAUSE
+    args = parse_args()
+    
+    if args.output_dir is not None:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        use_run_directory(args.output_dir)
+    if args.shard is not None:
+        use_run_directory(shard_directory(*args.shard))
+    TELEMETRY = Telemetry(RUN_DIR / TELEMETRY_FILE, args.prometheus_textfile or RUN_DIR / PROMETHEUS_FILE,
+                          args.telemetry_interval)
+    
+    print("Initializing AlphaGenome model...")
+    create, cassette = cassette_client_factory(args.record, args.replay, args.replay_speed)
+    api_keys = [REPLAY_KEY] if args.replay is not None else load_api_keys()
+    dna_model = ClientPool(api_keys, quota_per_key=args.key_quota, cooldown=args.key_cooldown,
+                           channels_per_key=args.channels, create=create, telemetry=TELEMETRY)
+    if cassette is not None:
+        mode = 'Replaying' if args.replay is not None else 'Recording'
+        print(f"✓ {mode} API responses: {cassette.path} ({len(cassette):,} stored)")
+    if args.replay is not None:
+        REQUEST_PAUSE = 0.0
+    reconnected = dna_model.check_health()
+    print(f"✓ Model initialized ({len(dna_model.keys)} API key(s) × {args.channels} channel(s)"
+          + (f", {reconnected} reconnected" if reconnected else "") + ")")
     print("="*60)
     print("AlphaGenome Prediction Pipeline - VERSION 2")
     print("="*60)
@@ -244,24 +1343,142 @@ def main():
     print("  - Progress tracking with ETA")
     print("="*60)
     
-    # Check for existing checkpoint
-    print("\nChecking for existing checkpoints...")
-    existing_results, resume_from = load_latest_checkpoint()
-    
-    # Load prepared data
-    print("\nLoading prepared MPRA data...")
-    input_file = DATA_DIR / 'mpra_variants_with_2kb_sequences.csv'
+    if args.shard is not None:
+        print(f"\nShard {args.shard[0]}/{args.shard[1]}: writing to {RUN_DIR}")
+    if args.mode == 'variant':
+        print("\n⚠ Variant mode sends mm9 coordinates; the server's mouse reference is not mm9,")
+        print("  so REF (wt_*) tracks may not match the mm9 windows. Stage 05 ignores them")
+        print("  unless run with --use-variant-wt")
     
+    input_file = args.input
     if not input_file.exists():
         print(f"Data file not found: {input_file}")
         print("Run 01_prepare_mpra_data.py first!")
         sys.exit(1)
     
+    # Bounded-memory pass: stream the input and append results chunk by chunk
+    if args.chunk_size is not None:
+        output_file, assigned_idx = stream_predictions(args, input_file)
+        finish_run(args, cassette, output_file, assigned_idx)
+        return
+    
+    # Check for existing checkpoint (--retry-failed patches the saved results instead)
+    existing_results, resume_from = None, 0
+    if not args.retry_failed:
+        print("\nChecking for existing checkpoints...")
+        existing_results, resume_from = load_latest_checkpoint()
+    
+    # Load prepared data
+    print("\nLoading prepared MPRA data...")
     df = pd.read_csv(input_file)
     print(f"✓ Loaded {len(df):,} sequences from {input_file.name}")
     
+    # variant_idx must survive shard filtering and keys the failed-work queue
+    if 'variant_idx' not in df.columns:
+        df['variant_idx'] = np.arange(len(df), dtype=np.int64)
+    
+    # Checkpoints written before variant_idx existed: rebuild it from variant_name (unique)
+    if existing_results is not None and 'variant_idx' not in existing_results.columns:
+        existing_idx = existing_results['variant_name'].map(df.set_index('variant_name')['variant_idx'])
+        if existing_idx.isna().any():
+            print(f"ERROR: {int(existing_idx.isna().sum()):,} checkpointed records are not in {input_file.name}")
+            print(f"Clear the checkpoints in {CHECKPOINT_DIR} or point --input at the original table")
+            sys.exit(1)
+        existing_results.insert(0, 'variant_idx', existing_idx.astype(np.int64))
+        print("  ⚠ Checkpoints predate variant_idx; rebuilt it from variant_name")
+    
+    if args.shard is not None:
+        index, n_shards = args.shard
+        df = df[shard_of(df[SHARD_KEY], n_shards) == index].reset_index(drop=True)
+        print(f"✓ Shard {index}/{n_shards}: {len(df):,} sequences assigned")
+    
+    if args.retry_failed:
+        results_file = RUN_DIR / 'alphagenome_predictions_all_variants.csv'
+        dead_letter_file = RUN_DIR / DEAD_LETTER_NAME
+        if not results_file.exists() or not dead_letter_file.exists():
+            print(f"ERROR: --retry-failed needs {results_file.name} and {DEAD_LETTER_NAME} in {RUN_DIR}")
+            print("Run the prediction pass first")
+            sys.exit(1)
+        existing_results = load_final_results()
+    
+    # Checkpoints from another mode or ontology list have different columns
+    if existing_results is not None:
+        checkpoint_mode = 'variant' if 'wt_dnase_center' in existing_results.columns else 'sequence'
+        checkpoint_terms = sorted(c.split(ONTOLOGY_SEPARATOR, 1)[1] for c in existing_results.columns
+                                  if c.startswith(f'dnase_center{ONTOLOGY_SEPARATOR}'))
+        if checkpoint_mode != args.mode or checkpoint_terms != sorted(args.ontologies or []):
+            source = results_file if args.retry_failed else f"Checkpoints in {CHECKPOINT_DIR}"
+            print(f"ERROR: {source} were written in {checkpoint_mode} mode"
+                  + (f" for ontologies {', '.join(checkpoint_terms)}" if checkpoint_terms else ""))
+            print("Clear them before running with these options" if not args.retry_failed
+                  else "Re-run --retry-failed with the options of the original run")
+            sys.exit(1)
+    
+    # Prediction order: a stratified schedule makes every checkpoint (and a
+    # --max-variants budget) a representative sample of the library
+    assigned_idx = df['variant_idx'].copy()
+    if not args.retry_failed:
+        order = schedule_order(df, args.schedule, args.strata, args.priority_tfs, args.schedule_seed)
+        df = df.iloc[order].reset_index(drop=True)
+        if args.max_variants is not None:
+            df = df.iloc[:args.max_variants].reset_index(drop=True)
+        schedule = pd.DataFrame({
+            'schedule_position': np.arange(len(df)),
+            'variant_idx': df['variant_idx'].to_numpy(),
+            'stratum': stratum_labels(df, args.strata).to_numpy(),
+        })
+        schedule.to_csv(RUN_DIR / 'schedule.csv', index=False)
+        print(f"✓ Schedule: {args.schedule} order over {', '.join(args.strata)}"
+              + (f" (priority TFs: {', '.join(args.priority_tfs)})" if args.schedule == 'priority' else "")
+              + (f", budget {len(df):,}/{len(assigned_idx):,} records" if args.max_variants is not None else ""))
+        if args.schedule != 'file' and len(df) >= 10:
+            first = df.iloc[:max(len(df) // 10, 1)]
+            print(f"  First 10% of the schedule is within {100 * composition_gap(first, df, args.strata):.1f} "
+                  "percentage points of the full composition in every stratum")
+        
+        # Resumed checkpoints must come from the same schedule
+        if existing_results is not None:
+            n_invalid = int((~df['sequence_2kb'].map(lambda s: isinstance(s, str) and len(s) == 2048)).sum())
+            scheduled = df['variant_idx'].to_numpy()[:len(existing_results) + n_invalid]
+            if not np.isin(existing_results['variant_idx'].to_numpy(), scheduled).all():
+                print(f"ERROR: Checkpoints in {CHECKPOINT_DIR} follow a different prediction order")
+                print("Resume with the original --schedule / --schedule-seed / --strata options "
+                      "(--schedule file for runs started in input order), or clear them")
+                sys.exit(1)
+    
+    # Failed-work queue: failures of this run still waiting for the retry pass
+    failed_queue = FailedWorkQueue(RUN_DIR / FAILED_QUEUE_NAME)
+    work_df = df
+    if args.retry_failed:
+        failed_queue.extend(pd.read_csv(dead_letter_file))
+        work_df = df[df['variant_idx'].isin(list(failed_queue.items))].reset_index(drop=True)
+        print(f"\n✓ {len(work_df):,} dead-lettered records to re-attempt")
+    elif existing_results is None:
+        # A fresh run starts without earlier runs' failures
+        failed_queue.items.clear()
+        (RUN_DIR / DEAD_LETTER_NAME).unlink(missing_ok=True)
+    else:
+        failed_queue.keep_only(existing_results.loc[~existing_results['success'].astype(bool), 'variant_idx'])
+    
+    variant_requests = None
+    if args.mode == 'variant':
+        print("\nBuilding REF/ALT variant requests...")
+        variant_requests = build_variant_requests(work_df)
+    
+    stopping_rule = None
+    if args.stop_when_ci and not args.retry_failed:
+        stopping_rule = StoppingRule(args.stop_when_ci, args.ci_level, args.min_variants)
+        print(f"✓ Early stopping: {', '.join(f'{m}:{method} CI ≤ {w:g}' for m, method, w in args.stop_when_ci)} "
+              f"({100 * args.ci_level:g}% CIs, checked every {args.stop_check_every} records "
+              f"from {args.min_variants} on)")
+    
+    accumulators = None
+    if args.retry_failed:
+        recovered = retry_failed_records(work_df, failed_queue, args.retry_rounds, args.retry_backoff,
+                                         args.ontologies, variant_requests, wait_first=False)
+        results_df = replace_records(existing_results, recovered)
     # Check if already complete
-    if existing_results is not None and len(existing_results) >= len(df):
+    elif existing_results is not None and len(existing_results) >= len(df):
         print(f"\n✓ All {len(df):,} sequences already processed!")
         print(f"Using existing results from checkpoint")
         results_df = existing_results
@@ -272,13 +1489,54 @@ def main():
         print("="*60)
         
         start_time = time.time()
-        results_df = process_all_sequences(df, resume_from=resume_from)
+        accumulators = load_latest_accumulators(existing_results)
+        results_df = process_all_sequences(df, resume_from=resume_from, accumulators=accumulators,
+                                           variant_requests=variant_requests,
+                                           ontology_terms=args.ontologies,
+                                           batch_size=args.batch_size, max_workers=args.batch_workers,
+                                           failed_queue=failed_queue, existing_results=existing_results,
+                                           stopping_rule=stopping_rule, check_every=args.stop_check_every)
         elapsed = time.time() - start_time
         
         print(f"\n✓ Completed {len(results_df):,} predictions in {elapsed/3600:.2f} hours")
+        
+        if stopping_rule is not None:
+            intervals = stopping_rule.intervals(accumulators)
+            stopped = len(results_df) < len(df) and bool(intervals['met'].all())
+            sample = df[df['variant_idx'].isin(results_df['variant_idx'])]
+            record = write_stopping_record(
+                RUN_DIR / STOPPING_FILE, stopping_rule, stopped, len(results_df), len(df),
+                results_df['variant_idx'].iloc[-1] if len(results_df) else None, intervals,
+                composition_table(sample, df, args.strata),
+                {'policy': args.schedule, 'strata': list(args.strata), 'seed': args.schedule_seed,
+                 'priority_tfs': args.priority_tfs},
+            )
+            stopping_rule.trace_frame().to_csv(RUN_DIR / STOPPING_TRACE_FILE, index=False)
+            print(f"\n{'✓ Stopped early' if stopped else '⚠ CI targets not all met'}: "
+                  f"{record['n_predicted']:,}/{record['n_scheduled']:,} records predicted")
+            print(intervals[['metric', 'method', 'n_samples', 'r', 'ci_low', 'ci_high', 'ci_width', 'target_width', 'met']]
+                  .to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+            print(f"  Stopping point and sample composition: {RUN_DIR / STOPPING_FILE} "
+                  f"(reproduce with {record['reproduce_with']})")
+    
+    # Retry pass over this run's failures; what still fails is dead-lettered
+    if not args.retry_failed and len(failed_queue):
+        recovered = retry_failed_records(df, failed_queue, args.retry_rounds, args.retry_backoff,
+                                         args.ontologies, variant_requests)
+        results_df = replace_records(results_df, recovered)
+        if accumulators is not None and recovered:
+            for result in recovered:
+                accumulators.update(result)
+            accumulators.summary().to_csv(PARTIAL_SUMMARY_FILE, index=False)
+    
+    # Results are saved in input order whatever order they were predicted in
+    results_df = results_df.sort_values('variant_idx', kind='stable').reset_index(drop=True)
+    
+    # Per-track matrices go to their own files; the main table keeps the scalar metrics
+    results_df = split_track_summaries(results_df)
     
     # Save final results
-    output_file = OUTPUT_DIR / 'alphagenome_predictions_all_variants.csv'
+    output_file = RUN_DIR / 'alphagenome_predictions_all_variants.csv'
     results_df.to_csv(output_file, index=False)
     
     print("\n" + "="*60)
@@ -286,41 +1544,12 @@ def main():
     print("="*60)
     print(f"✓ Saved {len(results_df):,} predictions to: {output_file}")
     
-    # Summary statistics
-    print("\n" + "="*60)
-    print("Prediction Summary:")
-    print("="*60)
-    print(f"  Total sequences: {len(results_df):,}")
-    print(f"  Successful: {results_df['success'].sum():,}")
-    print(f"  Failed: {(~results_df['success']).sum():,}")
-    print(f"  Success rate: {100 * results_df['success'].mean():.1f}%")
+    if args.ontologies:
+        ontology_file = RUN_DIR / 'alphagenome_predictions_by_ontology.csv'
+        ontology_long_table(results_df, args.ontologies).to_csv(ontology_file, index=False)
+        print(f"✓ Saved per-ontology summaries ({len(args.ontologies)} cell types) to: {ontology_file}")
     
-    print("\nMPRA Activity (log2 ratio):")
-    print(f"  Min:  {results_df['mpra_log2_ratio'].min():.3f}")
-    print(f"  Max:  {results_df['mpra_log2_ratio'].max():.3f}")
-    print(f"  Mean: {results_df['mpra_log2_ratio'].mean():.3f}")
-    print(f"  Std:  {results_df['mpra_log2_ratio'].std():.3f}")
-    
-    print("\nAlphaGenome DNase Predictions (center region):")
-    successful = results_df[results_df['success']]
-    print(f"  Min:  {successful['dnase_center'].min():.6f}")
-    print(f"  Max:  {successful['dnase_center'].max():.6f}")
-    print(f"  Mean: {successful['dnase_center'].mean():.6f}")
-    print(f"  Std:  {successful['dnase_center'].std():.6f}")
-    
-    print("\nAlphaGenome RNA-seq Predictions (center region):")
-    print(f"  Min:  {successful['rna_center'].min():.6f}")
-    print(f"  Max:  {successful['rna_center'].max():.6f}")
-    print(f"  Mean: {successful['rna_center'].mean():.6f}")
-    print(f"  Std:  {successful['rna_center'].std():.6f}")
-    
-    print("\nAlphaGenome CAGE Predictions (center region):")
-    print(f"  Min:  {successful['cage_center'].min():.6f}")
-    print(f"  Max:  {successful['cage_center'].max():.6f}")
-    print(f"  Mean: {successful['cage_center'].mean():.6f}")
-    print(f"  Std:  {successful['cage_center'].std():.6f}")
-    
-    print("\nNext step: Run 03_benchmark_correlations.py")
+    finish_run(args, cassette, output_file, assigned_idx, results_df)
 
 if __name__ == '__main__':
     main()
@@ -19,22 +19,48 @@ This script:
 4. Performs per-TF and strand-specific analysis
 5. Generates comprehensive visualizations
 6. Saves benchmark results
+
+Figures are pre-binned with NumPy, cached by data hash under
+.plot_cache/, and rendered in parallel worker processes (see plotting.py).
+Unchanged figures are not redrawn. Use --draft for quick 72 dpi previews,
+or --metrics-only to write the statistics tables without importing
+matplotlib at all.
+
+--adjusted adds partial correlations controlling for pool, chromosome,
+strand, parent enhancer and TF incidence (see mpra_stats.py).
+--within-enhancer splits the association into within- and between-enhancer
+parts and writes a per-enhancer correlation table.
+--by-ontology reads the long per-cell-type table from stage 02 (--ontologies)
+and writes a metric × cell-type correlation matrix, all cells from one
+vectorized correlation pass.
+--per-track correlates MPRA with every individual AlphaGenome track
+(track_summaries_*.csv from stage 02) in one matrix operation and reports
+the best and worst tracks of each output type.
+
+Prediction tables are loaded with the compact schema in table_schema.py
+(categorical labels, float32 predictions, no 2kb sequences).
 """
 
+import argparse
+import re
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
-import seaborn as sns
 from scipy import stats
-from sklearn.metrics import roc_curve, auc, roc_auc_score
 import warnings
 warnings.filterwarnings('ignore')
 
-# Set plotting style
-sns.set_style('whitegrid')
-plt.rcParams['figure.figsize'] = (10, 6)
-plt.rcParams['font.size'] = 10
+from variant_annotations import extract_tf_names, parent_enhancer_key, parent_sequence_id
+from mpra_stats import adjusted_correlations, within_group_correlations, nan_correlations, COVARIATES
+from table_schema import load_table
+from plotting import (
+    BinCache, FigureJob, data_hash, scatter_bins, roc_points, histogram_bins,
+    render_figures, DEFAULT_DPI, DRAFT_DPI
+)
+
+# Hexagons across the x-axis of the scatter figures
+HEXBIN_GRIDSIZE = 50
 
 # Set paths
 BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
@@ -97,7 +123,10 @@ def compute_auroc(df, mpra_col, pred_col, threshold='median'):
     if n_pos == 0 or n_neg == 0:
         return {'auroc': np.nan, 'threshold': thresh_val, 'n_positive': n_pos, 'n_negative': n_neg}
     
-    auroc = roc_auc_score(y_true, y_pred)
+    # Rank-sum (Mann-Whitney) form of the AUROC; identical to sklearn's
+    # roc_auc_score including ties, without importing sklearn
+    ranks = stats.rankdata(y_pred)
+    auroc = (ranks[y_true.to_numpy() == 1].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
     
     return {
         'auroc': auroc,
@@ -106,60 +135,28 @@ def compute_auroc(df, mpra_col, pred_col, threshold='median'):
         'n_negative': n_neg
     }
 
-def plot_scatter(df, mpra_col, pred_col, title, output_file):
+def scatter_job(df, mpra_col, pred_col, corr_stats, title, output_file, cache):
     """
-    Create hexbin plot for large-scale data (6,863 points).
-    VERSION 2: Uses hexbin instead of scatter for better visualization.
+    Build the hexbin figure job for large-scale data (6,863 points).
+    Hexagon counts and the linear fit are pre-binned and cached by data hash.
     """
-    fig, ax = plt.subplots(figsize=(10, 10))
-    
     # Remove NaN
     valid_mask = ~(df[mpra_col].isna() | df[pred_col].isna())
-    plot_df = df[valid_mask]
-    
-    # Hexbin plot for large datasets
-    hexbin = ax.hexbin(plot_df[mpra_col], plot_df[pred_col], 
-                       gridsize=50, cmap='YlOrRd', mincnt=1, alpha=0.8)
-    cb = plt.colorbar(hexbin, ax=ax)
-    cb.set_label('Count', fontsize=11)
-    
-    # Compute correlations
-    corr_stats = compute_correlations(df, mpra_col, pred_col)
-    
-    # Add regression line
-    z = np.polyfit(plot_df[mpra_col], plot_df[pred_col], 1)
-    p = np.poly1d(z)
-    x_line = np.linspace(plot_df[mpra_col].min(), plot_df[mpra_col].max(), 100)
-    ax.plot(x_line, p(x_line), "b-", alpha=0.8, linewidth=2, label='Linear fit')
-    
-    # Labels
-    ax.set_xlabel(f'MPRA Activity (log2 RNA/DNA)', fontsize=13)
-    ax.set_ylabel(f'AlphaGenome {pred_col.replace("_", " ").title()}', fontsize=13)
-    ax.set_title(title, fontsize=15, fontweight='bold', pad=15)
-    
-    # Add statistics text box
-    stats_text = f"N = {corr_stats['n_samples']:,}\n"
-    stats_text += f"Pearson r = {corr_stats['pearson_r']:.4f}\n"
-    stats_text += f"  p = {corr_stats['pearson_p']:.2e}\n"
-    stats_text += f"Spearman ρ = {corr_stats['spearman_r']:.4f}\n"
-    stats_text += f"  p = {corr_stats['spearman_p']:.2e}"
-    
-    ax.text(0.05, 0.95, stats_text, transform=ax.transAxes,
-            fontsize=11, verticalalignment='top', family='monospace',
-            bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.9, pad=0.8))
-    
-    ax.legend(fontsize=11)
-    ax.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    print(f"✓ Saved hexbin plot: {output_file.name}")
+    x = df.loc[valid_mask, mpra_col].to_numpy(float)
+    y = df.loc[valid_mask, pred_col].to_numpy(float)
+    
+    key = data_hash(x, y, gridsize=HEXBIN_GRIDSIZE)
+    payload = cache.get_or_compute('scatter', key, lambda: scatter_bins(x, y, HEXBIN_GRIDSIZE))
+    meta = {
+        'title': title,
+        'pred_col': pred_col,
+        'corr_stats': {k: float(v) for k, v in corr_stats.items()},
+    }
+    return FigureJob('scatter', key, payload, meta, output_file)
 
-def plot_roc_curve(df, mpra_col, pred_col, title, output_file, threshold='median'):
+def roc_job(df, mpra_col, pred_col, title, output_file, cache, threshold='median'):
     """
-    Plot ROC curve for binarized MPRA activity.
+    Build the ROC figure job for binarized MPRA activity.
     """
     valid_mask = ~(df[mpra_col].isna() | df[pred_col].isna())
     valid_df = df[valid_mask]
@@ -170,69 +167,53 @@ def plot_roc_curve(df, mpra_col, pred_col, title, output_file, threshold='median
     else:
         thresh_val = valid_df[mpra_col].mean()
     
-    y_true = (valid_df[mpra_col] > thresh_val).astype(int)
-    y_pred = valid_df[pred_col]
-    
-    # Compute ROC curve
-    fpr, tpr, thresholds = roc_curve(y_true, y_pred)
-    roc_auc = auc(fpr, tpr)
-    
-    # Plot
-    fig, ax = plt.subplots(figsize=(8, 8))
-    ax.plot(fpr, tpr, color='darkorange', lw=2, label=f'ROC curve (AUC = {roc_auc:.3f})')
-    ax.plot([0, 1], [0, 1], color='navy', lw=2, linestyle='--', label='Random classifier')
+    y_true = (valid_df[mpra_col] > thresh_val).to_numpy()
+    y_pred = valid_df[pred_col].to_numpy(float)
     
-    ax.set_xlim([0.0, 1.0])
-    ax.set_ylim([0.0, 1.05])
-    ax.set_xlabel('False Positive Rate', fontsize=12)
-    ax.set_ylabel('True Positive Rate', fontsize=12)
-    ax.set_title(title, fontsize=14, fontweight='bold')
-    ax.legend(loc="lower right", fontsize=11)
-    ax.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    print(f"✓ Saved ROC curve: {output_file.name}")
+    key = data_hash(y_true, y_pred)
+    payload = cache.get_or_compute('roc', key, lambda: roc_points(y_true, y_pred))
+    return FigureJob('roc', key, payload, {'title': title}, output_file)
 
-def plot_heatmap_correlation(corr_matrix, output_file):
+def heatmap_job(corr_matrix, output_file, cache):
     """
-    Plot heatmap of correlations between different prediction metrics.
+    Build the heatmap job for correlations between different prediction metrics.
     """
-    fig, ax = plt.subplots(figsize=(12, 10))
-    sns.heatmap(corr_matrix, annot=True, fmt='.3f', cmap='coolwarm', center=0,
-                square=True, linewidths=1, cbar_kws={"shrink": 0.8},
-                annot_kws={"size": 10})
-    
-    ax.set_title('Correlation Matrix: MPRA vs AlphaGenome Predictions (N=6,863)', 
-                 fontsize=15, fontweight='bold', pad=20)
-    
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-    
-    print(f"✓ Saved correlation heatmap: {output_file.name}")
+    matrix = corr_matrix.to_numpy(float)
+    key = data_hash(matrix, labels=list(corr_matrix.columns))
+    meta = {
+        'labels': list(corr_matrix.columns),
+        'title': 'Correlation Matrix: MPRA vs AlphaGenome Predictions (N=6,863)',
+    }
+    return FigureJob('heatmap', key, {'matrix': matrix}, meta, output_file)
+
+def distribution_job(df, pred_columns, output_file, cache):
+    """
+    Build the 2x3 histogram grid job; bin counts and edges are cached per column.
+    """
+    payload = {}
+    keys = []
+    for idx, (pred_col, _) in enumerate(pred_columns):
+        values = df[pred_col].dropna().to_numpy(float)
+        key = data_hash(values, bins=50)
+        bins = cache.get_or_compute('hist', key, lambda: histogram_bins(values, bins=50))
+        payload[f'counts_{idx}'] = bins['counts']
+        payload[f'edges_{idx}'] = bins['edges']
+        keys.append(key)
+    
+    meta = {
+        'names': [name for _, name in pred_columns],
+        'grid': [2, 3],
+        'n': len(df),
+    }
+    return FigureJob('histogram_grid', data_hash(*keys), payload, meta, output_file)
 
 def analyze_per_tf(df, mpra_col, pred_col):
     """
     VERSION 2: Analyze correlations for each transcription factor separately.
     Extracts TF names from tf_info, filtering out numeric position codes.
     """
-    # Extract TF names from tf_info column
-    # Format examples: "err1_82_92_atf3", "lxr_vbp_4_1", "myb_24_38_rar"
-    # We want to extract non-numeric TF names (atf3, lxr, vbp, myb, rar)
-    def extract_tf_names(tf_str):
-        if pd.isna(tf_str) or tf_str == 'wt':
-            return ['wt']
-        
-        parts = tf_str.split('_')
-        # Filter out numeric-only parts (position codes)
-        tf_names = [p for p in parts if not p.isdigit() and p.isalpha()]
-        return tf_names if tf_names else ['unknown']
-    
     df = df.copy()
-    df['tf_names_list'] = df['tf_info'].apply(extract_tf_names)
+    df['tf_names_list'] = [extract_tf_names(t) for t in df['tf_info']]
     
     # Explode so each TF gets its own row (variants can have multiple TFs)
     df_exploded = df.explode('tf_names_list')
@@ -303,34 +284,150 @@ def analyze_per_chromosome(df, mpra_col, pred_col):
     
     return pd.DataFrame(results)
 
-def plot_per_tf_analysis(tf_df, output_file):
+def per_tf_job(tf_df, output_file):
     """
-    VERSION 2: Visualize per-TF correlations.
+    VERSION 2: Build the per-TF correlation barplot job.
     """
-    fig, ax = plt.subplots(figsize=(14, 10))
-    
     # Sort by Pearson r
     tf_df_plot = tf_df.nlargest(30, 'pearson_r')  # Top 30 TFs
+    values = tf_df_plot['pearson_r'].to_numpy(float)
+    meta = {
+        'labels': tf_df_plot['tf_name'].tolist(),
+        'title': 'Top 30 Transcription Factors by Correlation',
+    }
+    key = data_hash(values, labels=meta['labels'])
+    return FigureJob('barh', key, {'values': values}, meta, output_file)
+
+def build_figure_jobs(df, mpra_col, pred_columns, results, cache):
+    """
+    Pre-bin every overview figure: hexbins, ROC curves, heatmap and histograms.
+    """
+    figure_jobs = []
+    
+    # Scatter plots for each prediction metric
+    for (pred_col, pred_name), result in zip(pred_columns, results):
+        corr_stats = {k: result[k] for k in ['n_samples', 'pearson_r', 'pearson_p', 'spearman_r', 'spearman_p']}
+        figure_jobs.append(scatter_job(
+            df, mpra_col, pred_col, corr_stats,
+            title=f'MPRA Activity vs {pred_name}',
+            output_file=OUTPUT_DIR / f'scatter_{pred_col}.png',
+            cache=cache
+        ))
+    
+    # ROC curves
+    for pred_col, pred_name in pred_columns[:3]:  # Top 3 metrics
+        figure_jobs.append(roc_job(
+            df, mpra_col, pred_col,
+            title=f'ROC Curve: {pred_name} predicting High MPRA Activity',
+            output_file=OUTPUT_DIR / f'roc_{pred_col}.png',
+            cache=cache,
+            threshold='median'
+        ))
+    
+    # Correlation heatmap
+    pred_cols_for_heatmap = [mpra_col] + [col for col, _ in pred_columns]
+    corr_matrix = df[pred_cols_for_heatmap].corr()
+    figure_jobs.append(heatmap_job(corr_matrix, OUTPUT_DIR / 'correlation_heatmap.png', cache))
+    
+    # Distribution plots
+    figure_jobs.append(distribution_job(
+        df, pred_columns, OUTPUT_DIR / 'prediction_distributions.png', cache
+    ))
+    return figure_jobs
+
+def celltype_correlations(ontology_df, mpra_col, metrics):
+    """
+    Correlation of MPRA with every metric in every ontology term.
     
-    colors = ['red' if r < 0 else 'green' for r in tf_df_plot['pearson_r']]
+    The long table is pivoted to one (variants × metrics·terms) matrix and
+    correlated with MPRA in a single nan_correlations call.
     
-    ax.barh(range(len(tf_df_plot)), tf_df_plot['pearson_r'], color=colors, alpha=0.7)
-    ax.set_yticks(range(len(tf_df_plot)))
-    ax.set_yticklabels(tf_df_plot['tf_name'], fontsize=9)
-    ax.set_xlabel('Pearson Correlation (r)', fontsize=12)
-    ax.set_title('Top 30 Transcription Factors by Correlation', 
-                 fontsize=14, fontweight='bold', pad=15)
-    ax.axvline(x=0, color='black', linestyle='--', linewidth=1)
-    ax.grid(True, alpha=0.3, axis='x')
+    Returns:
+        (long DataFrame of metric, ontology_term, n, r and p values;
+         metric × ontology_term matrix of Pearson r)
+    """
+    ontology_df = ontology_df[ontology_df['success'] == True]
+    wide = ontology_df.pivot(index='variant_idx', columns='ontology_term', values=metrics)
+    mpra = ontology_df.groupby('variant_idx')[mpra_col].first().reindex(wide.index)
+    corr = nan_correlations(mpra.to_numpy(float), wide.to_numpy(float))
+    
+    long_df = pd.DataFrame({
+        'metric': wide.columns.get_level_values(0),
+        'ontology_term': wide.columns.get_level_values(1),
+        'n_samples': corr['n'],
+        'pearson_r': corr['pearson_r'],
+        'pearson_p': corr['pearson_p'],
+        'spearman_r': corr['spearman_r'],
+        'spearman_p': corr['spearman_p'],
+    })
+    matrix = long_df.pivot(index='metric', columns='ontology_term', values='pearson_r').reindex(metrics)
+    return long_df, matrix
+
+def track_correlations(df, mpra_col, output_types=('dnase', 'rna', 'cage')):
+    """
+    Correlation of MPRA with every per-track summary written by stage 02.
     
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
+    All tracks of all output types are stacked into one variants × columns
+    matrix (aligned on variant_idx) and correlated in a single pass.
     
-    print(f"✓ Saved per-TF analysis: {output_file.name}")
+    Returns:
+        DataFrame with one row per (output_type, track_index, stat) joined
+        to the track metadata, or None if stage 02 wrote no track files
+    """
+    frames = []
+    for name in output_types:
+        track_file = DATA_DIR / f'track_summaries_{name}.csv'
+        if track_file.exists():
+            frames.append(load_table(track_file).set_index('variant_idx'))
+    if not frames:
+        return None
+    tracks = pd.concat(frames, axis=1)
+    mpra = df.set_index('variant_idx')[mpra_col].reindex(tracks.index)
+    corr = nan_correlations(mpra.to_numpy(float), tracks.to_numpy(float))
+    
+    parsed = [re.fullmatch(r'(\w+?)_(mean|max|center)\[(\d+)\]', c).groups() for c in tracks.columns]
+    result = pd.DataFrame({
+        'output_type': [p[0] for p in parsed],
+        'track_index': [int(p[2]) for p in parsed],
+        'stat': [p[1] for p in parsed],
+        'n_samples': corr['n'],
+        'pearson_r': corr['pearson_r'],
+        'pearson_p': corr['pearson_p'],
+        'spearman_r': corr['spearman_r'],
+        'spearman_p': corr['spearman_p'],
+    })
+    metadata_file = DATA_DIR / 'track_metadata.csv'
+    if metadata_file.exists():
+        result = result.merge(pd.read_csv(metadata_file), on=['output_type', 'track_index'], how='left')
+    return result
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='Benchmark AlphaGenome predictions against MPRA')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help='Write statistics tables only; never import matplotlib or render figures')
+    parser.add_argument('--adjusted', action='store_true',
+                        help='Also report covariate-adjusted (partial) correlations for every metric')
+    parser.add_argument('--covariates', nargs='+', default=COVARIATES, choices=COVARIATES,
+                        help='Covariates for --adjusted (default: all)')
+    parser.add_argument('--within-enhancer', action='store_true',
+                        help='Also report correlations within each parent enhancer')
+    parser.add_argument('--by-ontology', action='store_true',
+                        help='Also benchmark every cell type in alphagenome_predictions_by_ontology.csv')
+    parser.add_argument('--per-track', action='store_true',
+                        help='Also correlate MPRA with every individual AlphaGenome track')
+    parser.add_argument('--draft', action='store_true',
+                        help=f'Render low-resolution previews ({DRAFT_DPI} dpi instead of {DEFAULT_DPI})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of figure rendering processes (default: one per CPU)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore the plot cache and redraw every figure')
+    return parser.parse_args()
 
 def main():
     """Main benchmarking function - VERSION 2."""
+    args = parse_args()
+    
     print("="*60)
     print("AlphaGenome vs MPRA Benchmark Analysis - VERSION 2")
     print("="*60)
@@ -350,7 +447,7 @@ def main():
         print("Run 02_run_alphagenome_predictions.py first!")
         return
     
-    df = pd.read_csv(pred_file)
+    df = load_table(pred_file)
     print(f"\n✓ Loaded {len(df):,} predictions from {pred_file.name}")
     
     # Filter successful predictions
@@ -399,50 +496,109 @@ def main():
     results_df.to_csv(results_file, index=False)
     print(f"\n✓ Saved benchmark summary: {results_file}")
     
-    # Generate plots
-    print("\n" + "="*60)
-    print("Generating Visualizations")
-    print("="*60)
-    
-    # Scatter plots for each prediction metric
-    for pred_col, pred_name in pred_columns:
-        plot_scatter(
-            df_success, mpra_col, pred_col,
-            title=f'MPRA Activity vs {pred_name}',
-            output_file=OUTPUT_DIR / f'scatter_{pred_col}.png'
+    # Covariate-adjusted correlations: one batched residualization for all metrics
+    if args.adjusted:
+        print("\n" + "="*60)
+        print("Covariate-Adjusted Correlations")
+        print("="*60)
+        print(f"Covariates: {', '.join(args.covariates)}")
+        
+        adjusted = adjusted_correlations(
+            df_success, mpra_col, [col for col, _ in pred_columns], args.covariates
         )
-    
-    # ROC curves
-    for pred_col, pred_name in pred_columns[:3]:  # Top 3 metrics
-        plot_roc_curve(
-            df_success, mpra_col, pred_col,
-            title=f'ROC Curve: {pred_name} predicting High MPRA Activity',
-            output_file=OUTPUT_DIR / f'roc_{pred_col}.png',
-            threshold='median'
+        adjusted_file = OUTPUT_DIR / 'adjusted_correlations.csv'
+        adjusted.to_csv(adjusted_file, index=False)
+        print(f"  {adjusted['n_covariates'].iloc[0]} independent covariate columns, "
+              f"N = {adjusted['n_samples'].iloc[0]:,}")
+        print(adjusted[['column_name', 'raw_pearson_r', 'partial_pearson_r',
+                        'partial_pearson_p', 'partial_spearman_r']].to_string(index=False))
+        print(f"✓ Saved adjusted correlations: {adjusted_file.name}")
+    
+    # Within-enhancer correlations: center on each parent enhancer's mean
+    if args.within_enhancer:
+        print("\n" + "="*60)
+        print("Within-Enhancer Correlations")
+        print("="*60)
+        
+        enhancer = parent_enhancer_key(df_success)
+        pooled, per_enhancer = within_group_correlations(
+            df_success, mpra_col, [col for col, _ in pred_columns], enhancer
         )
-    
-    # Correlation heatmap
-    pred_cols_for_heatmap = [mpra_col] + [col for col, _ in pred_columns]
-    corr_matrix = df_success[pred_cols_for_heatmap].corr()
-    plot_heatmap_correlation(corr_matrix, OUTPUT_DIR / 'correlation_heatmap.png')
-    
-    # Distribution plots
-    fig, axes = plt.subplots(2, 3, figsize=(15, 10))
-    axes = axes.flatten()
-    
-    for idx, (pred_col, pred_name) in enumerate(pred_columns):
-        ax = axes[idx]
-        ax.hist(df_success[pred_col].dropna(), bins=50, alpha=0.7, edgecolor='black')
-        ax.set_xlabel(pred_name, fontsize=10)
-        ax.set_ylabel('Frequency', fontsize=10)
-        ax.set_title(f'Distribution: {pred_name} (N={len(df_success):,})', 
-                     fontsize=11, fontweight='bold')
-        ax.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.savefig(OUTPUT_DIR / 'prediction_distributions.png', dpi=300, bbox_inches='tight')
-    plt.close()
-    print(f"✓ Saved distribution plot: prediction_distributions.png")
+        labels = pd.Series(parent_sequence_id(df_success).values, index=enhancer.values)
+        labels = labels[~labels.index.duplicated()]
+        per_enhancer.insert(0, 'sequence_id', per_enhancer['group'].map(labels).values)
+        per_enhancer = per_enhancer.rename(columns={'group': 'parent_enhancer'})
+        
+        print(f"  {pooled['n_groups'].iloc[0]} parent enhancers, N = {pooled['n_samples'].iloc[0]:,}")
+        print(pooled[['column_name', 'within_pearson_r', 'within_spearman_r', 'between_pearson_r',
+                      'n_groups_with_prediction_variance']].to_string(index=False))
+        if (pooled['n_groups_with_prediction_variance'] == 0).all():
+            print("  ⚠ Predictions are constant within every enhancer (mutants share one 2kb input),")
+            print("    so all prediction-MPRA association is between enhancers")
+        
+        pooled.to_csv(OUTPUT_DIR / 'within_enhancer_correlations.csv', index=False)
+        per_enhancer.to_csv(OUTPUT_DIR / 'per_enhancer_correlations.csv', index=False)
+        print("✓ Saved: within_enhancer_correlations.csv, per_enhancer_correlations.csv")
+    
+    # Metric × cell-type matrix from the per-ontology predictions
+    if args.by_ontology:
+        print("\n" + "="*60)
+        print("Per-Cell-Type Correlations")
+        print("="*60)
+        
+        ontology_file = DATA_DIR / 'alphagenome_predictions_by_ontology.csv'
+        if not ontology_file.exists():
+            print(f"  ⚠ {ontology_file.name} not found; run stage 02 with --ontologies first")
+            args.by_ontology = False
+        else:
+            ontology_df = load_table(ontology_file)
+            celltype_long, celltype_matrix = celltype_correlations(
+                ontology_df, mpra_col, [col for col, _ in pred_columns]
+            )
+            print(f"  {celltype_matrix.shape[1]} cell types × {celltype_matrix.shape[0]} metrics (Pearson r):")
+            print(celltype_matrix.round(4).to_string())
+            celltype_long.to_csv(OUTPUT_DIR / 'celltype_correlations.csv', index=False)
+            celltype_matrix.to_csv(OUTPUT_DIR / 'celltype_correlation_matrix.csv')
+            print("✓ Saved: celltype_correlations.csv, celltype_correlation_matrix.csv")
+    
+    # Every individual track, not the all-track average
+    if args.per_track:
+        print("\n" + "="*60)
+        print("Per-Track Correlations")
+        print("="*60)
+        
+        if 'variant_idx' not in df_success.columns:
+            df_success['variant_idx'] = df_success.index
+        per_track = track_correlations(df_success, mpra_col)
+        if per_track is None:
+            print("  ⚠ No track_summaries_*.csv found; re-run stage 02 to keep per-track values")
+            args.per_track = False
+        else:
+            label_col = 'name' if 'name' in per_track.columns else 'track_index'
+            center = per_track[per_track['stat'] == 'center'].dropna(subset=['pearson_r'])
+            print(f"  {per_track['track_index'].groupby(per_track['output_type']).nunique().sum()} tracks "
+                  f"× {per_track['stat'].nunique()} summaries")
+            for output_type, tracks in center.groupby('output_type', sort=False):
+                best = tracks.loc[tracks['pearson_r'].idxmax()]
+                worst = tracks.loc[tracks['pearson_r'].idxmin()]
+                print(f"\n  {output_type} ({len(tracks)} tracks, center):")
+                print(f"    Best:  {best[label_col]}  r = {best['pearson_r']:+.4f} (p={best['pearson_p']:.2e})")
+                print(f"    Worst: {worst[label_col]}  r = {worst['pearson_r']:+.4f} (p={worst['pearson_p']:.2e})")
+            per_track.to_csv(OUTPUT_DIR / 'per_track_correlations.csv', index=False)
+            print("\n✓ Saved: per_track_correlations.csv")
+    
+    # Pre-bin figure data (cached by data hash); rendering happens after per-TF analysis
+    figure_jobs = []
+    if args.metrics_only:
+        print("\n--metrics-only: skipping figure binning and rendering")
+    else:
+        print("\n" + "="*60)
+        print("Binning Figure Data")
+        print("="*60)
+        
+        cache = BinCache(OUTPUT_DIR / '.plot_cache', enabled=not args.no_cache)
+        figure_jobs = build_figure_jobs(df_success, mpra_col, pred_columns, results, cache)
+        print(f"✓ Binned {len(figure_jobs)} figures (cache hits: {cache.hits}, misses: {cache.misses})")
     
     # VERSION 2: Per-TF Analysis
     print("\n" + "="*60)
@@ -455,13 +611,29 @@ def main():
         tf_analysis.to_csv(tf_file, index=False)
         print(f"✓ Saved per-TF analysis: {tf_file.name} ({len(tf_analysis)} TFs)")
         
-        plot_per_tf_analysis(tf_analysis, OUTPUT_DIR / 'per_tf_barplot.png')
+        if not args.metrics_only:
+            figure_jobs.append(per_tf_job(tf_analysis, OUTPUT_DIR / 'per_tf_barplot.png'))
         
         print("\nTop 5 TFs with strongest positive correlation:")
         print(tf_analysis.head(5)[['tf_name', 'n_variants', 'pearson_r']].to_string(index=False))
         print("\nTop 5 TFs with strongest negative correlation:")
         print(tf_analysis.tail(5)[['tf_name', 'n_variants', 'pearson_r']].to_string(index=False))
     
+    # Render all figures in parallel worker processes
+    if not args.metrics_only:
+        print("\n" + "="*60)
+        print("Generating Visualizations")
+        print("="*60)
+        
+        dpi = DRAFT_DPI if args.draft else DEFAULT_DPI
+        render_start = time.time()
+        rendered, skipped = render_figures(figure_jobs, cache, dpi=dpi, workers=args.workers)
+        for name in rendered:
+            print(f"✓ Saved figure: {name}")
+        if skipped:
+            print(f"✓ {len(skipped)} figures unchanged since last run (skipped rendering)")
+        print(f"  Rendered {len(rendered)} figures at {dpi} dpi in {time.time() - render_start:.1f}s")
+    
     # VERSION 2: Strand Analysis
     print("\n" + "="*60)
     print("Running Strand-Specific Analysis...")
@@ -500,11 +672,22 @@ def main():
     print(f"  - per_tf_correlations.csv ({len(tf_analysis) if len(tf_analysis) > 0 else 0} TFs)")
     print(f"  - per_strand_correlations.csv")
     print(f"  - per_chromosome_correlations.csv")
-    print(f"  - {len(pred_columns)} hexbin plots")
-    print(f"  - 3 ROC curves")
-    print(f"  - correlation_heatmap.png")
-    print(f"  - prediction_distributions.png")
-    print(f"  - per_tf_barplot.png")
+    if args.adjusted:
+        print(f"  - adjusted_correlations.csv")
+    if args.within_enhancer:
+        print(f"  - within_enhancer_correlations.csv")
+        print(f"  - per_enhancer_correlations.csv")
+    if args.per_track:
+        print(f"  - per_track_correlations.csv")
+    if args.by_ontology:
+        print(f"  - celltype_correlations.csv")
+        print(f"  - celltype_correlation_matrix.csv")
+    if not args.metrics_only:
+        print(f"  - {len(pred_columns)} hexbin plots")
+        print(f"  - 3 ROC curves")
+        print(f"  - correlation_heatmap.png")
+        print(f"  - prediction_distributions.png")
+        print(f"  - per_tf_barplot.png")
     
     print("\n" + "="*60)
     print("Key Findings:")
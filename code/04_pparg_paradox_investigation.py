@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-PPARγ Paradox Investigation
+PPARγ Paradox Investigation (and the same battery for every other TF)
 
 This script performs a deep dive analysis into why PPARγ motifs show
 negative correlation (r=-0.244, p=8.4×10⁻⁶) when PPARγ is the primary
@@ -12,285 +12,354 @@ Hypotheses to test:
 3. PPARγ variants on specific chromosomes drive the negative correlation
 4. Interaction with RXR or other partners masks PPARγ-specific effects
 5. Prediction distribution for PPARγ variants is systematically different
+
+Confounders (chromosome, pool, strand, parent enhancer) are also handled
+directly with covariate-adjusted partial correlations (Hypothesis 9).
+
+The hypotheses are run for every TF in the library by tf_investigation.py
+(in parallel worker processes) and written as one table per hypothesis
+under OUTPUT_DIR/tf_hypotheses/. The summary table is sorted by Pearson r,
+so any other TF with a PPARγ-like inverted correlation is at the top.
+The detailed report and figure are then produced for the focus TF
+(--tf, default pparg; --partner, default rxr).
+
+Statistics tables are written to OUTPUT_DIR on every run. With
+--metrics-only the figure is skipped and matplotlib is never imported.
+The stage 02 table is read with table_schema.load_table (no sequences).
 """
 
-import pandas as pd
+import argparse
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
 from pathlib import Path
 
+from variant_annotations import extract_tf_names
+from table_schema import load_table
+from tf_cooccurrence import pair_conditioned_correlations
+from tf_investigation import (
+    run_battery, mpra_quartiles, HYPOTHESES, DISTRIBUTION_METRICS, MPRA_COL, QUARTILE_LABELS, MIN_VARIANTS,
+)
+
 # Set paths
 BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
 DATA_DIR = BASE_DIR / 'outputs' / '02_alphagenome_predictions'
 OUTPUT_DIR = BASE_DIR / 'outputs' / '04_pparg_results'
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# Load data
-print("Loading data...")
-df = pd.read_csv(DATA_DIR / 'alphagenome_predictions_all_variants.csv')
-
-# Filter PPARγ variants
-print("\n=== PPARγ Variant Analysis ===")
-pparg_df = df[df['tf_info'].str.contains('pparg', case=False, na=False)].copy()
-print(f"Total PPARγ variants: {len(pparg_df)}")
-print(f"Pools: {pparg_df['pool'].value_counts().to_dict()}")
-
-# Get non-PPARγ variants for comparison
-non_pparg_df = df[~df['tf_info'].str.contains('pparg', case=False, na=False)].copy()
-
-print("\n=== Hypothesis 1: Prediction Distribution ===")
-print("Are PPARγ predictions systematically different?")
-print("\nPPARγ variants:")
-print(f"  DNase center - Mean: {pparg_df['dnase_center'].mean():.6f}, Std: {pparg_df['dnase_center'].std():.6f}")
-print(f"  CAGE center  - Mean: {pparg_df['cage_center'].mean():.6f}, Std: {pparg_df['cage_center'].std():.6f}")
-print(f"  RNA center   - Mean: {pparg_df['rna_center'].mean():.6f}, Std: {pparg_df['rna_center'].std():.6f}")
-
-print("\nNon-PPARγ variants:")
-print(f"  DNase center - Mean: {non_pparg_df['dnase_center'].mean():.6f}, Std: {non_pparg_df['dnase_center'].std():.6f}")
-print(f"  CAGE center  - Mean: {non_pparg_df['cage_center'].mean():.6f}, Std: {non_pparg_df['cage_center'].std():.6f}")
-print(f"  RNA center   - Mean: {non_pparg_df['rna_center'].mean():.6f}, Std: {non_pparg_df['rna_center'].std():.6f}")
-
-# Statistical tests
-print("\nT-tests (PPARγ vs non-PPARγ predictions):")
-for col in ['dnase_center', 'cage_center', 'rna_center']:
-    t_stat, p_val = stats.ttest_ind(pparg_df[col], non_pparg_df[col])
-    print(f"  {col}: t={t_stat:.4f}, p={p_val:.4e}")
-
-print("\n=== Hypothesis 2: MPRA Activity Distribution ===")
-print("Do PPARγ variants show different MPRA patterns?")
-print(f"\nPPARγ MPRA activity:")
-print(f"  Mean: {pparg_df['mpra_log2_ratio'].mean():.4f}")
-print(f"  Median: {pparg_df['mpra_log2_ratio'].median():.4f}")
-print(f"  Std: {pparg_df['mpra_log2_ratio'].std():.4f}")
-print(f"  Range: [{pparg_df['mpra_log2_ratio'].min():.4f}, {pparg_df['mpra_log2_ratio'].max():.4f}]")
-
-print(f"\nNon-PPARγ MPRA activity:")
-print(f"  Mean: {non_pparg_df['mpra_log2_ratio'].mean():.4f}")
-print(f"  Median: {non_pparg_df['mpra_log2_ratio'].median():.4f}")
-print(f"  Std: {non_pparg_df['mpra_log2_ratio'].std():.4f}")
-print(f"  Range: [{non_pparg_df['mpra_log2_ratio'].min():.4f}, {non_pparg_df['mpra_log2_ratio'].max():.4f}]")
-
-t_stat, p_val = stats.ttest_ind(pparg_df['mpra_log2_ratio'], non_pparg_df['mpra_log2_ratio'])
-print(f"\nT-test: t={t_stat:.4f}, p={p_val:.4e}")
-
-print("\n=== Hypothesis 3: Co-regulatory TF Analysis ===")
-print("What other TFs co-occur with PPARγ variants?")
-pparg_df['other_tfs'] = pparg_df['tf_info'].str.replace('_pparg', '').str.replace('pparg_', '').str.strip('_')
-print("\nCo-occurring TFs in PPARγ variants:")
-print(pparg_df['other_tfs'].value_counts().head(10))
-
-# Analyze variants with RXR (PPARγ's obligate heterodimer partner)
-pparg_rxr = pparg_df[pparg_df['tf_info'].str.contains('rxr', case=False, na=False)]
-pparg_no_rxr = pparg_df[~pparg_df['tf_info'].str.contains('rxr', case=False, na=False)]
-
-print(f"\nPPARγ + RXR variants: N={len(pparg_rxr)}")
-if len(pparg_rxr) > 0:
-    print(f"  MPRA mean: {pparg_rxr['mpra_log2_ratio'].mean():.4f}")
-    r_val, p_val = stats.pearsonr(pparg_rxr['dnase_center'], pparg_rxr['mpra_log2_ratio'])
-    print(f"  DNase correlation: r={r_val:.4f}, p={p_val:.4e}")
-
-print(f"\nPPARγ without RXR: N={len(pparg_no_rxr)}")
-if len(pparg_no_rxr) > 0:
-    print(f"  MPRA mean: {pparg_no_rxr['mpra_log2_ratio'].mean():.4f}")
-    r_val, p_val = stats.pearsonr(pparg_no_rxr['dnase_center'], pparg_no_rxr['mpra_log2_ratio'])
-    print(f"  DNase correlation: r={r_val:.4f}, p={p_val:.4e}")
-
-print("\n=== Hypothesis 4: Chromosome-Specific Effects ===")
-print("Is PPARγ negative correlation driven by specific chromosomes?")
-pparg_by_chr = pparg_df.groupby('chromosome').apply(
-    lambda x: pd.Series({
-        'n': len(x),
-        'pearson_r': stats.pearsonr(x['dnase_center'], x['mpra_log2_ratio'])[0] if len(x) > 2 else np.nan,
-        'pearson_p': stats.pearsonr(x['dnase_center'], x['mpra_log2_ratio'])[1] if len(x) > 2 else np.nan,
-        'mpra_mean': x['mpra_log2_ratio'].mean(),
-        'dnase_mean': x['dnase_center'].mean()
-    })
-).sort_values('pearson_r')
-print("\nPPARγ correlations by chromosome:")
-print(pparg_by_chr[pparg_by_chr['n'] >= 5])
-
-print("\n=== Hypothesis 5: Variant Position Analysis ===")
-print("Are PPARγ variants concentrated in specific genomic regions?")
-pparg_genomic = pparg_df.groupby('chromosome')['start'].agg(['min', 'max', 'count'])
-pparg_genomic['span_kb'] = (pparg_genomic['max'] - pparg_genomic['min']) / 1000
-print(pparg_genomic[pparg_genomic['count'] >= 5])
-
-print("\n=== Hypothesis 6: Prediction vs Activity Quartile Analysis ===")
-print("How do predictions change across MPRA activity quartiles?")
-pparg_df['mpra_quartile'] = pd.qcut(pparg_df['mpra_log2_ratio'], 4, labels=['Q1_Low', 'Q2', 'Q3', 'Q4_High'])
-quartile_analysis = pparg_df.groupby('mpra_quartile').agg({
-    'dnase_center': ['mean', 'std'],
-    'cage_center': ['mean', 'std'],
-    'rna_center': ['mean', 'std'],
-    'mpra_log2_ratio': ['mean', 'min', 'max']
-})
-print("\nPredictions by MPRA activity quartile:")
-print(quartile_analysis)
-
-# Check if predictions go UP when MPRA activity goes DOWN (negative correlation)
-print("\n=== Hypothesis 7: Inverted Relationship Test ===")
-q1_dnase = pparg_df[pparg_df['mpra_quartile'] == 'Q1_Low']['dnase_center'].mean()
-q4_dnase = pparg_df[pparg_df['mpra_quartile'] == 'Q4_High']['dnase_center'].mean()
-print(f"Q1 (Low MPRA) DNase: {q1_dnase:.6f}")
-print(f"Q4 (High MPRA) DNase: {q4_dnase:.6f}")
-print(f"Difference (Q4 - Q1): {q4_dnase - q1_dnase:.6f}")
-if q4_dnase < q1_dnase:
-    print("✓ CONFIRMED: Higher MPRA activity → LOWER AlphaGenome predictions")
-else:
-    print("✗ Not confirmed: Expected negative relationship not clear")
-
-print("\n=== Hypothesis 8: Wild-Type Comparison ===")
-# Find wild-type PPARγ sequences (if any)
-wt_pparg = pparg_df[pparg_df['tf_info'].str.contains('wt|PPREwt', case=False, na=False)]
-mut_pparg = pparg_df[~pparg_df['tf_info'].str.contains('wt|PPREwt', case=False, na=False)]
-print(f"Wild-type PPARγ variants: N={len(wt_pparg)}")
-print(f"Mutated PPARγ variants: N={len(mut_pparg)}")
-
-if len(wt_pparg) > 0:
-    print("\nWild-type PPARγ:")
-    print(f"  MPRA mean: {wt_pparg['mpra_log2_ratio'].mean():.4f}")
-    print(f"  DNase mean: {wt_pparg['dnase_center'].mean():.6f}")
-if len(mut_pparg) > 5:
-    print("\nMutated PPARγ:")
-    print(f"  MPRA mean: {mut_pparg['mpra_log2_ratio'].mean():.4f}")
-    print(f"  DNase mean: {mut_pparg['dnase_center'].mean():.6f}")
-    r_val, p_val = stats.pearsonr(mut_pparg['dnase_center'], mut_pparg['mpra_log2_ratio'])
-    print(f"  Correlation: r={r_val:.4f}, p={p_val:.4e}")
-
-# Generate visualizations
-print("\n=== Generating Visualizations ===")
-fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-fig.suptitle('PPARγ Paradox Investigation', fontsize=16, fontweight='bold')
-
-# 1. Scatter: PPARγ DNase vs MPRA
-ax = axes[0, 0]
-ax.scatter(pparg_df['dnase_center'], pparg_df['mpra_log2_ratio'], alpha=0.6, s=50, c='red', label='PPARγ')
-ax.scatter(non_pparg_df['dnase_center'].sample(min(500, len(non_pparg_df))), 
-           non_pparg_df['mpra_log2_ratio'].sample(min(500, len(non_pparg_df))),
-           alpha=0.2, s=20, c='gray', label='Other TFs (sample)')
-r_val, p_val = stats.pearsonr(pparg_df['dnase_center'], pparg_df['mpra_log2_ratio'])
-ax.set_xlabel('DNase Center Prediction', fontsize=12)
-ax.set_ylabel('MPRA log2(RNA/DNA)', fontsize=12)
-ax.set_title(f'PPARγ: r={r_val:.3f}, p={p_val:.2e}', fontsize=12)
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-# 2. Distribution: AlphaGenome predictions
-ax = axes[0, 1]
-ax.hist(pparg_df['dnase_center'], bins=30, alpha=0.5, color='red', label='PPARγ', density=True)
-ax.hist(non_pparg_df['dnase_center'], bins=30, alpha=0.5, color='gray', label='Other TFs', density=True)
-ax.set_xlabel('DNase Center Prediction', fontsize=12)
-ax.set_ylabel('Density', fontsize=12)
-ax.set_title('Prediction Distribution Comparison', fontsize=12)
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-# 3. Distribution: MPRA activity
-ax = axes[0, 2]
-ax.hist(pparg_df['mpra_log2_ratio'], bins=30, alpha=0.5, color='red', label='PPARγ', density=True)
-ax.hist(non_pparg_df['mpra_log2_ratio'], bins=30, alpha=0.5, color='gray', label='Other TFs', density=True)
-ax.set_xlabel('MPRA log2(RNA/DNA)', fontsize=12)
-ax.set_ylabel('Density', fontsize=12)
-ax.set_title('MPRA Activity Distribution', fontsize=12)
-ax.legend()
-ax.grid(True, alpha=0.3)
-
-# 4. Boxplot: Predictions by MPRA quartile
-ax = axes[1, 0]
-pparg_df.boxplot(column='dnase_center', by='mpra_quartile', ax=ax)
-ax.set_xlabel('MPRA Activity Quartile', fontsize=12)
-ax.set_ylabel('DNase Center Prediction', fontsize=12)
-ax.set_title('Predictions Across MPRA Quartiles', fontsize=12)
-plt.sca(ax)
-plt.xticks(rotation=45)
-
-# 5. Chromosome-specific correlations
-ax = axes[1, 1]
-chr_data = pparg_by_chr[pparg_by_chr['n'] >= 5].sort_values('pearson_r')
-if len(chr_data) > 0:
-    ax.barh(chr_data.index.astype(str), chr_data['pearson_r'], color=['red' if r < 0 else 'green' for r in chr_data['pearson_r']])
-    ax.set_xlabel('Pearson r', fontsize=12)
-    ax.set_ylabel('Chromosome', fontsize=12)
-    ax.set_title('PPARγ Correlation by Chromosome', fontsize=12)
-    ax.axvline(0, color='black', linestyle='--', linewidth=1)
-    ax.grid(True, alpha=0.3, axis='x')
-else:
-    ax.text(0.5, 0.5, 'Insufficient data\nper chromosome', ha='center', va='center', transform=ax.transAxes)
-
-# 6. Co-occurring TFs
-ax = axes[1, 2]
-top_cotfs = pparg_df['other_tfs'].value_counts().head(10)
-if len(top_cotfs) > 0:
-    ax.barh(range(len(top_cotfs)), top_cotfs.values, color='steelblue')
-    ax.set_yticks(range(len(top_cotfs)))
-    ax.set_yticklabels(top_cotfs.index, fontsize=10)
-    ax.set_xlabel('Count', fontsize=12)
-    ax.set_title('Co-occurring TFs with PPARγ', fontsize=12)
-    ax.grid(True, alpha=0.3, axis='x')
-else:
-    ax.text(0.5, 0.5, 'No co-TF data', ha='center', va='center', transform=ax.transAxes)
-
-plt.tight_layout()
-plt.savefig(OUTPUT_DIR / 'pparg_paradox_investigation.png', dpi=300, bbox_inches='tight')
-print("✓ Saved: pparg_paradox_investigation.png")
-
-# Generate summary report
-print("\n" + "="*80)
-print("PPARG PARADOX SUMMARY")
-print("="*80)
-
-print("\n🔍 KEY FINDINGS:\n")
-
-# Finding 1: Inverted relationship
-print("1. INVERTED RELATIONSHIP CONFIRMED")
-print(f"   - PPARγ shows negative correlation: r=-0.244, p=8.4×10⁻⁶")
-print(f"   - Low MPRA activity → Higher AlphaGenome predictions")
-print(f"   - High MPRA activity → Lower AlphaGenome predictions")
-print(f"   - Q1 (low MPRA) DNase mean: {q1_dnase:.6f}")
-print(f"   - Q4 (high MPRA) DNase mean: {q4_dnase:.6f}")
-
-# Finding 2: Prediction distributions
-pparg_dnase_mean = pparg_df['dnase_center'].mean()
-other_dnase_mean = non_pparg_df['dnase_center'].mean()
-print(f"\n2. PREDICTION DISTRIBUTIONS")
-print(f"   - PPARγ variants show {'HIGHER' if pparg_dnase_mean > other_dnase_mean else 'LOWER'} mean predictions")
-print(f"   - PPARγ DNase mean: {pparg_dnase_mean:.6f}")
-print(f"   - Other TFs DNase mean: {other_dnase_mean:.6f}")
-print(f"   - Difference: {abs(pparg_dnase_mean - other_dnase_mean):.6f}")
-
-# Finding 3: MPRA activity
-pparg_mpra_mean = pparg_df['mpra_log2_ratio'].mean()
-other_mpra_mean = non_pparg_df['mpra_log2_ratio'].mean()
-print(f"\n3. MPRA ACTIVITY PATTERNS")
-print(f"   - PPARγ variants show {'LOWER' if pparg_mpra_mean < other_mpra_mean else 'HIGHER'} MPRA activity")
-print(f"   - PPARγ MPRA mean: {pparg_mpra_mean:.4f}")
-print(f"   - Other TFs MPRA mean: {other_mpra_mean:.4f}")
-print(f"   - Difference: {abs(pparg_mpra_mean - other_mpra_mean):.4f}")
-
-print("\n💡 INTERPRETATION:\n")
-print("The negative correlation likely reflects:")
-print("   A. AlphaGenome correctly predicts these as DISRUPTED sequences")
-print("      (lower chromatin accessibility expected)")
-print("   B. But MPRA measures RESIDUAL or COMPENSATORY activity")
-print("      (other TFs or mechanisms maintain some expression)")
-print("   C. PPARγ perturbations may activate alternative pathways")
-print("      (compensatory transcriptional responses)")
-
-print("\n📊 BIOLOGICAL CONTEXT:\n")
-print("   - PPARγ is the PRIMARY TARGET of this study")
-print("   - Variants designed to test motif strength gradients")
-print("   - Study focus: PPARγ binding in adipogenesis/metabolism")
-print("   - AlphaGenome trained on natural sequences (not perturbed)")
-print("   - MPRA plasmids lack chromatin context AlphaGenome predicts")
-
-print("\n✅ CONCLUSION:\n")
-print("The PPARγ paradox is NOT a model failure - it reveals:")
-print("   1. AlphaGenome recognizes disrupted regulatory sequences")
-print("   2. MPRA captures biological complexity (compensation)")
-print("   3. Episomal vs endogenous regulation differ fundamentally")
-print("   4. Synthetic mutations outside model training distribution")
-
-print("\n" + "="*80)
-print("Analysis complete!")
+TF_TABLE_DIR = OUTPUT_DIR / 'tf_hypotheses'
+
+# Display names for TFs whose tf_info token is not how they are written
+TF_LABELS = {'pparg': 'PPARγ', 'rxr': 'RXR', 'lxr': 'LXR', 'cebp': 'C/EBP'}
+
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='PPARγ paradox investigation (all-TF hypothesis battery)')
+    parser.add_argument('--tf', default='pparg',
+                        help='Focus TF for the detailed report and figure (default: pparg)')
+    parser.add_argument('--partner', default='rxr',
+                        help='Co-regulatory partner of the focus TF (default: rxr)')
+    parser.add_argument('--tfs', nargs='+', default=None,
+                        help='Run the battery for these TFs only (default: every TF in the library)')
+    parser.add_argument('--metric', default='dnase_center',
+                        help='Prediction column correlated with MPRA (default: dnase_center)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for the TF battery (default: all cores)')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help='Write statistics tables only; never import matplotlib or render figures')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    TF_TABLE_DIR.mkdir(parents=True, exist_ok=True)
+    tf, partner, metric = args.tf, args.partner, args.metric
+    label = TF_LABELS.get(tf, tf.upper())
+    partner_label = TF_LABELS.get(partner, partner.upper())
+
+    # Load data
+    print("Loading data...")
+    df = load_table(DATA_DIR / 'alphagenome_predictions_all_variants.csv')
+    df = df.dropna(subset=[MPRA_COL, metric] + DISTRIBUTION_METRICS).reset_index(drop=True)
+
+    # Run the hypothesis battery for every TF at once
+    tfs = args.tfs
+    if tfs is not None and tf not in tfs:
+        tfs = tfs + [tf]
+    print("\n=== All-TF Hypothesis Battery ===")
+    tables = run_battery(df, tfs=tfs, metric=metric, workers=args.workers)
+    for name in HYPOTHESES:
+        tables[name].to_csv(TF_TABLE_DIR / f'tf_{name}.csv', index=False)
+    summary_all = tables['summary']
+    print(f"TFs analyzed: {len(summary_all)}")
+    print(f"✓ Saved {len(HYPOTHESES)} tables to {TF_TABLE_DIR}")
+    print(f"\nMost negative {metric} correlations:")
+    print(summary_all[['tf', 'n_tf', 'pearson_r', 'pearson_p', 'partial_pearson_r',
+                       'inverted', 'paradox']].head(10).to_string(index=False))
+    pair_corr = pair_conditioned_correlations(df, MPRA_COL, [metric])
+    pair_corr.to_csv(TF_TABLE_DIR / 'tf_pair_correlations.csv', index=False)
+    print(f"✓ Saved correlations conditioned on {len(pair_corr)} co-occurring TF pairs")
+    paradoxes = summary_all.loc[summary_all['paradox'], 'tf'].tolist()
+    print(f"TFs with significant negative correlation: {', '.join(paradoxes) if paradoxes else 'none'}")
+
+    # Focus TF rows from each consolidated table
+    focus = {name: table[table['tf'] == tf] for name, table in tables.items()}
+    if focus['summary'].empty:
+        print(f"ERROR: No battery results for focus TF '{tf}'")
+        print(f"It must appear in tf_info of at least {MIN_VARIANTS} variants with {metric} predictions (check --tf)")
+        sys.exit(1)
+    summary_row = focus['summary'].iloc[0]
+    tf_rows = tf_row_mask(df, tf)
+    tf_df = df[tf_rows].copy()
+    other_df = df[~tf_rows]
+
+    print(f"\n=== {label} Variant Analysis ===")
+    print(f"Total {label} variants: {len(tf_df)}")
+    # pool is categorical: leave out pools with none of this TF's variants
+    print(f"Pools: {tf_df['pool'].value_counts().loc[lambda counts: counts > 0].to_dict()}")
+
+    print("\n=== Hypothesis 1: Prediction Distribution ===")
+    print(f"Are {label} predictions systematically different?")
+    h1 = focus['h1_prediction_distribution'].set_index('metric')
+    print(f"\n{label} variants:")
+    for col in DISTRIBUTION_METRICS:
+        print(f"  {col:<13s}- Mean: {h1.loc[col, 'tf_mean']:.6f}, Std: {h1.loc[col, 'tf_std']:.6f}")
+    print(f"\nNon-{label} variants:")
+    for col in DISTRIBUTION_METRICS:
+        print(f"  {col:<13s}- Mean: {h1.loc[col, 'other_mean']:.6f}, Std: {h1.loc[col, 'other_std']:.6f}")
+    print(f"\nT-tests ({label} vs non-{label} predictions):")
+    for col in DISTRIBUTION_METRICS:
+        print(f"  {col}: t={h1.loc[col, 't_stat']:.4f}, p={h1.loc[col, 'p_value']:.4e}")
+
+    print("\n=== Hypothesis 2: MPRA Activity Distribution ===")
+    print(f"Do {label} variants show different MPRA patterns?")
+    h2 = focus['h2_mpra_distribution'].iloc[0]
+    print(f"\n{label} MPRA activity:")
+    print(f"  Mean: {h2['mean']:.4f}")
+    print(f"  Median: {h2['median']:.4f}")
+    print(f"  Std: {h2['std']:.4f}")
+    print(f"  Range: [{h2['min']:.4f}, {h2['max']:.4f}]")
+    print(f"\nNon-{label} MPRA activity:")
+    print(f"  Mean: {h2['other_mean']:.4f}")
+    print(f"  Median: {h2['other_median']:.4f}")
+    print(f"\nT-test: t={h2['t_stat']:.4f}, p={h2['p_value']:.4e}")
+
+    print("\n=== Hypothesis 3: Co-regulatory TF Analysis ===")
+    print(f"What other TFs co-occur with {label} variants?")
+    h3 = focus['h3_partner_split'].sort_values('n_with', ascending=False)
+    print(f"\nCo-occurring TFs in {label} variants:")
+    print(h3[['partner', 'n_with']].head(10).to_string(index=False))
+    partner_row = h3[h3['partner'] == partner]
+    if len(partner_row) > 0:
+        partner_row = partner_row.iloc[0]
+        print(f"\n{label} + {partner_label} variants: N={partner_row['n_with']}")
+        print(f"  MPRA mean: {partner_row['mpra_mean_with']:.4f}")
+        print(f"  {metric} correlation: r={partner_row['pearson_r_with']:.4f}, p={partner_row['pearson_p_with']:.4e}")
+        print(f"\n{label} without {partner_label}: N={partner_row['n_without']}")
+        print(f"  MPRA mean: {partner_row['mpra_mean_without']:.4f}")
+        print(f"  {metric} correlation: r={partner_row['pearson_r_without']:.4f}, p={partner_row['pearson_p_without']:.4e}")
+    else:
+        print(f"\nNo {label} variants co-occur with {partner_label}")
+    tf_pairs = pair_corr[(pair_corr['tf_a'] == tf) | (pair_corr['tf_b'] == tf)]
+    if len(tf_pairs) > 0:
+        print(f"\n{metric} correlation conditioned on each {label} pair:")
+        print(tf_pairs[['tf_a', 'tf_b', 'n_variants', 'pearson_r', 'pearson_p']].to_string(index=False))
+
+    print("\n=== Hypothesis 4: Chromosome-Specific Effects ===")
+    print(f"Is the {label} correlation driven by specific chromosomes?")
+    by_chr = focus['h4_chromosome_correlations'].drop(columns='tf').set_index('chromosome').sort_values('pearson_r')
+    print(f"\n{label} correlations by chromosome:")
+    print(by_chr[by_chr['n'] >= 5])
+
+    print("\n=== Hypothesis 5: Variant Position Analysis ===")
+    print(f"Are {label} variants concentrated in specific genomic regions?")
+    genomic = focus['h5_genomic_span'].drop(columns='tf').set_index('chromosome')
+    print(genomic[genomic['count'] >= 5])
+
+    print("\n=== Hypothesis 6: Prediction vs Activity Quartile Analysis ===")
+    print("How do predictions change across MPRA activity quartiles?")
+    quartile_analysis = focus['h6_quartiles'].drop(columns='tf').set_index('mpra_quartile')
+    print("\nPredictions by MPRA activity quartile:")
+    print(quartile_analysis)
+
+    # Check if predictions go UP when MPRA activity goes DOWN (negative correlation)
+    print("\n=== Hypothesis 7: Inverted Relationship Test ===")
+    q1_pred, q4_pred = summary_row['q1_prediction_mean'], summary_row['q4_prediction_mean']
+    print(f"Q1 (Low MPRA) {metric}: {q1_pred:.6f}")
+    print(f"Q4 (High MPRA) {metric}: {q4_pred:.6f}")
+    print(f"Difference (Q4 - Q1): {q4_pred - q1_pred:.6f}")
+    if summary_row['inverted']:
+        print("✓ CONFIRMED: Higher MPRA activity → LOWER AlphaGenome predictions")
+    else:
+        print("✗ Not confirmed: Expected negative relationship not clear")
+
+    print("\n=== Hypothesis 8: Wild-Type Comparison ===")
+    print(f"Wild-type {label} variants: N={summary_row['n_wt']}")
+    print(f"Mutated {label} variants: N={summary_row['n_mutant']}")
+    if summary_row['n_mutant'] > 5:
+        print(f"\nMutated {label}:")
+        print(f"  Correlation: r={summary_row['mutant_pearson_r']:.4f}, p={summary_row['mutant_pearson_p']:.4e}")
+
+    print("\n=== Hypothesis 9: Covariate-Adjusted Correlation ===")
+    print(f"Does the {label} correlation survive adjustment for chromosome, strand, pool and parent enhancer?")
+    adjusted_table = focus['h9_adjusted_correlations']
+    print(adjusted_table[['column_name', 'raw_pearson_r', 'partial_pearson_r',
+                          'partial_pearson_p', 'prediction_explained_by_covariates']].to_string(index=False))
+
+    # Save focus-TF statistics tables (no plotting stack needed)
+    print("\n=== Saving Statistics ===")
+    focus['summary'].to_csv(OUTPUT_DIR / f'{tf}_summary.csv', index=False)
+    by_chr.to_csv(OUTPUT_DIR / f'{tf}_chromosome_correlations.csv')
+    quartile_analysis.to_csv(OUTPUT_DIR / f'{tf}_quartile_analysis.csv')
+    adjusted_table.to_csv(OUTPUT_DIR / f'{tf}_adjusted_correlations.csv', index=False)
+    print(f"✓ Saved: {tf}_summary.csv, {tf}_chromosome_correlations.csv, {tf}_quartile_analysis.csv, "
+          f"{tf}_adjusted_correlations.csv")
+
+    # Generate visualizations
+    if args.metrics_only:
+        print("\n--metrics-only: skipping visualizations")
+    else:
+        print("\n=== Generating Visualizations ===")
+        import matplotlib.pyplot as plt
+    
+        fig, axes = plt.subplots(2, 3, figsize=(18, 12))
+        fig.suptitle(f'{label} Paradox Investigation', fontsize=16, fontweight='bold')
+
+        # 1. Scatter: focus-TF prediction vs MPRA
+        ax = axes[0, 0]
+        ax.scatter(tf_df[metric], tf_df[MPRA_COL], alpha=0.6, s=50, c='red', label=label)
+        other_sample = other_df.sample(min(500, len(other_df)))
+        ax.scatter(other_sample[metric], other_sample[MPRA_COL],
+                   alpha=0.2, s=20, c='gray', label='Other TFs (sample)')
+        r_val, p_val = summary_row['pearson_r'], summary_row['pearson_p']
+        ax.set_xlabel(metric, fontsize=12)
+        ax.set_ylabel('MPRA log2(RNA/DNA)', fontsize=12)
+        ax.set_title(f'{label}: r={r_val:.3f}, p={p_val:.2e}', fontsize=12)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+
+        # 2. Distribution: AlphaGenome predictions
+        ax = axes[0, 1]
+        ax.hist(tf_df[metric], bins=30, alpha=0.5, color='red', label=label, density=True)
+        ax.hist(other_df[metric], bins=30, alpha=0.5, color='gray', label='Other TFs', density=True)
+        ax.set_xlabel(metric, fontsize=12)
+        ax.set_ylabel('Density', fontsize=12)
+        ax.set_title('Prediction Distribution Comparison', fontsize=12)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+
+        # 3. Distribution: MPRA activity
+        ax = axes[0, 2]
+        ax.hist(tf_df[MPRA_COL], bins=30, alpha=0.5, color='red', label=label, density=True)
+        ax.hist(other_df[MPRA_COL], bins=30, alpha=0.5, color='gray', label='Other TFs', density=True)
+        ax.set_xlabel('MPRA log2(RNA/DNA)', fontsize=12)
+        ax.set_ylabel('Density', fontsize=12)
+        ax.set_title('MPRA Activity Distribution', fontsize=12)
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+
+        # 4. Boxplot: Predictions by MPRA quartile
+        ax = axes[1, 0]
+        tf_df['mpra_quartile'] = np.asarray(QUARTILE_LABELS)[mpra_quartiles(tf_df[MPRA_COL].to_numpy())]
+        tf_df.boxplot(column=metric, by='mpra_quartile', ax=ax)
+        ax.set_xlabel('MPRA Activity Quartile', fontsize=12)
+        ax.set_ylabel(metric, fontsize=12)
+        ax.set_title('Predictions Across MPRA Quartiles', fontsize=12)
+        plt.sca(ax)
+        plt.xticks(rotation=45)
+
+        # 5. Chromosome-specific correlations
+        ax = axes[1, 1]
+        chr_data = by_chr[by_chr['n'] >= 5].sort_values('pearson_r')
+        if len(chr_data) > 0:
+            ax.barh(chr_data.index.astype(str), chr_data['pearson_r'], color=['red' if r < 0 else 'green' for r in chr_data['pearson_r']])
+            ax.set_xlabel('Pearson r', fontsize=12)
+            ax.set_ylabel('Chromosome', fontsize=12)
+            ax.set_title(f'{label} Correlation by Chromosome', fontsize=12)
+            ax.axvline(0, color='black', linestyle='--', linewidth=1)
+            ax.grid(True, alpha=0.3, axis='x')
+        else:
+            ax.text(0.5, 0.5, 'Insufficient data\nper chromosome', ha='center', va='center', transform=ax.transAxes)
+
+        # 6. Co-occurring TFs
+        ax = axes[1, 2]
+        top_cotfs = h3.set_index('partner')['n_with'].head(10)
+        if len(top_cotfs) > 0:
+            ax.barh(range(len(top_cotfs)), top_cotfs.values, color='steelblue')
+            ax.set_yticks(range(len(top_cotfs)))
+            ax.set_yticklabels(top_cotfs.index, fontsize=10)
+            ax.set_xlabel('Count', fontsize=12)
+            ax.set_title(f'Co-occurring TFs with {label}', fontsize=12)
+            ax.grid(True, alpha=0.3, axis='x')
+        else:
+            ax.text(0.5, 0.5, 'No co-TF data', ha='center', va='center', transform=ax.transAxes)
+
+        plt.tight_layout()
+        plt.savefig(OUTPUT_DIR / f'{tf}_paradox_investigation.png', dpi=300, bbox_inches='tight')
+        plt.close(fig)
+        print(f"✓ Saved: {tf}_paradox_investigation.png")
+
+    # Generate summary report
+    print("\n" + "="*80)
+    print(f"{label} PARADOX SUMMARY")
+    print("="*80)
+
+    print("\n🔍 KEY FINDINGS:\n")
+
+    # Finding 1: Inverted relationship
+    print(f"1. INVERTED RELATIONSHIP {'CONFIRMED' if summary_row['inverted'] else 'NOT CONFIRMED'}")
+    print(f"   - {label} correlation: r={summary_row['pearson_r']:.3f}, p={summary_row['pearson_p']:.2e}")
+    print(f"   - Q1 (low MPRA) {metric} mean: {q1_pred:.6f}")
+    print(f"   - Q4 (high MPRA) {metric} mean: {q4_pred:.6f}")
+
+    # Finding 2: Prediction distributions
+    tf_pred_mean = summary_row['tf_prediction_mean']
+    other_pred_mean = summary_row['other_prediction_mean']
+    print(f"\n2. PREDICTION DISTRIBUTIONS")
+    print(f"   - {label} variants show {'HIGHER' if tf_pred_mean > other_pred_mean else 'LOWER'} mean predictions")
+    print(f"   - {label} {metric} mean: {tf_pred_mean:.6f}")
+    print(f"   - Other TFs {metric} mean: {other_pred_mean:.6f}")
+    print(f"   - Difference: {abs(tf_pred_mean - other_pred_mean):.6f}")
+
+    # Finding 3: MPRA activity
+    tf_mpra_mean = summary_row['tf_mpra_mean']
+    other_mpra_mean = summary_row['other_mpra_mean']
+    print(f"\n3. MPRA ACTIVITY PATTERNS")
+    print(f"   - {label} variants show {'LOWER' if tf_mpra_mean < other_mpra_mean else 'HIGHER'} MPRA activity")
+    print(f"   - {label} MPRA mean: {tf_mpra_mean:.4f}")
+    print(f"   - Other TFs MPRA mean: {other_mpra_mean:.4f}")
+    print(f"   - Difference: {abs(tf_mpra_mean - other_mpra_mean):.4f}")
+
+    print("\n💡 INTERPRETATION:\n")
+    print("The negative correlation likely reflects:")
+    print("   A. AlphaGenome correctly predicts these as DISRUPTED sequences")
+    print("      (lower chromatin accessibility expected)")
+    print("   B. But MPRA measures RESIDUAL or COMPENSATORY activity")
+    print("      (other TFs or mechanisms maintain some expression)")
+    print("   C. PPARγ perturbations may activate alternative pathways")
+    print("      (compensatory transcriptional responses)")
+
+    print("\n📊 BIOLOGICAL CONTEXT:\n")
+    print("   - PPARγ is the PRIMARY TARGET of this study")
+    print("   - Variants designed to test motif strength gradients")
+    print("   - Study focus: PPARγ binding in adipogenesis/metabolism")
+    print("   - AlphaGenome trained on natural sequences (not perturbed)")
+    print("   - MPRA plasmids lack chromatin context AlphaGenome predicts")
+
+    print("\n✅ CONCLUSION:\n")
+    print("The PPARγ paradox is NOT a model failure - it reveals:")
+    print("   1. AlphaGenome recognizes disrupted regulatory sequences")
+    print("   2. MPRA captures biological complexity (compensation)")
+    print("   3. Episomal vs endogenous regulation differ fundamentally")
+    print("   4. Synthetic mutations outside model training distribution")
+
+    print("\n" + "="*80)
+    print("Analysis complete!")
+
+
+def tf_row_mask(df, tf):
+    """Rows whose tf_info names the TF (exact TF token, as in tf_incidence_matrix)."""
+    return df['tf_info'].map(lambda t: tf in extract_tf_names(t)).to_numpy()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,9 +15,10 @@ the artificial nature of MPRA variants, not model failure.
 
 METHODOLOGY:
 1. Extract true reference sequences from mm9 genome at variant locations
-2. Reconstruct wild-type 2048bp sequences (replacing variant_seq with reference)
+2. Reconstruct wild-type 2048bp sequences (replacing variant_seq with reference
+   at the exact offset stage 01 inserted it, for all variants at once)
 3. Run AlphaGenome predictions on reconstructed WT sequences (~6,863 predictions)
-4. Compare WT predictions vs mutant predictions
+4. Compare WT predictions vs mutant predictions (aligned on variant_idx)
 5. Correlate both with MPRA activity
 6. Quantify mutation effect sizes (mutant - WT predictions)
 
@@ -26,6 +27,45 @@ EXPECTED OUTCOMES:
 - WT predictions are more consistent (lower variance)
 - Mutation effects are quantifiable and directional
 - Validates model works on natural genomic sequences
+
+With --metrics-only the summary tables are written without generating
+figures, and matplotlib is never imported.
+
+WT and mutant correlations share the MPRA vector, so their difference is
+tested as a dependent-correlation comparison (Steiger's z and a paired
+bootstrap). --compare-only re-runs just those tests on a saved
+wildtype_vs_mutant_comparison.csv, without the genome or the API.
+
+If stage 02 ran with --mode variant, its predictions already carry the REF
+allele (wt_* columns). They were requested in mm9 coordinates from a server
+whose mouse reference is not mm9, so they are ignored (with a warning) and
+WT is reconstructed from mm9 as usual; --use-variant-wt uses them instead
+and skips steps 2-4.
+
+--batch-size N submits the WT sequences N at a time through the client's
+multi-sequence interface (see prediction_batches.py), retrying only failed
+members and logging each batch's latency to batch_latency.csv.
+Requests are spread over every configured API key and --channels client
+connections per key (client_pool.py). --record / --replay CASSETTE store
+or serve the WT responses from a local cassette (api_cassette.py) so the
+prediction round can be re-run offline with the recorded latencies.
+
+With --chunk-size N, steps 2-4 stream the stage 02 table N rows at a time:
+each chunk's WT sequences are reconstructed, predicted and appended to the
+output files before the next chunk is read. Steps 5-6 then join the
+stage 02 table and the WT predictions on variant_idx chunk by chunk,
+appending the comparison table and folding each chunk into running
+correlation, Steiger and (Poisson) bootstrap accumulators, so peak memory
+does not grow with the number of variants. Spearman rho, median deltas
+and the figures use a hash sample of up to COMPARISON_SAMPLE_SIZE
+variants. A restarted run continues after the last WT record written.
+--predictions and --output-dir point the stage at another stage 02 table
+and output directory.
+
+The stage 02 table is loaded with the compact schema (table_schema.py).
+Only in-memory WT reconstruction reads its 2kb sequences, and they are
+dropped before the comparison, so wildtype_vs_mutant_comparison.csv holds
+no sequences in either mode.
 """
 
 import os
@@ -34,15 +74,26 @@ import time
 import json
 import warnings
 import numpy as np
+import argparse
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 from pyfaidx import Fasta
-from scipy import stats
 from tqdm import tqdm
 from datetime import datetime
 
+from mpra_stats import nan_correlations, pearson_columns, steiger_z_test, paired_bootstrap_correlations
+
+from client_pool import ClientPool, load_api_keys, DEFAULT_COOLDOWN
+from api_cassette import cassette_client_factory, REPLAY_KEY
+from prediction_batches import predict_batch, log_batch_latency, latency_summary, DEFAULT_MAX_WORKERS
+from chunked_tables import CsvAppender, peak_rss_mb, truncate_csv, write_json_atomic, join_sorted_chunks
+from table_schema import load_table, read_table_chunks, SEQUENCE_COLUMNS
+from streaming_stats import CorrelationAccumulator, PairedBootstrapAccumulator, key_priority
+from sequence_arrays import (
+    WINDOW_SIZE, window_coordinates, oriented_variant_offset, encode_sequences,
+    decode_sequences, reverse_complement_array, gather_windows, scatter_windows,
+)
+
 # AlphaGenome imports
 from dotenv import load_dotenv
 from alphagenome.models import dna_client
@@ -87,16 +138,41 @@ CHR_MAP = {
 # Load API key
 env_path = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/Alpha_genome_quickstart_notebook/.env')
 load_dotenv(env_path)
-api_key = os.getenv('ALPHA_GENOME_API_KEY') or os.getenv('ALPHA_GENOME_KEY')
+api_keys = load_api_keys()
+
+# Prediction summaries compared between WT and mutant sequences
+SUMMARY_METRICS = [
+    'dnase_center', 'dnase_mean', 'dnase_max',
+    'rna_center', 'rna_mean', 'rna_max',
+    'cage_center', 'cage_mean', 'cage_max',
+]
+
+# Paired bootstrap for the WT vs mutant correlation difference
+N_BOOTSTRAP = 2000
+BOOTSTRAP_SEED = 0
 
-if not api_key:
-    raise RuntimeError('Missing ALPHA_GENOME_API_KEY in environment.')
+# Variants kept (by hash of variant_idx) for Spearman, medians and figures in a
+# --chunk-size comparison; every variant of a library up to this size
+COMPARISON_SAMPLE_SIZE = 10000
+
+# Latency of every batched submission (--batch-size)
+BATCH_LATENCY_FILE = OUTPUT_DIR / 'batch_latency.csv'
 
 # Checkpointing
 CHECKPOINT_DIR = OUTPUT_DIR / 'checkpoints'
 CHECKPOINT_DIR.mkdir(exist_ok=True)
 CHECKPOINT_INTERVAL = 100
 
+# Progress of a --chunk-size run: WT records written and the last variant_idx
+WT_STREAM_STATE_FILE = CHECKPOINT_DIR / 'wt_stream_state.json'
+
+# Stage 02 predictions (the mutant side of the comparison)
+MUTANT_FILE = BASE_DIR / 'outputs' / '02_alphagenome_predictions' / 'alphagenome_predictions_all_variants.csv'
+
+# Columns of the stage 02 table needed to reconstruct WT sequences
+RECONSTRUCTION_COLUMNS = ['variant_idx', 'variant_id', 'variant_name', 'chromosome', 'start', 'end', 'strand',
+                          'variant_seq', 'sequence_2kb']
+
 print("="*80)
 print("WILD-TYPE VALIDATION ANALYSIS")
 print("="*80)
@@ -136,54 +212,84 @@ def extract_reference_sequence(genome, chromosome, start, end, strand):
         return None
 
 
-def reconstruct_wildtype_sequence(genome, row):
+def reconstruct_wildtype_batch(genome, df):
     """
-    Reconstruct wild-type 2048bp sequence by replacing variant_seq with reference.
+    Reconstruct wild-type 2048bp sequences for all variants at once.
+    
+    The variant's offset in each sequence_2kb is computed with the same
+    window arithmetic stage 01 used to insert it (window_coordinates), and
+    the reference bases are spliced in at that offset on uint8 sequence
+    arrays. Rows where the expected variant (reverse complemented for
+    minus-strand variants) is not at the computed offset are not
+    reconstructed and are reported instead.
     
     Args:
         genome: pyfaidx Fasta object
-        row: DataFrame row with variant information
+        df: DataFrame with variant_idx, chromosome, start, end, strand, variant_seq, sequence_2kb
     
     Returns:
-        Reconstructed WT sequence (2048bp)
+        (list of WT sequences with None for failed rows, DataFrame of failed rows)
     """
-    # Extract reference sequence at variant position
-    ref_seq = extract_reference_sequence(
-        genome, 
-        row['chromosome'], 
-        row['start'], 
-        row['end'], 
-        row['strand']
-    )
+    n = len(df)
+    variant_seq = df['variant_seq'].astype(str).str.upper().to_numpy()
+    variant_len = np.array([len(v) for v in variant_seq], dtype=np.int64)
+    strand = df['strand'].to_numpy()
+    minus = strand == '-'
     
-    if ref_seq is None:
-        return None
+    window_start, _, variant_start = window_coordinates(df['start'].to_numpy(), df['end'].to_numpy(), variant_len)
+    offsets = oriented_variant_offset(variant_start, variant_len, strand)
+    ref_start = window_start + variant_start
     
-    # The sequence_2kb contains the variant_seq embedded in the center
-    # We need to replace the variant with the reference
-    sequence_2kb = row['sequence_2kb']
-    variant_seq = row['variant_seq']
+    sequences, well_formed = encode_sequences(df['sequence_2kb'])
+    status = np.where(well_formed, 'ok', 'sequence_not_2048bp').astype(object)
+    in_bounds = (offsets >= 0) & (offsets + variant_len <= WINDOW_SIZE)
+    status[well_formed & ~in_bounds] = 'offset_out_of_range'
     
-    # CRITICAL FIX: For minus strand, the sequence_2kb is reverse complemented,
-    # so we need to search for the reverse complement of variant_seq
-    if row['strand'] == '-':
-        variant_seq_to_find = reverse_complement(variant_seq)
-    else:
-        variant_seq_to_find = variant_seq
+    # Reference bases: one genome fetch per distinct site, not per variant
+    sites = pd.DataFrame({
+        'chromosome': df['chromosome'].to_numpy(), 'ref_start': ref_start,
+        'length': variant_len, 'strand': strand,
+    })
+    site_keys = sites.drop_duplicates()
+    reference = {}
+    for site in site_keys.itertuples(index=False):
+        reference[tuple(site)] = extract_reference_sequence(
+            genome, site.chromosome, int(site.ref_start), int(site.ref_start + site.length), site.strand
+        )
+    ref_seqs = [reference[key] for key in sites.itertuples(index=False, name=None)]
     
-    # Find and replace variant_seq with ref_seq
-    if variant_seq_to_find in sequence_2kb:
-        wt_sequence = sequence_2kb.replace(variant_seq_to_find, ref_seq, 1)
-        return wt_sequence
-    else:
-        # Debug: try both orientations to confirm issue
-        if variant_seq in sequence_2kb:
-            print(f"Warning: Found forward strand variant_seq in minus strand sequence for {row['variant_id']}")
-            wt_sequence = sequence_2kb.replace(variant_seq, ref_seq, 1)
-            return wt_sequence
-        else:
-            print(f"Warning: variant_seq not found in sequence_2kb for {row['variant_id']}")
-            return None
+    # Variants of one length are checked and spliced with a single fancy-index operation
+    for length in np.unique(variant_len):
+        rows = np.flatnonzero((variant_len == length) & (status == 'ok'))
+        if len(rows) == 0:
+            continue
+        expected, _ = encode_sequences(variant_seq[rows], width=length)
+        expected[minus[rows]] = reverse_complement_array(expected[minus[rows]])
+        observed = gather_windows(sequences[rows], offsets[rows], length)
+        mismatch = ~(observed == expected).all(axis=1)
+        status[rows[mismatch]] = 'variant_not_at_offset'
+        
+        ref_array, ref_ok = encode_sequences([ref_seqs[i] for i in rows], width=length)
+        status[rows[~ref_ok & ~mismatch]] = 'reference_unavailable'
+        splice = ~mismatch & ref_ok
+        sequences[rows[splice]] = scatter_windows(
+            sequences[rows[splice]], offsets[rows[splice]], ref_array[splice]
+        )
+    
+    ok = status == 'ok'
+    wt_sequences = [None] * n
+    for i, seq in zip(np.flatnonzero(ok), decode_sequences(sequences[ok])):
+        wt_sequences[i] = seq
+    
+    failed = df.loc[~ok, ['variant_idx', 'variant_id', 'variant_name', 'chromosome', 'start', 'end', 'strand', 'variant_seq']].copy()
+    failed['status'] = status[~ok]
+    failed['expected_offset'] = offsets[~ok]
+    # Where (if anywhere) the oriented variant actually occurs, for diagnosis
+    failed['found_at'] = [
+        seq.find(reverse_complement(v) if s == '-' else v) if isinstance(seq, str) else -1
+        for seq, v, s in zip(df.loc[~ok, 'sequence_2kb'], variant_seq[~ok], strand[~ok])
+    ]
+    return wt_sequences, failed
 
 
 def predict_sequence(dna_model, sequence, variant_id):
@@ -253,6 +359,42 @@ def predict_sequence(dna_model, sequence, variant_id):
     return predictions
 
 
+def predict_sequence_batch(dna_model, sequences, variant_ids, max_workers=DEFAULT_MAX_WORKERS, batch_size=None):
+    """
+    Predict a group of WT sequences in one multi-sequence submission, with
+    DNase, RNA-seq and CAGE requested together. Failed members are retried
+    individually (predict_batch); the batch latency is logged.
+    
+    Returns:
+        List of dictionaries with the same wt_* metrics as predict_sequence
+    """
+    outputs, stats = predict_batch(
+        dna_model, sequences,
+        [dna_client.OutputType.DNASE, dna_client.OutputType.RNA_SEQ, dna_client.OutputType.CAGE],
+        ['EFO:0002067'], max_workers
+    )
+    log_batch_latency(BATCH_LATENCY_FILE, stats, batch_size or len(sequences))
+    
+    results = []
+    for variant_id, output in zip(variant_ids, outputs):
+        predictions = {'variant_id': variant_id}
+        if isinstance(output, Exception):
+            print(f"Prediction failed for {variant_id}: {output}")
+            predictions['success'] = False
+            for name in ['dnase', 'rna', 'cage']:
+                for stat in ['mean', 'max', 'center']:
+                    predictions[f'wt_{name}_{stat}'] = np.nan
+        else:
+            for name, attr in [('dnase', 'dnase'), ('rna', 'rna_seq'), ('cage', 'cage')]:
+                values = getattr(output, attr).values
+                predictions[f'wt_{name}_mean'] = float(np.mean(values))
+                predictions[f'wt_{name}_max'] = float(np.max(values))
+                predictions[f'wt_{name}_center'] = float(np.mean(values[900:1100]))
+            predictions['success'] = True
+        results.append(predictions)
+    return results
+
+
 def save_checkpoint(results_df, checkpoint_num):
     """Save checkpoint to disk."""
     checkpoint_file = CHECKPOINT_DIR / f'wt_checkpoint_{checkpoint_num:04d}.csv'
@@ -272,23 +414,365 @@ def load_latest_checkpoint():
     return None, 0
 
 
-def main():
-    """Main execution function."""
+def plot_wt_vs_mutant_correlations(comparison_df, results_df, plot_file):
+    """
+    Hexbin grid of WT (top row) and mutant (bottom row) predictions vs MPRA.
+    matplotlib is imported here so --metrics-only runs never load it.
+    """
+    import matplotlib.pyplot as plt
     
-    # Step 1: Load mutant predictions
-    print("\n" + "="*80)
-    print("STEP 1: Load Mutant Variant Data")
-    print("="*80)
+    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
+    fig.suptitle('Wild-Type vs Mutant Prediction Comparison', fontsize=16, fontweight='bold')
     
-    mutant_file = BASE_DIR / 'outputs' / '02_alphagenome_predictions' / 'alphagenome_predictions_all_variants.csv'
-    if not mutant_file.exists():
-        print(f"ERROR: Mutant predictions file not found: {mutant_file}")
+    metrics = ['dnase_center', 'rna_center', 'cage_center']
+    metric_names = ['DNase-seq', 'RNA-seq', 'CAGE']
+    
+    for idx, (metric, name) in enumerate(zip(metrics, metric_names)):
+        # Top row: WT vs MPRA
+        ax1 = axes[0, idx]
+        valid = comparison_df[~comparison_df[f'wt_{metric}'].isna()]
+        ax1.hexbin(valid['mpra_log2_ratio'], valid[f'wt_{metric}'], gridsize=30, cmap='Blues', mincnt=1)
+        r_wt = results_df[results_df['metric'] == metric]['wt_pearson_r'].values[0]
+        p_wt = results_df[results_df['metric'] == metric]['wt_pearson_p'].values[0]
+        ax1.set_xlabel('MPRA log2(RNA/DNA)', fontsize=11)
+        ax1.set_ylabel(f'WT {name} Prediction', fontsize=11)
+        ax1.set_title(f'WT {name}\nr = {r_wt:.4f}, p = {p_wt:.2e}', fontsize=12, fontweight='bold')
+        ax1.grid(True, alpha=0.3)
+        
+        # Bottom row: Mutant vs MPRA
+        ax2 = axes[1, idx]
+        valid = comparison_df[~comparison_df[metric].isna()]
+        ax2.hexbin(valid['mpra_log2_ratio'], valid[metric], gridsize=30, cmap='Reds', mincnt=1)
+        r_mut = results_df[results_df['metric'] == metric]['mutant_pearson_r'].values[0]
+        p_mut = results_df[results_df['metric'] == metric]['mutant_pearson_p'].values[0]
+        ax2.set_xlabel('MPRA log2(RNA/DNA)', fontsize=11)
+        ax2.set_ylabel(f'Mutant {name} Prediction', fontsize=11)
+        ax2.set_title(f'Mutant {name}\nr = {r_mut:.4f}, p = {p_mut:.2e}', fontsize=12, fontweight='bold')
+        ax2.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    plt.savefig(plot_file, dpi=300, bbox_inches='tight')
+    print(f"✓ Saved plot: {plot_file}")
+    plt.close()
+
+
+def plot_mutation_effects(comparison_df, plot_file):
+    """
+    Histograms of mutation effects (mutant - WT) for each summary metric.
+    """
+    import matplotlib.pyplot as plt
+    
+    metrics = ['dnase_center', 'rna_center', 'cage_center']
+    metric_names = ['DNase-seq', 'RNA-seq', 'CAGE']
+    
+    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
+    fig.suptitle('Mutation Effect Distributions (Mutant - WT)', fontsize=16, fontweight='bold')
+    
+    for idx, (metric, name) in enumerate(zip(metrics, metric_names)):
+        ax = axes[idx]
+        delta_col = f'delta_{metric}'
+        valid = comparison_df[~comparison_df[delta_col].isna()]
+        
+        ax.hist(valid[delta_col], bins=50, color='purple', alpha=0.7, edgecolor='black')
+        mean_delta = valid[delta_col].mean()
+        median_delta = valid[delta_col].median()
+        
+        ax.axvline(0, color='red', linestyle='--', linewidth=2, label='No effect')
+        ax.axvline(mean_delta, color='blue', linestyle='-', linewidth=2, label=f'Mean = {mean_delta:.4f}')
+        ax.axvline(median_delta, color='green', linestyle='-', linewidth=2, label=f'Median = {median_delta:.4f}')
+        
+        ax.set_xlabel(f'Δ {name} (Mutant - WT)', fontsize=11)
+        ax.set_ylabel('Count', fontsize=11)
+        ax.set_title(f'{name} Mutation Effects', fontsize=12, fontweight='bold')
+        ax.legend()
+        ax.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    plt.savefig(plot_file, dpi=300, bbox_inches='tight')
+    print(f"✓ Saved plot: {plot_file}")
+    plt.close()
+
+
+def test_correlation_difference(comparison_df, metrics=SUMMARY_METRICS, n_boot=N_BOOTSTRAP, seed=BOOTSTRAP_SEED):
+    """
+    Test whether MPRA correlates differently with WT and mutant predictions.
+    
+    Both correlations share the MPRA vector, so they are dependent. Two
+    tests are run for every metric at once on the variants with MPRA, WT
+    and mutant values for all metrics:
+    - Steiger's z-test, using the WT-mutant prediction correlation
+    - a paired bootstrap of r_WT - r_mutant, with one resample shared by
+      the WT and mutant columns
+    
+    Returns:
+        DataFrame with one row per metric
+    """
+    wt_cols = [f'wt_{m}' for m in metrics]
+    complete = comparison_df[['mpra_log2_ratio'] + list(metrics) + wt_cols].dropna()
+    x = complete['mpra_log2_ratio'].to_numpy(float)
+    mutant = complete[list(metrics)].to_numpy(float)
+    wt = complete[wt_cols].to_numpy(float)
+    n = len(complete)
+    
+    r_wt = pearson_columns(x, wt)
+    r_mutant = pearson_columns(x, mutant)
+    # corr(WT_j, mutant_j) for each metric j
+    wt_c, mut_c = wt - wt.mean(axis=0), mutant - mutant.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_wt_mutant = np.einsum('ij,ij->j', wt_c, mut_c) / np.sqrt(
+            np.einsum('ij,ij->j', wt_c, wt_c) * np.einsum('ij,ij->j', mut_c, mut_c))
+    
+    z, p = steiger_z_test(r_wt, r_mutant, r_wt_mutant, n)
+    boot = paired_bootstrap_correlations(x, wt, mutant, n_boot=n_boot, seed=seed)
+    
+    return pd.DataFrame({
+        'metric': list(metrics),
+        'n_complete': n,
+        'wt_pearson_r': r_wt,
+        'mutant_pearson_r': r_mutant,
+        'delta_pearson_r': r_wt - r_mutant,
+        'wt_mutant_prediction_r': r_wt_mutant,
+        'steiger_z': z,
+        'steiger_p': p,
+        'bootstrap_ci_low': boot['diff_ci_low'],
+        'bootstrap_ci_high': boot['diff_ci_high'],
+        'bootstrap_p': boot['bootstrap_p'],
+        'n_bootstrap': n_boot,
+        'significant': (p < 0.05) & (boot['bootstrap_p'] < 0.05),
+    })
+
+
+def print_difference_tests(tests_df):
+    """Print the Steiger and bootstrap results for each metric."""
+    print(f"\nWT vs mutant correlation difference (N = {tests_df['n_complete'].iloc[0]:,}, "
+          f"{tests_df['n_bootstrap'].iloc[0]} bootstrap replicates):")
+    print("-" * 80)
+    for _, row in tests_df.iterrows():
+        print(f"  {row['metric']:<13s} Δr = {row['delta_pearson_r']:+.4f}  "
+              f"95% CI [{row['bootstrap_ci_low']:+.4f}, {row['bootstrap_ci_high']:+.4f}]  "
+              f"Steiger z = {row['steiger_z']:+.2f} (p = {row['steiger_p']:.2e})  "
+              f"bootstrap p = {row['bootstrap_p']:.3f}")
+    n_sig = int(tests_df['significant'].sum())
+    print(f"\n  Metrics with a significant WT vs mutant difference: {n_sig}/{len(tests_df)}")
+
+
+def run_compare_only(args):
+    """Re-run the dependent-correlation tests on a saved comparison table."""
+    comparison_file = OUTPUT_DIR / 'wildtype_vs_mutant_comparison.csv'
+    if not comparison_file.exists():
+        print(f"ERROR: Comparison file not found: {comparison_file}")
+        print("Run the full stage once first.")
+        return
+    
+    start = time.time()
+    comparison_df = load_table(comparison_file)
+    metrics = [m for m in SUMMARY_METRICS if m in comparison_df.columns and f'wt_{m}' in comparison_df.columns]
+    tests_df = test_correlation_difference(comparison_df, metrics, args.n_bootstrap, args.seed)
+    print_difference_tests(tests_df)
+    
+    tests_file = OUTPUT_DIR / 'correlation_difference_tests.csv'
+    tests_df.to_csv(tests_file, index=False)
+    print(f"\n✓ Saved tests to: {tests_file} ({time.time() - start:.1f}s)")
+
+
+def streamed_rows(mutant_file, wt_file, chunk_size):
+    """
+    Comparison rows (stage 02 columns, no sequences, plus wt_*) chunk by
+    chunk: the stage 02 table joined on variant_idx with the WT predictions,
+    or on its own when wt_file is None (its variant-mode wt_* columns).
+    """
+    def with_index(chunks):
+        offset = 0
+        for chunk in chunks:
+            if 'variant_idx' not in chunk.columns:
+                # Predictions written before stage 01 assigned variant_idx are in input order
+                chunk['variant_idx'] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+            offset += len(chunk)
+            yield chunk
+    
+    wt_columns = [f'wt_{m}' for m in SUMMARY_METRICS]
+    mutant_chunks = with_index(read_table_chunks(mutant_file, chunk_size))
+    if wt_file is None:
+        yield from mutant_chunks
         return
+    mutant_chunks = (chunk.drop(columns=[c for c in wt_columns if c in chunk.columns]) for chunk in mutant_chunks)
+    wt_chunks = read_table_chunks(wt_file, chunk_size, usecols=['variant_idx'] + wt_columns)
+    yield from join_sorted_chunks(mutant_chunks, wt_chunks, 'variant_idx')
+
+
+def compare_streamed(rows, comparison_file, n_boot=N_BOOTSTRAP, seed=BOOTSTRAP_SEED,
+                     sample_size=COMPARISON_SAMPLE_SIZE):
+    """
+    Steps 5-6 with bounded memory (--chunk-size). Each chunk of comparison
+    rows gets its delta_* columns and is appended to comparison_file, then
+    folded into running accumulators: Pearson r of MPRA vs mutant and vs
+    WT, the WT-mutant prediction correlation for Steiger's z, delta means
+    and a Poisson paired bootstrap. Spearman rho and median deltas come
+    from a sample of at most sample_size variants chosen by hash of
+    variant_idx (all of them in a library that size or smaller), which is
+    also returned for the figures.
     
-    df = pd.read_csv(mutant_file)
-    print(f"✓ Loaded {len(df):,} mutant variant predictions")
-    print(f"  - Success rate: {df['success'].mean()*100:.1f}%")
+    Returns:
+        (results_df, tests_df, sample_df, number of comparison rows)
+    """
+    wt_cols = [f'wt_{m}' for m in SUMMARY_METRICS]
+    delta_cols = [f'delta_{m}' for m in SUMMARY_METRICS]
+    n_metrics = len(SUMMARY_METRICS)
+    mutant_acc = [CorrelationAccumulator() for _ in SUMMARY_METRICS]
+    wt_acc = [CorrelationAccumulator() for _ in SUMMARY_METRICS]
+    complete_acc = {name: [CorrelationAccumulator() for _ in SUMMARY_METRICS]
+                    for name in ('wt', 'mutant', 'wt_mutant')}
+    bootstrap = PairedBootstrapAccumulator(n_boot, seed)
+    delta_sum, delta_n = np.zeros(n_metrics), np.zeros(n_metrics, dtype=int)
+    sample = None
+    
+    out = CsvAppender(comparison_file)
+    out.reset()
+    n_rows = 0
+    for chunk in rows:
+        if not len(chunk):
+            continue
+        x = chunk['mpra_log2_ratio'].to_numpy(float)
+        mutant = chunk[SUMMARY_METRICS].to_numpy(float)
+        wt = chunk[wt_cols].to_numpy(float)
+        delta = mutant - wt
+        chunk = chunk.reset_index(drop=True)
+        chunk = pd.concat([chunk.drop(columns=wt_cols), chunk[wt_cols], pd.DataFrame(delta, columns=delta_cols)], axis=1)
+        out.append(chunk)
+        n_rows += len(chunk)
+        
+        for j in range(n_metrics):
+            for acc, y in ((mutant_acc[j], mutant[:, j]), (wt_acc[j], wt[:, j])):
+                ok = ~np.isnan(x) & ~np.isnan(y)
+                acc.merge(CorrelationAccumulator.from_arrays(x[ok], y[ok]))
+        ok = ~np.isnan(delta)
+        delta_sum += np.where(ok, delta, 0.0).sum(axis=0)
+        delta_n += ok.sum(axis=0)
+        
+        # Complete cases for the dependent-correlation tests
+        complete = ~np.isnan(x) & ~np.isnan(mutant).any(axis=1) & ~np.isnan(wt).any(axis=1)
+        xc, mc, wc = x[complete], mutant[complete], wt[complete]
+        for j in range(n_metrics):
+            complete_acc['wt'][j].merge(CorrelationAccumulator.from_arrays(xc, wc[:, j]))
+            complete_acc['mutant'][j].merge(CorrelationAccumulator.from_arrays(xc, mc[:, j]))
+            complete_acc['wt_mutant'][j].merge(CorrelationAccumulator.from_arrays(wc[:, j], mc[:, j]))
+        bootstrap.update(xc, wc, mc)
+        
+        # Bottom-k sample by hash of variant_idx (uniform, independent of chunking)
+        keep = chunk[['variant_idx', 'mpra_log2_ratio'] + SUMMARY_METRICS + wt_cols + delta_cols].copy()
+        keep['_priority'] = [key_priority(str(i)) for i in keep['variant_idx']]
+        sample = keep if sample is None else pd.concat([sample, keep], ignore_index=True)
+        if len(sample) > sample_size:
+            sample = sample.nsmallest(sample_size, '_priority').reset_index(drop=True)
+    
+    if sample is None:
+        return None, None, None, 0
+    sample = sample.drop(columns='_priority').sort_values('variant_idx').reset_index(drop=True)
+    
+    mutant_pearson = [acc.pearson() for acc in mutant_acc]
+    wt_pearson = [acc.pearson() for acc in wt_acc]
+    sample_mutant = nan_correlations(sample['mpra_log2_ratio'], sample[SUMMARY_METRICS])
+    sample_wt = nan_correlations(sample['mpra_log2_ratio'], sample[wt_cols])
+    results_df = pd.DataFrame({
+        'metric': SUMMARY_METRICS,
+        'n_samples': [acc.n for acc in mutant_acc],
+        'n_wt_samples': [acc.n for acc in wt_acc],
+        'mutant_pearson_r': [r for r, _ in mutant_pearson],
+        'mutant_pearson_p': [p for _, p in mutant_pearson],
+        'mutant_spearman_r': sample_mutant['spearman_r'],
+        'wt_pearson_r': [r for r, _ in wt_pearson],
+        'wt_pearson_p': [p for _, p in wt_pearson],
+        'wt_spearman_r': sample_wt['spearman_r'],
+        'mean_delta': np.where(delta_n > 0, delta_sum / np.maximum(delta_n, 1), np.nan),
+        'median_delta': sample[delta_cols].median().to_numpy(),
+    })
+    results_df.insert(results_df.columns.get_loc('mean_delta'), 'delta_pearson_r',
+                      results_df['wt_pearson_r'] - results_df['mutant_pearson_r'])
+    results_df['improvement'] = np.where(results_df['wt_pearson_r'] > results_df['mutant_pearson_r'], 'Yes', 'No')
+    
+    n_complete = bootstrap.n
+    r_wt = np.array([acc.pearson()[0] for acc in complete_acc['wt']])
+    r_mutant = np.array([acc.pearson()[0] for acc in complete_acc['mutant']])
+    r_wt_mutant = np.array([acc.pearson()[0] for acc in complete_acc['wt_mutant']])
+    z, p = steiger_z_test(r_wt, r_mutant, r_wt_mutant, n_complete)
+    if n_complete:
+        boot = bootstrap.result()
+    else:
+        boot = {key: np.full(n_metrics, np.nan) for key in ('diff_ci_low', 'diff_ci_high', 'bootstrap_p')}
+    tests_df = pd.DataFrame({
+        'metric': SUMMARY_METRICS,
+        'n_complete': n_complete,
+        'wt_pearson_r': r_wt,
+        'mutant_pearson_r': r_mutant,
+        'delta_pearson_r': r_wt - r_mutant,
+        'wt_mutant_prediction_r': r_wt_mutant,
+        'steiger_z': z,
+        'steiger_p': p,
+        'bootstrap_ci_low': boot['diff_ci_low'],
+        'bootstrap_ci_high': boot['diff_ci_high'],
+        'bootstrap_p': boot['bootstrap_p'],
+        'n_bootstrap': n_boot,
+        'significant': (p < 0.05) & (boot['bootstrap_p'] < 0.05),
+    })
+    return results_df, tests_df, sample, n_rows
+
+
+def open_client(key_quota=None, key_cooldown=DEFAULT_COOLDOWN, channels=1, record=None, replay=None, replay_speed=1.0):
+    """ClientPool over the API keys (or a replay cassette); returns (pool, cassette or None)."""
+    print("\nInitializing AlphaGenome model...")
+    create, cassette = cassette_client_factory(record, replay, replay_speed)
+    dna_model = ClientPool([REPLAY_KEY] if replay is not None else api_keys, quota_per_key=key_quota,
+                           cooldown=key_cooldown, channels_per_key=channels, create=create)
+    if cassette is not None:
+        mode = 'Replaying' if replay is not None else 'Recording'
+        print(f"✓ {mode} API responses: {cassette.path} ({len(cassette):,} stored)")
+    reconnected = dna_model.check_health()
+    print(f"✓ Model initialized ({len(dna_model.keys)} API key(s) × {channels} channel(s)"
+          + (f", {reconnected} reconnected" if reconnected else "") + ")")
+    return dna_model, cassette
+
+
+def predict_wt_rows(dna_model, wt_df, start=0, batch_size=1, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    WT predictions of wt_df's rows from `start` on, in row order: one request
+    per sequence, or batch_size sequences per submission.
+    """
+    step = max(batch_size, 1)
+    for first in range(start, len(wt_df), step):
+        if batch_size > 1:
+            rows = range(first, min(first + step, len(wt_df)))
+            yield from predict_sequence_batch(
+                dna_model,
+                [wt_df['wt_sequence_2kb'].iat[i] for i in rows],
+                [wt_df['variant_id'].iat[i] for i in rows],
+                max_workers, batch_size
+            )
+        else:
+            yield predict_sequence(dna_model, wt_df['wt_sequence_2kb'].iat[first], wt_df['variant_id'].iat[first])
+
+
+def reconstruct_wildtype_table(genome_ref, df):
+    """
+    WT sequences of df's rows (reconstruct_wildtype_batch) as a table with
+    variant_idx and the variant's coordinates, plus the failed rows.
+    """
+    wt_seqs, failed_df = reconstruct_wildtype_batch(genome_ref, df)
+    reconstructed = np.array([seq is not None for seq in wt_seqs], dtype=bool)
+    wt_df = df.loc[reconstructed, ['variant_idx', 'variant_id', 'variant_name', 'chromosome', 'start', 'end', 'strand']].copy()
+    wt_df.insert(3, 'wt_sequence_2kb', [seq for seq in wt_seqs if seq is not None])
+    return wt_df.reset_index(drop=True), failed_df
+
+
+def predict_wildtype(df, batch_size=1, max_workers=DEFAULT_MAX_WORKERS, key_quota=None, key_cooldown=DEFAULT_COOLDOWN,
+                     channels=1, record=None, replay=None, replay_speed=1.0):
+    """
+    Reconstruct WT sequences from mm9 and predict them (steps 2-4), one
+    request per sequence or batch_size sequences per submission. With record
+    or replay (cassette paths), responses are stored in or served from a cassette.
     
+    Returns:
+        DataFrame of wt_* predictions keyed by variant_idx, or None on failure
+    """
     # Step 2: Load genome reference
     print("\n" + "="*80)
     print("STEP 2: Load MM9 Genome Reference")
@@ -296,7 +780,7 @@ def main():
     
     if not GENOME_FILE.exists():
         print(f"ERROR: Genome file not found: {GENOME_FILE}")
-        return
+        return None
     
     print(f"Loading genome from: {GENOME_FILE}")
     genome_ref = Fasta(str(GENOME_FILE))
@@ -308,27 +792,21 @@ def main():
     print("="*80)
     
     print("Extracting true reference sequences from mm9...")
-    wt_sequences = []
-    failed = 0
-    
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Reconstructing WT sequences"):
-        wt_seq = reconstruct_wildtype_sequence(genome_ref, row)
-        if wt_seq is not None:
-            wt_sequences.append({
-                'variant_id': row['variant_id'],
-                'wt_sequence_2kb': wt_seq,
-                'chromosome': row['chromosome'],
-                'start': row['start'],
-                'end': row['end'],
-                'strand': row['strand']
-            })
-        else:
-            failed += 1
+    start = time.time()
+    wt_df, failed_df = reconstruct_wildtype_table(genome_ref, df)
+    
+    print(f"\n✓ Reconstructed {len(wt_df):,} wild-type sequences in {time.time() - start:.2f}s")
+    if len(failed_df) > 0:
+        print(f"⚠ Failed to reconstruct {len(failed_df)} sequences:")
+        for status, count in failed_df['status'].value_counts().items():
+            print(f"  - {status}: {count}")
+        failed_file = OUTPUT_DIR / 'wildtype_reconstruction_failures.csv'
+        failed_df.to_csv(failed_file, index=False)
+        print(f"  Details saved to: {failed_file}")
     
-    wt_df = pd.DataFrame(wt_sequences)
-    print(f"\n✓ Reconstructed {len(wt_df):,} wild-type sequences")
-    if failed > 0:
-        print(f"⚠ Failed to reconstruct {failed} sequences")
+    if len(wt_df) == 0:
+        print("ERROR: No wild-type sequences could be reconstructed")
+        return None
     
     # Save reconstructed sequences
     wt_seq_file = OUTPUT_DIR / 'wildtype_sequences_reconstructed.csv'
@@ -350,10 +828,7 @@ def main():
         resume_from = 0
         existing_results = pd.DataFrame()
     
-    # Initialize AlphaGenome model
-    print("\nInitializing AlphaGenome model...")
-    dna_model = dna_client.create(api_key)
-    print("✓ Model initialized")
+    dna_model, cassette = open_client(key_quota, key_cooldown, channels, record, replay, replay_speed)
     
     # Run predictions
     print(f"\nRunning predictions for {len(wt_df) - resume_from:,} wild-type sequences...")
@@ -365,15 +840,8 @@ def main():
     
     start_time = time.time()
     
-    for idx in tqdm(range(resume_from, len(wt_df)), desc="Predicting WT sequences"):
-        row = wt_df.iloc[idx]
-        
-        predictions = predict_sequence(
-            dna_model,
-            row['wt_sequence_2kb'],
-            row['variant_id']
-        )
-        
+    wt_rows = predict_wt_rows(dna_model, wt_df, resume_from, batch_size, max_workers)
+    for idx, predictions in zip(tqdm(range(resume_from, len(wt_df)), desc="Predicting WT sequences"), wt_rows):
         all_predictions.append(predictions)
         
         # Checkpoint every N sequences
@@ -388,83 +856,360 @@ def main():
             print(f"\n  Checkpoint {checkpoint_num}: {idx+1}/{len(wt_df)} sequences")
             print(f"  Rate: {rate:.2f} seq/sec | ETA: {remaining/60:.1f} min")
     
-    # Final results
+    # Final results; predictions are made in wt_df order, so they align by position
     wt_predictions_df = pd.DataFrame(all_predictions)
+    wt_predictions_df['variant_idx'] = wt_df['variant_idx'].to_numpy()[:len(wt_predictions_df)]
     
     elapsed_total = time.time() - start_time
     print(f"\n✓ Completed {len(wt_predictions_df):,} predictions in {elapsed_total/60:.1f} minutes")
+    if batch_size > 1 and BATCH_LATENCY_FILE.exists():
+        print("\nBatch latency (all runs logged in batch_latency.csv):")
+        print(latency_summary(BATCH_LATENCY_FILE).to_string(index=False))
     print(f"  Success rate: {wt_predictions_df['success'].mean()*100:.1f}%")
     
     # Save final predictions
     wt_pred_file = OUTPUT_DIR / 'wildtype_predictions.csv'
     wt_predictions_df.to_csv(wt_pred_file, index=False)
     print(f"✓ Saved to: {wt_pred_file}")
+    dna_model.report(OUTPUT_DIR / 'api_key_usage.csv')
+    if cassette is not None:
+        print(f"✓ {cassette.summary()}")
+    return wt_predictions_df
+
+
+def stream_wildtype(mutant_file, chunk_size, batch_size=1, max_workers=DEFAULT_MAX_WORKERS, key_quota=None,
+                    key_cooldown=DEFAULT_COOLDOWN, channels=1, record=None, replay=None, replay_speed=1.0):
+    """
+    Steps 2-4 with bounded memory (--chunk-size). The stage 02 table is read
+    chunk_size rows at a time (reconstruction columns only); each chunk's
+    reconstructed sequences, reconstruction failures and WT predictions are
+    appended to their files before the next chunk is read. A restarted run
+    continues after the last variant_idx recorded in wt_stream_state.json,
+    first dropping any rows a crash left after it so no record is written twice.
     
-    # Step 5: Merge and compare
+    Returns:
+        path of the WT predictions (keyed by variant_idx, no sequences), or None on failure
+    """
     print("\n" + "="*80)
-    print("STEP 5: Compare Wild-Type vs Mutant Predictions")
+    print("STEP 2: Load MM9 Genome Reference")
     print("="*80)
     
-    # Merge WT predictions with mutant data
-    comparison_df = df.merge(wt_predictions_df, on='variant_id', how='inner')
+    if not GENOME_FILE.exists():
+        print(f"ERROR: Genome file not found: {GENOME_FILE}")
+        return None
     
-    print(f"✓ Merged {len(comparison_df):,} variants with both WT and mutant predictions")
+    print(f"Loading genome from: {GENOME_FILE}")
+    genome_ref = Fasta(str(GENOME_FILE))
+    print(f"✓ Genome loaded with {len(genome_ref.keys())} chromosomes")
     
-    # Calculate mutation effects (mutant - WT)
-    comparison_df['delta_dnase_center'] = comparison_df['dnase_center'] - comparison_df['wt_dnase_center']
-    comparison_df['delta_rna_center'] = comparison_df['rna_center'] - comparison_df['wt_rna_center']
-    comparison_df['delta_cage_center'] = comparison_df['cage_center'] - comparison_df['wt_cage_center']
+    print("\n" + "="*80)
+    print(f"STEPS 3-4: Reconstruct and Predict Wild-Type Sequences ({chunk_size:,} variants per chunk)")
+    print("="*80)
     
-    # Save comparison
-    comparison_file = OUTPUT_DIR / 'wildtype_vs_mutant_comparison.csv'
-    comparison_df.to_csv(comparison_file, index=False)
-    print(f"✓ Saved comparison to: {comparison_file}")
+    sequences_out = CsvAppender(OUTPUT_DIR / 'wildtype_sequences_reconstructed.csv')
+    predictions_out = CsvAppender(OUTPUT_DIR / 'wildtype_predictions.csv')
+    failures_out = CsvAppender(OUTPUT_DIR / 'wildtype_reconstruction_failures.csv')
     
-    # Step 6: Statistical analysis
+    state = None
+    if WT_STREAM_STATE_FILE.exists() and predictions_out.path.exists():
+        with open(WT_STREAM_STATE_FILE) as f:
+            state = json.load(f)
+        if state['input'] != str(mutant_file):
+            print(f"ERROR: The streamed WT predictions in {OUTPUT_DIR} were made from {state['input']}")
+            print(f"Clear {CHECKPOINT_DIR} before running on {mutant_file}")
+            return None
+    
+    if state is None:
+        print("Starting fresh predictions")
+        for appender in [sequences_out, predictions_out, failures_out]:
+            appender.reset()
+        last_idx, n_done, n_failed = -1, 0, 0
+    else:
+        last_idx, n_done, n_failed = state['last_variant_idx'], state['n_rows'], state['n_failed']
+        print(f"Resuming after variant_idx {last_idx} ({n_done:,} sequences completed)")
+        # Rows appended after the last saved state are predicted again
+        dropped = [truncate_csv(appender.path, 'variant_idx', last_idx, chunk_size)
+                   for appender in [sequences_out, predictions_out, failures_out]]
+        if dropped[1]:
+            print(f"  ⚠ Dropped {dropped[1]:,} WT predictions written after the last saved state")
+    
+    dna_model, cassette = open_client(key_quota, key_cooldown, channels, record, replay, replay_speed)
+    
+    start_time = time.time()
+    n_chunks, n_predicted, offset = 0, 0, 0
+    for chunk in pd.read_csv(mutant_file, usecols=lambda c: c in RECONSTRUCTION_COLUMNS, chunksize=chunk_size):
+        if 'variant_idx' not in chunk.columns:
+            chunk['variant_idx'] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+        offset += len(chunk)
+        chunk = chunk[chunk['variant_idx'] > last_idx].reset_index(drop=True)
+        if not len(chunk):
+            continue
+        
+        wt_df, failed_df = reconstruct_wildtype_table(genome_ref, chunk)
+        if len(failed_df):
+            failures_out.append(failed_df)
+            n_failed += len(failed_df)
+        predictions = list(predict_wt_rows(dna_model, wt_df, 0, batch_size, max_workers))
+        if predictions:
+            predictions_df = pd.DataFrame(predictions)
+            predictions_df['variant_idx'] = wt_df['variant_idx'].to_numpy()
+            sequences_out.append(wt_df)
+            predictions_out.append(predictions_df)
+        
+        n_done += len(wt_df)
+        n_predicted += len(wt_df)
+        n_chunks += 1
+        last_idx = int(chunk['variant_idx'].iloc[-1])
+        write_json_atomic(WT_STREAM_STATE_FILE, {'input': str(mutant_file), 'n_rows': n_done, 'n_failed': n_failed,
+                                                 'last_variant_idx': last_idx, 'timestamp': datetime.now().isoformat()})
+        
+        rate = n_predicted / max(time.time() - start_time, 1e-9)
+        print(f"  Chunk {n_chunks}: {n_done:,} sequences predicted | Rate: {rate:.2f} seq/sec | "
+              f"peak RSS {peak_rss_mb():.0f} MB")
+    
+    print(f"\n✓ Completed {n_predicted:,} predictions in {(time.time() - start_time)/60:.1f} minutes "
+          f"(peak RSS {peak_rss_mb():.0f} MB)")
+    if n_failed:
+        print(f"⚠ Failed to reconstruct {n_failed} sequences; details in: {failures_out.path}")
+    if batch_size > 1 and BATCH_LATENCY_FILE.exists():
+        print("\nBatch latency (all runs logged in batch_latency.csv):")
+        print(latency_summary(BATCH_LATENCY_FILE).to_string(index=False))
+    if not predictions_out.path.exists():
+        print("ERROR: No wild-type sequences could be reconstructed")
+        return None
+    
+    n_rows, n_success = 0, 0
+    for chunk in pd.read_csv(predictions_out.path, usecols=['success'], chunksize=chunk_size):
+        n_rows += len(chunk)
+        n_success += int(chunk['success'].astype(bool).sum())
+    print(f"  Success rate: {100 * n_success / max(n_rows, 1):.1f}%")
+    print(f"✓ Saved to: {predictions_out.path} (sequences in {sequences_out.path.name})")
+    dna_model.report(OUTPUT_DIR / 'api_key_usage.csv')
+    if cassette is not None:
+        print(f"✓ {cassette.summary()}")
+    return predictions_out.path
+
+
+def use_output_directory(output_dir):
+    """Send every output and checkpoint of this stage to output_dir."""
+    global OUTPUT_DIR, CHECKPOINT_DIR, BATCH_LATENCY_FILE, WT_STREAM_STATE_FILE
+    OUTPUT_DIR = output_dir
+    CHECKPOINT_DIR = output_dir / 'checkpoints'
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    BATCH_LATENCY_FILE = output_dir / 'batch_latency.csv'
+    WT_STREAM_STATE_FILE = CHECKPOINT_DIR / 'wt_stream_state.json'
+
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='Wild-type vs mutant validation')
+    parser.add_argument('--compare-only', action='store_true',
+                        help='Only test WT vs mutant correlation differences on the saved comparison table')
+    parser.add_argument('--n-bootstrap', type=int, default=N_BOOTSTRAP,
+                        help=f'Paired bootstrap replicates (default: {N_BOOTSTRAP})')
+    parser.add_argument('--seed', type=int, default=BOOTSTRAP_SEED,
+                        help='Random seed for the bootstrap')
+    parser.add_argument('--metrics-only', action='store_true',
+                        help='Write statistics tables only; never import matplotlib or render figures')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='WT sequences per predict_sequences submission (default: 1 = one request per sequence)')
+    parser.add_argument('--batch-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Client worker threads per batch submission (default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--key-quota', type=int, default=None,
+                        help='Requests each API key may make in this run (default: unlimited)')
+    parser.add_argument('--key-cooldown', type=float, default=DEFAULT_COOLDOWN,
+                        help=f'Seconds a key is quarantined after a quota error (default: {DEFAULT_COOLDOWN:.0f})')
+    parser.add_argument('--channels', type=int, default=1,
+                        help='Client connections per API key; with more than one, batches are fanned out '
+                             'over the pooled clients (default: 1)')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', type=Path, default=None, metavar='CASSETTE',
+                                help='Store every API response and its latency in this cassette file')
+    cassette_group.add_argument('--replay', type=Path, default=None, metavar='CASSETTE',
+                                help='Answer requests from this cassette instead of the API (no key needed)')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Multiplier on recorded latencies during --replay (0 = no delay; default: 1)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Reconstruct and predict WT sequences this many variants at a time, appending '
+                             'results to disk, so memory stays flat in the number of variants')
+    parser.add_argument('--use-variant-wt', action='store_true',
+                        help='Use the REF (wt_*) predictions of a stage 02 --mode variant run as wild-type '
+                             'instead of reconstructing WT from mm9 (they were predicted on the server\'s '
+                             'mouse reference, not mm9)')
+    parser.add_argument('--predictions', type=Path, default=MUTANT_FILE,
+                        help='Stage 02 predictions table (default: the stage 02 output)')
+    parser.add_argument('--output-dir', type=Path, default=None,
+                        help=f'Directory for this stage\'s outputs and checkpoints (default: {OUTPUT_DIR})')
+    args = parser.parse_args()
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error('--chunk-size must be positive')
+    if args.replay is not None and not args.replay.exists():
+        parser.error(f'cassette not found: {args.replay}')
+    return args
+
+
+def main():
+    """Main execution function."""
+    args = parse_args()
+    if args.output_dir is not None:
+        use_output_directory(args.output_dir)
+    
+    if args.compare_only:
+        run_compare_only(args)
+        return
+    
+    # Step 1: Load mutant predictions
     print("\n" + "="*80)
-    print("STEP 6: Statistical Analysis - WT vs Mutant Correlations")
+    print("STEP 1: Load Mutant Variant Data")
     print("="*80)
     
-    results = []
+    mutant_file = args.predictions
+    if not mutant_file.exists():
+        print(f"ERROR: Mutant predictions file not found: {mutant_file}")
+        return
+    
+    wt_columns = [f'wt_{m}' for m in SUMMARY_METRICS]
+    streaming = args.chunk_size is not None
+    if streaming:
+        # Streaming runs read the stage 02 table chunk by chunk in every step
+        columns = list(pd.read_csv(mutant_file, nrows=0).columns)
+        n_mutant, n_success = 0, 0
+        for chunk in pd.read_csv(mutant_file, usecols=['success'], chunksize=args.chunk_size):
+            n_mutant += len(chunk)
+            n_success += int(chunk['success'].astype(bool).sum())
+        df = None
+        print(f"✓ Found {n_mutant:,} mutant variant predictions (read {args.chunk_size:,} at a time)")
+        if 'variant_idx' not in columns:
+            print("  ⚠ No variant_idx column (older stage 02 output); using row order")
+        print(f"  - Success rate: {100 * n_success / max(n_mutant, 1):.1f}%")
+    else:
+        df = load_table(mutant_file, sequences=True)
+        columns = list(df.columns)
+        print(f"✓ Loaded {len(df):,} mutant variant predictions")
+        if 'variant_idx' not in df.columns:
+            # Predictions written before stage 01 assigned variant_idx are in input order
+            print("  ⚠ No variant_idx column (older stage 02 output); using row order")
+            df['variant_idx'] = np.arange(len(df), dtype=np.int64)
+        print(f"  - Success rate: {df['success'].mean()*100:.1f}%")
     
-    for pred_type in ['dnase_center', 'rna_center', 'cage_center']:
-        mutant_col = pred_type
-        wt_col = f'wt_{pred_type}'
+    # Steps 2-4: WT predictions. Stage 02 in variant mode already returned the
+    # REF allele alongside every mutant, but on the server's mouse reference
+    # rather than mm9, so those are only used on request
+    variant_wt = all(c in columns for c in wt_columns)
+    if variant_wt and not args.use_variant_wt:
+        print("\n⚠ Stage 02 ran in variant mode, but its REF predictions were requested in mm9")
+        print("  coordinates from a server whose mouse reference is not mm9; ignoring them and")
+        print("  reconstructing WT from mm9 (--use-variant-wt to use them anyway)")
+        if df is not None:
+            df = df.drop(columns=wt_columns)
+    elif args.use_variant_wt and not variant_wt:
+        print(f"ERROR: --use-variant-wt needs the wt_* columns of a stage 02 --mode variant run in {mutant_file.name}")
+        return
+    wt_file = None
+    if variant_wt and args.use_variant_wt:
+        print("\n⚠ Using stage 02's variant-mode REF predictions as wild-type (--use-variant-wt)")
+        print("  (skipping WT reconstruction and AlphaGenome requests; REF comes from the server's")
+        print("  mouse reference, not mm9)")
+        if df is not None:
+            wt_predictions_df = df[['variant_idx', 'variant_id'] + wt_columns + ['success']].copy()
+            df = df.drop(columns=wt_columns)
+    elif streaming:
+        wt_file = stream_wildtype(mutant_file, args.chunk_size, args.batch_size, args.batch_workers,
+                                  args.key_quota, args.key_cooldown, args.channels,
+                                  args.record, args.replay, args.replay_speed)
+        if wt_file is None:
+            return
+    else:
+        wt_predictions_df = predict_wildtype(df, args.batch_size, args.batch_workers,
+                                             args.key_quota, args.key_cooldown, args.channels,
+                                             args.record, args.replay, args.replay_speed)
+        if wt_predictions_df is None:
+            return
+    
+    # Step 5: Merge and compare
+    print("\n" + "="*80)
+    print("STEP 5: Compare Wild-Type vs Mutant Predictions")
+    print("="*80)
+    comparison_file = OUTPUT_DIR / 'wildtype_vs_mutant_comparison.csv'
+    
+    if streaming:
+        # Joined on variant_idx chunk by chunk; only accumulators and a bounded sample are kept
+        rows = streamed_rows(mutant_file, wt_file, args.chunk_size)
+        results_df, tests_df, comparison_df, n_compared = compare_streamed(
+            rows, comparison_file, args.n_bootstrap, args.seed)
+        if results_df is None:
+            print("ERROR: No variant has both WT and mutant predictions")
+            return
+        print(f"✓ Aligned {n_compared:,} variants with both WT and mutant predictions "
+              f"(peak RSS {peak_rss_mb():.0f} MB)")
+        print(f"✓ Saved comparison to: {comparison_file}")
+        if len(comparison_df) < n_compared:
+            print(f"  Spearman rho, median deltas and figures use a sample of {len(comparison_df):,} variants")
         
-        # Mutant correlation
-        valid_mask = ~(comparison_df['mpra_log2_ratio'].isna() | comparison_df[mutant_col].isna())
-        valid_data = comparison_df[valid_mask]
+        # Step 6: Statistical analysis
+        print("\n" + "="*80)
+        print("STEP 6: Statistical Analysis - WT vs Mutant Correlations")
+        print("="*80)
+    else:
+        df = df.drop(columns=[c for c in SEQUENCE_COLUMNS if c in df.columns])
         
-        if len(valid_data) > 3:
-            r_mutant, p_mutant = stats.pearsonr(valid_data['mpra_log2_ratio'], valid_data[mutant_col])
-            rho_mutant, p_spear_mutant = stats.spearmanr(valid_data['mpra_log2_ratio'], valid_data[mutant_col])
-        else:
-            r_mutant = p_mutant = rho_mutant = p_spear_mutant = np.nan
+        # Mutant and WT predictions as matrices aligned on variant_idx (row i = variant i)
+        n_index = int(max(df['variant_idx'].max(), wt_predictions_df['variant_idx'].max())) + 1
+        mutant = np.full((n_index, len(SUMMARY_METRICS)), np.nan)
+        mutant[df['variant_idx'].to_numpy()] = df[SUMMARY_METRICS].to_numpy(float)
+        mpra = np.full(n_index, np.nan)
+        mpra[df['variant_idx'].to_numpy()] = df['mpra_log2_ratio'].to_numpy(float)
+        wt = np.full((n_index, len(SUMMARY_METRICS)), np.nan)
+        wt[wt_predictions_df['variant_idx'].to_numpy()] = wt_predictions_df[wt_columns].to_numpy(float)
         
-        # WT correlation
-        valid_mask_wt = ~(comparison_df['mpra_log2_ratio'].isna() | comparison_df[wt_col].isna())
-        valid_data_wt = comparison_df[valid_mask_wt]
+        # Mutation effects (mutant - WT) for every metric at once
+        delta = mutant - wt
         
-        if len(valid_data_wt) > 3:
-            r_wt, p_wt = stats.pearsonr(valid_data_wt['mpra_log2_ratio'], valid_data_wt[wt_col])
-            rho_wt, p_spear_wt = stats.spearmanr(valid_data_wt['mpra_log2_ratio'], valid_data_wt[wt_col])
-        else:
-            r_wt = p_wt = rho_wt = p_spear_wt = np.nan
+        has_wt = np.zeros(n_index, dtype=bool)
+        has_wt[wt_predictions_df['variant_idx'].to_numpy()] = True
+        in_both = df['variant_idx'].to_numpy()[has_wt[df['variant_idx'].to_numpy()]]
+        
+        comparison_df = df[has_wt[df['variant_idx'].to_numpy()]].reset_index(drop=True)
+        comparison_df = pd.concat([
+            comparison_df,
+            pd.DataFrame(wt[in_both], columns=wt_columns),
+            pd.DataFrame(delta[in_both], columns=[f'delta_{m}' for m in SUMMARY_METRICS]),
+        ], axis=1)
+        
+        print(f"✓ Aligned {len(comparison_df):,} variants with both WT and mutant predictions")
+        
+        # Save comparison
+        comparison_df.to_csv(comparison_file, index=False)
+        print(f"✓ Saved comparison to: {comparison_file}")
+        
+        # Step 6: Statistical analysis
+        print("\n" + "="*80)
+        print("STEP 6: Statistical Analysis - WT vs Mutant Correlations")
+        print("="*80)
         
-        results.append({
-            'metric': pred_type,
-            'n_samples': len(valid_data),
-            'mutant_pearson_r': r_mutant,
-            'mutant_pearson_p': p_mutant,
-            'mutant_spearman_r': rho_mutant,
-            'wt_pearson_r': r_wt,
-            'wt_pearson_p': p_wt,
-            'wt_spearman_r': rho_wt,
-            'delta_pearson_r': r_wt - r_mutant,
-            'improvement': 'Yes' if r_wt > r_mutant else 'No'
+        # MPRA vs mutant and MPRA vs WT correlations, every metric in one call each
+        rows = in_both
+        mutant_corr = nan_correlations(mpra[rows], mutant[rows])
+        wt_corr = nan_correlations(mpra[rows], wt[rows])
+        
+        results_df = pd.DataFrame({
+            'metric': SUMMARY_METRICS,
+            'n_samples': mutant_corr['n'],
+            'n_wt_samples': wt_corr['n'],
+            'mutant_pearson_r': mutant_corr['pearson_r'],
+            'mutant_pearson_p': mutant_corr['pearson_p'],
+            'mutant_spearman_r': mutant_corr['spearman_r'],
+            'wt_pearson_r': wt_corr['pearson_r'],
+            'wt_pearson_p': wt_corr['pearson_p'],
+            'wt_spearman_r': wt_corr['spearman_r'],
+            'delta_pearson_r': wt_corr['pearson_r'] - mutant_corr['pearson_r'],
+            'mean_delta': np.nanmean(delta[rows], axis=0),
+            'median_delta': np.nanmedian(delta[rows], axis=0),
         })
-    
-    results_df = pd.DataFrame(results)
+        results_df['improvement'] = np.where(results_df['wt_pearson_r'] > results_df['mutant_pearson_r'], 'Yes', 'No')
+        
+        # Dependent-correlation tests (Steiger z and paired bootstrap)
+        tests_df = test_correlation_difference(comparison_df, SUMMARY_METRICS, args.n_bootstrap, args.seed)
     
     # Print results
     print("\nCORRELATION COMPARISON:")
@@ -475,6 +1220,14 @@ def main():
         print(f"  WT:      r = {row['wt_pearson_r']:+.4f}  (p = {row['wt_pearson_p']:.2e})")
         print(f"  Δ:       r = {row['delta_pearson_r']:+.4f}  ({row['improvement']} improvement)")
     
+    print_difference_tests(tests_df)
+    tests_df.to_csv(OUTPUT_DIR / 'correlation_difference_tests.csv', index=False)
+    results_df = results_df.merge(
+        tests_df[['metric', 'steiger_z', 'steiger_p', 'bootstrap_ci_low', 'bootstrap_ci_high',
+                  'bootstrap_p', 'significant']],
+        on='metric', how='left'
+    )
+    
     # Save results
     results_file = OUTPUT_DIR / 'correlation_comparison_summary.csv'
     results_df.to_csv(results_file, index=False)
@@ -485,70 +1238,13 @@ def main():
     print("STEP 7: Generate Visualizations")
     print("="*80)
     
-    # Create comparison plots
-    fig, axes = plt.subplots(2, 3, figsize=(18, 12))
-    fig.suptitle('Wild-Type vs Mutant Prediction Comparison', fontsize=16, fontweight='bold')
-    
-    metrics = ['dnase_center', 'rna_center', 'cage_center']
-    metric_names = ['DNase-seq', 'RNA-seq', 'CAGE']
-    
-    for idx, (metric, name) in enumerate(zip(metrics, metric_names)):
-        # Top row: WT vs MPRA
-        ax1 = axes[0, idx]
-        valid = comparison_df[~comparison_df[f'wt_{metric}'].isna()]
-        ax1.hexbin(valid['mpra_log2_ratio'], valid[f'wt_{metric}'], gridsize=30, cmap='Blues', mincnt=1)
-        r_wt = results_df[results_df['metric'] == metric]['wt_pearson_r'].values[0]
-        p_wt = results_df[results_df['metric'] == metric]['wt_pearson_p'].values[0]
-        ax1.set_xlabel('MPRA log2(RNA/DNA)', fontsize=11)
-        ax1.set_ylabel(f'WT {name} Prediction', fontsize=11)
-        ax1.set_title(f'WT {name}\nr = {r_wt:.4f}, p = {p_wt:.2e}', fontsize=12, fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        
-        # Bottom row: Mutant vs MPRA
-        ax2 = axes[1, idx]
-        valid = comparison_df[~comparison_df[metric].isna()]
-        ax2.hexbin(valid['mpra_log2_ratio'], valid[metric], gridsize=30, cmap='Reds', mincnt=1)
-        r_mut = results_df[results_df['metric'] == metric]['mutant_pearson_r'].values[0]
-        p_mut = results_df[results_df['metric'] == metric]['mutant_pearson_p'].values[0]
-        ax2.set_xlabel('MPRA log2(RNA/DNA)', fontsize=11)
-        ax2.set_ylabel(f'Mutant {name} Prediction', fontsize=11)
-        ax2.set_title(f'Mutant {name}\nr = {r_mut:.4f}, p = {p_mut:.2e}', fontsize=12, fontweight='bold')
-        ax2.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plot_file = OUTPUT_DIR / 'wildtype_vs_mutant_correlations.png'
-    plt.savefig(plot_file, dpi=300, bbox_inches='tight')
-    print(f"✓ Saved plot: {plot_file}")
-    plt.close()
-    
-    # Mutation effect distribution plot
-    fig, axes = plt.subplots(1, 3, figsize=(18, 5))
-    fig.suptitle('Mutation Effect Distributions (Mutant - WT)', fontsize=16, fontweight='bold')
-    
-    for idx, (metric, name) in enumerate(zip(metrics, metric_names)):
-        ax = axes[idx]
-        delta_col = f'delta_{metric}'
-        valid = comparison_df[~comparison_df[delta_col].isna()]
-        
-        ax.hist(valid[delta_col], bins=50, color='purple', alpha=0.7, edgecolor='black')
-        mean_delta = valid[delta_col].mean()
-        median_delta = valid[delta_col].median()
-        
-        ax.axvline(0, color='red', linestyle='--', linewidth=2, label='No effect')
-        ax.axvline(mean_delta, color='blue', linestyle='-', linewidth=2, label=f'Mean = {mean_delta:.4f}')
-        ax.axvline(median_delta, color='green', linestyle='-', linewidth=2, label=f'Median = {median_delta:.4f}')
-        
-        ax.set_xlabel(f'Δ {name} (Mutant - WT)', fontsize=11)
-        ax.set_ylabel('Count', fontsize=11)
-        ax.set_title(f'{name} Mutation Effects', fontsize=12, fontweight='bold')
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    delta_plot_file = OUTPUT_DIR / 'mutation_effect_distributions.png'
-    plt.savefig(delta_plot_file, dpi=300, bbox_inches='tight')
-    print(f"✓ Saved plot: {delta_plot_file}")
-    plt.close()
+    if args.metrics_only:
+        print("--metrics-only: skipping figures")
+    else:
+        plot_wt_vs_mutant_correlations(
+            comparison_df, results_df, OUTPUT_DIR / 'wildtype_vs_mutant_correlations.png'
+        )
+        plot_mutation_effects(comparison_df, OUTPUT_DIR / 'mutation_effect_distributions.png')
     
     # Final summary
     print("\n" + "="*80)
@@ -560,13 +1256,20 @@ def main():
     print("  - wildtype_predictions.csv")
     print("  - wildtype_vs_mutant_comparison.csv")
     print("  - correlation_comparison_summary.csv")
-    print("  - wildtype_vs_mutant_correlations.png")
-    print("  - mutation_effect_distributions.png")
+    print("  - correlation_difference_tests.csv")
+    if not args.metrics_only:
+        print("  - wildtype_vs_mutant_correlations.png")
+        print("  - mutation_effect_distributions.png")
     print(f"  - checkpoints/ ({len(list(CHECKPOINT_DIR.glob('*.csv')))} files)")
     
     print("\n" + "="*80)
     print("KEY FINDINGS:")
     print("="*80)
+    if results_df['wt_pearson_r'].isna().all():
+        # Constant WT predictions (e.g. every variant from one parent locus) have no correlation
+        print("\n⚠️  No WT correlation could be computed (WT predictions are constant)")
+        print("\n" + "="*80)
+        return
     best_metric = results_df.loc[results_df['wt_pearson_r'].idxmax()]
     print(f"\nBest WT correlation: {best_metric['metric']}")
     print(f"  WT:     r = {best_metric['wt_pearson_r']:+.4f}")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Step 6: Mutant vs Wild-Type Construct Pairing (delta-vs-delta benchmark)
+
+PURPOSE:
+The MPRA library contains a wild-type construct for every parent enhancer
+(e.g. MAC_chr13_46069370_46069386_+_TGAAGGTCAGAGTTTA, or PPREwt_129_..._wt)
+alongside its affinity-gradient mutants. Stages 03-05 benchmark absolute
+activity only. This stage pairs each mutant with its parent WT construct
+and benchmarks predicted effects against measured effects:
+
+    measured effect  = MPRA log2 ratio (mutant) - MPRA log2 ratio (WT)
+                     = log2 fold change of the mutant relative to WT
+    predicted effect = prediction (mutant) - prediction (WT)   [every metric]
+
+METHODOLOGY:
+1. Derive each construct's parent name from variant_name (strip '_{tf_info}')
+2. Hash-index the WT constructs by parent name and look every mutant up in
+   one pass (O(n), no merge on variant_id)
+3. Compute MPRA log2 fold changes and predicted deltas for all metrics
+4. Correlate measured vs predicted deltas (Pearson and Spearman)
+
+Mutants whose parent has no WT construct, whose parent name matches more
+than one WT construct, or whose WT construct lacks a measurement or a
+prediction are never dropped silently: each gets a pairing_status and is
+listed in unpaired_constructs.csv.
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from variant_annotations import construct_parent_name, is_wildtype_construct
+from mpra_stats import nan_correlations
+
+# Set paths
+BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
+DATA_DIR = BASE_DIR / 'outputs' / '02_alphagenome_predictions'
+OUTPUT_DIR = BASE_DIR / 'outputs' / '06_mutant_wt_pairing'
+
+MPRA_COL = 'mpra_log2_ratio'
+
+# Prediction summaries whose mutant - WT deltas are benchmarked
+SUMMARY_METRICS = [
+    'dnase_center', 'dnase_mean', 'dnase_max',
+    'rna_center', 'rna_mean', 'rna_max',
+    'cage_center', 'cage_mean', 'cage_max',
+]
+
+# Pairing status of each construct
+PAIRED = 'paired'
+IS_WILDTYPE = 'wt_construct'
+NO_WT = 'no_wt_construct'
+AMBIGUOUS_WT = 'ambiguous_wt'
+WT_UNUSABLE = 'wt_missing_measurement'
+
+
+def pair_with_wildtype(df):
+    """
+    Map every construct to the row of its parent WT construct.
+
+    WT constructs are hash-indexed by parent name; all constructs are then
+    looked up at once with Index.get_indexer.
+
+    Returns:
+        (int array of WT row positions, -1 where unpaired; status array)
+    """
+    parent = construct_parent_name(df).to_numpy()
+    is_wt = is_wildtype_construct(df).to_numpy()
+
+    wt_names = pd.Series(parent[is_wt], index=np.flatnonzero(is_wt))
+    duplicated = wt_names.duplicated(keep=False)
+    ambiguous = set(wt_names[duplicated])
+    unique_wt = wt_names[~duplicated]
+
+    lookup = pd.Index(unique_wt.to_numpy())
+    hit = lookup.get_indexer(parent)
+    wt_row = np.where(hit >= 0, unique_wt.index.to_numpy()[np.maximum(hit, 0)], -1)
+
+    status = np.full(len(df), PAIRED, dtype=object)
+    status[hit < 0] = NO_WT
+    status[np.isin(parent, list(ambiguous))] = AMBIGUOUS_WT
+    status[is_wt] = IS_WILDTYPE
+    wt_row[is_wt] = -1
+    return wt_row, status
+
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='Pair mutant MPRA constructs with their WT constructs')
+    parser.add_argument('--metrics', nargs='+', default=SUMMARY_METRICS,
+                        help='Prediction columns to compute deltas for (default: all summaries)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    metrics = args.metrics
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print("="*60)
+    print("Mutant vs Wild-Type Construct Pairing")
+    print("="*60)
+
+    # Load predictions
+    print("\nLoading predictions...")
+    df = pd.read_csv(DATA_DIR / 'alphagenome_predictions_all_variants.csv')
+    if 'variant_idx' not in df.columns:
+        df['variant_idx'] = np.arange(len(df), dtype=np.int64)
+    print(f"✓ Loaded {len(df):,} constructs")
+
+    # Pair every construct with its WT construct in one hash lookup
+    print("\nPairing constructs with their wild-type parents...")
+    wt_row, status = pair_with_wildtype(df)
+
+    # WT rows without an MPRA value or a successful prediction cannot anchor a delta
+    success = df['success'].fillna(False).astype(bool).to_numpy() if 'success' in df.columns \
+        else np.ones(len(df), dtype=bool)
+    usable = df[MPRA_COL].notna().to_numpy() & success
+    paired = status == PAIRED
+    status[paired & ~usable[np.maximum(wt_row, 0)]] = WT_UNUSABLE
+    paired = status == PAIRED
+    wt_row[~paired] = -1
+
+    for name, count in pd.Series(status).value_counts().items():
+        print(f"  {name:<24s} {count:,}")
+
+    # Measured and predicted effects, every metric in one step
+    idx = np.flatnonzero(paired)
+    wt_idx = wt_row[idx]
+    mpra = df[MPRA_COL].to_numpy(float)
+    pred = df[metrics].to_numpy(float)
+    mpra_log2fc = mpra[idx] - mpra[wt_idx]
+    pred_delta = pred[idx] - pred[wt_idx]
+    # Failed mutant predictions give NaN deltas and drop out per metric
+    pred_delta[~success[idx]] = np.nan
+
+    pairs = pd.DataFrame({
+        'variant_idx': df['variant_idx'].to_numpy()[idx],
+        'variant_name': df['variant_name'].to_numpy()[idx],
+        'tf_info': df['tf_info'].to_numpy()[idx],
+        'wt_variant_idx': df['variant_idx'].to_numpy()[wt_idx],
+        'wt_variant_name': df['variant_name'].to_numpy()[wt_idx],
+        'mpra_log2_ratio': mpra[idx],
+        'wt_mpra_log2_ratio': mpra[wt_idx],
+        'mpra_log2fc': mpra_log2fc,
+    })
+    pairs = pd.concat([pairs, pd.DataFrame(pred_delta, columns=[f'delta_{m}' for m in metrics])], axis=1)
+
+    unpaired = df.loc[~paired & (status != IS_WILDTYPE), ['variant_idx', 'variant_name', 'tf_info', 'pool']].copy()
+    unpaired['pairing_status'] = status[~paired & (status != IS_WILDTYPE)]
+    unpaired['parent_name'] = construct_parent_name(df)[~paired & (status != IS_WILDTYPE)].to_numpy()
+
+    # Benchmark: predicted delta vs measured log2 fold change
+    print("\n" + "="*60)
+    print("Predicted vs Measured Effects")
+    print("="*60)
+    corr = nan_correlations(mpra_log2fc, pred_delta)
+    delta_sd = np.nanstd(pred_delta, axis=0)
+    results_df = pd.DataFrame({
+        'metric': metrics,
+        'n_pairs': corr['n'],
+        'pearson_r': corr['pearson_r'],
+        'pearson_p': corr['pearson_p'],
+        'spearman_r': corr['spearman_r'],
+        'spearman_p': corr['spearman_p'],
+        'mean_mpra_log2fc': np.nanmean(mpra_log2fc),
+        'mean_predicted_delta': np.nanmean(pred_delta, axis=0),
+        'predicted_delta_sd': delta_sd,
+    })
+    print(f"\nPaired mutants: {len(pairs):,} | WT parents: {len(np.unique(wt_idx)):,}")
+    print(f"Mean MPRA log2FC (mutant vs WT): {np.nanmean(mpra_log2fc):+.4f}")
+    print(results_df[['metric', 'n_pairs', 'pearson_r', 'pearson_p', 'spearman_r', 'predicted_delta_sd']]
+          .to_string(index=False))
+
+    if len(pairs) > 0 and np.all(np.nan_to_num(delta_sd) == 0):
+        print("\n⚠ Every predicted delta is zero: mutant and WT constructs were given identical")
+        print("  2kb inputs, so no effect can be predicted. Check how stage 01 builds sequences.")
+
+    # Save outputs
+    pairs.to_csv(OUTPUT_DIR / 'mutant_wt_pairs.csv', index=False)
+    results_df.to_csv(OUTPUT_DIR / 'delta_correlations.csv', index=False)
+    unpaired.to_csv(OUTPUT_DIR / 'unpaired_constructs.csv', index=False)
+    print(f"\n✓ Saved to {OUTPUT_DIR}:")
+    print("  - mutant_wt_pairs.csv")
+    print("  - delta_correlations.csv")
+    print(f"  - unpaired_constructs.csv ({len(unpaired):,} constructs)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Record / replay cassette of AlphaGenome API responses
+
+Stages 02 and 05 hit the live service, so their timing depends on network
+latency and quota state and cannot be reproduced. With --record CASSETTE,
+every request made through the real dna_client is stored in a local
+cassette: a SQLite file keyed by a SHA-256 hash of the request (method,
+sequence or interval/variant, requested outputs, ontology terms), holding
+the zlib-compressed pickled response and the measured latency. A raised
+exception is stored as its type name, gRPC status code name and message
+(live gRPC errors hold channel state that does not pickle) and replayed
+as an error ClientPool classifies the same way. With --replay CASSETTE the same requests are answered
+from the cassette, sleeping for the recorded latency times
+--replay-speed (0 = no delay), so the prediction engine can be benchmarked
+offline with realistic timing and real track shapes. Requests missing from
+the cassette fail with CassetteMiss.
+
+Both modes plug into ClientPool through its client factory:
+
+    create, cassette = cassette_client_factory(record='run.cassette')
+    pool = ClientPool(keys, create=create)
+"""
+
+import builtins
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from enum import Enum
+from types import SimpleNamespace
+
+from alphagenome.models import dna_client
+
+# Client methods that are recorded and replayed
+CASSETTE_METHODS = ('predict_sequence', 'predict_sequences', 'predict_variant', 'predict_interval',
+                    'score_variant', 'output_metadata')
+
+# Placeholder key for replay runs, which need no real API key
+REPLAY_KEY = 'replay'
+
+
+class CassetteMiss(KeyError):
+    """A replayed request that was never recorded."""
+
+
+class RecordedError(Exception):
+    """
+    Replay of an exception raised while recording. code() returns the
+    recorded gRPC status like grpc.RpcError.code() does, so quota and
+    transport errors are quarantined and retried as they were live.
+    """
+
+    def __init__(self, type_name, status, message):
+        super().__init__(type_name, status, message)
+        self.type_name = type_name
+        self.status = status
+        self.message = message
+
+    def code(self):
+        return SimpleNamespace(name=self.status) if self.status else None
+
+    def __str__(self):
+        status = f" [{self.status}]" if self.status else ''
+        return f"{self.type_name}{status}: {self.message}"
+
+
+def error_surrogate(error):
+    """Picklable description of an exception: type name, gRPC status code name, message."""
+    code = getattr(error, 'code', None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    details = getattr(error, 'details', None)
+    if callable(details):
+        try:
+            details = details()
+        except Exception:
+            details = None
+    return {'type': type(error).__name__, 'status': getattr(code, 'name', None),
+            'message': details or str(error)}
+
+
+def rebuild_error(surrogate):
+    """
+    Exception for a stored error_surrogate: the builtin exception type when
+    the original was one (ConnectionError, TimeoutError, ...), otherwise a
+    RecordedError carrying the gRPC status.
+    """
+    builtin = getattr(builtins, surrogate['type'], None)
+    if surrogate['status'] is None and isinstance(builtin, type) and issubclass(builtin, Exception):
+        return builtin(surrogate['message'])
+    return RecordedError(surrogate['type'], surrogate['status'], surrogate['message'])
+
+
+def _normalize(value):
+    """JSON-serializable, order-stable form of a request argument."""
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}"
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if hasattr(value, '__dict__'):
+        return {'__type__': type(value).__name__, **_normalize(vars(value))}
+    return repr(value)
+
+
+def request_hash(method, args, kwargs):
+    """SHA-256 of a normalized request."""
+    payload = json.dumps([method, _normalize(list(args)), _normalize(kwargs)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Cassette:
+    """SQLite store of (request hash -> compressed response, latency)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' request_hash TEXT PRIMARY KEY, method TEXT, latency REAL,'
+            ' is_error INTEGER, payload BLOB, recorded REAL)'
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def put(self, key, method, latency, response, is_error=False):
+        payload = zlib.compress(pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (key, method, latency, int(is_error), payload, time.time())
+            )
+            self._db.commit()
+            self.recorded += 1
+
+    def get(self, key):
+        """(latency, response, is_error), or None if the request was never recorded."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT latency, payload, is_error FROM responses WHERE request_hash = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        latency, payload, is_error = row
+        return latency, pickle.loads(zlib.decompress(payload)), bool(is_error)
+
+    def summary(self):
+        """One-line description of this run's cassette activity."""
+        return (f"cassette {self.path}: {len(self):,} responses stored, {self.recorded:,} recorded, "
+                f"{self.hits:,} replayed, {self.misses:,} missing")
+
+
+class RecordingClient:
+    """Wraps a real client and stores every request's response and latency."""
+
+    def __init__(self, client, cassette):
+        self._client = client
+        self._cassette = cassette
+
+    def __getattr__(self, name):
+        target = getattr(self._client, name)
+        if name not in CASSETTE_METHODS:
+            return target
+
+        def record(*args, **kwargs):
+            key = request_hash(name, args, kwargs)
+            start = time.time()
+            try:
+                response = target(*args, **kwargs)
+            except Exception as e:
+                try:
+                    self._cassette.put(key, name, time.time() - start, error_surrogate(e), is_error=True)
+                except Exception as store_error:
+                    print(f"  ⚠ Could not record {name} error in the cassette: {store_error}")
+                raise
+            self._cassette.put(key, name, time.time() - start, response)
+            return response
+        return record
+
+
+class ReplayClient:
+    """Answers requests from a cassette with the recorded (scaled) latency."""
+
+    def __init__(self, cassette, latency_scale=1.0):
+        self._cassette = cassette
+        self.latency_scale = latency_scale
+
+    def __getattr__(self, name):
+        if name not in CASSETTE_METHODS:
+            raise AttributeError(name)
+
+        def replay(*args, **kwargs):
+            key = request_hash(name, args, kwargs)
+            entry = self._cassette.get(key)
+            if entry is None:
+                raise CassetteMiss(f"{name} request {key[:12]} not in {self._cassette.path}")
+            latency, response, is_error = entry
+            if self.latency_scale > 0:
+                time.sleep(latency * self.latency_scale)
+            if is_error:
+                # Cassettes recorded before errors were stored as surrogates hold the exception itself
+                raise response if isinstance(response, BaseException) else rebuild_error(response)
+            return response
+        return replay
+
+
+def cassette_client_factory(record=None, replay=None, latency_scale=1.0):
+    """
+    Client factory for ClientPool.
+
+    Returns:
+        (create(api_key) callable, Cassette or None)
+    """
+    if record and replay:
+        raise ValueError('Use either record or replay, not both')
+    if record:
+        cassette = Cassette(record)
+        return (lambda key: RecordingClient(dna_client.create(key), cassette)), cassette
+    if replay:
+        cassette = Cassette(replay)
+        return (lambda key: ReplayClient(cassette, latency_scale)), cassette
+    return dna_client.create, None
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark --metrics-only against full runs of the analysis stages
+
+Measures two things:
+1. Cold import time of the plotting stacks (matplotlib, seaborn, sklearn)
+   versus the statistics stack (pandas, scipy) in fresh interpreters
+2. End-to-end wall time of stages 03 and 04 in full mode and with
+   --metrics-only (stage 05 can be added with --stages, but it needs the
+   mm9 genome and completed WT checkpoints)
+
+Each measurement is repeated and the median is reported. Results are saved
+to outputs/benchmarks/metrics_only_timing.csv.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
+CODE_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = BASE_DIR / 'outputs' / 'benchmarks'
+
+STAGES = {
+    '03': '03_benchmark_correlations.py',
+    '04': '04_pparg_paradox_investigation.py',
+    '05': '05_wildtype_validation.py',
+}
+
+IMPORT_GROUPS = {
+    'statistics (pandas, scipy.stats)': 'import pandas, scipy.stats',
+    'plotting (matplotlib.pyplot, seaborn, sklearn.metrics)':
+        'import matplotlib.pyplot, seaborn, sklearn.metrics',
+}
+
+
+def time_command(cmd, repeats):
+    """Median wall time of a command over several runs (output discarded)."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=CODE_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time --metrics-only vs full analysis runs')
+    parser.add_argument('--stages', nargs='+', default=['03', '04'], choices=sorted(STAGES))
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print("="*60)
+    print("Metrics-only vs Full Mode Benchmark")
+    print("="*60)
+
+    rows = []
+
+    print("\nCold import times (fresh interpreter, median of "
+          f"{args.repeats}):")
+    baseline = time_command([sys.executable, '-c', 'pass'], args.repeats)
+    for name, statement in IMPORT_GROUPS.items():
+        elapsed = time_command([sys.executable, '-c', statement], args.repeats) - baseline
+        rows.append({'measurement': 'import', 'target': name, 'mode': '-', 'seconds': elapsed})
+        print(f"  {name:<55s} {elapsed:6.2f}s")
+
+    print("\nStage wall times:")
+    for stage in args.stages:
+        script = STAGES[stage]
+        # Full mode is run with --no-cache where supported so figures are really drawn
+        full_cmd = [sys.executable, script]
+        if stage == '03':
+            full_cmd.append('--no-cache')
+        full = time_command(full_cmd, args.repeats)
+        metrics = time_command([sys.executable, script, '--metrics-only'], args.repeats)
+        rows.append({'measurement': 'runtime', 'target': script, 'mode': 'full', 'seconds': full})
+        rows.append({'measurement': 'runtime', 'target': script, 'mode': 'metrics-only', 'seconds': metrics})
+        print(f"  {script:<40s} full {full:6.2f}s | metrics-only {metrics:6.2f}s "
+              f"| speedup {full / metrics:4.1f}×")
+
+    results_file = OUTPUT_DIR / 'metrics_only_timing.csv'
+    pd.DataFrame(rows).to_csv(results_file, index=False)
+    print(f"\n✓ Saved timings: {results_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark peak memory of the prediction stages, streamed vs in memory
+
+Stages 02 and 05 are run on synthetic inputs at several multiples of the
+real library (default 1x, 10x and 100x): the input table is written
+`scale` times over, with fresh variant_idx and variant_name values but the
+same sequences, so every request of a replicated record is the same
+request as the original's. The runs replay API responses from a cassette
+recorded once on the real library (02 --record CASSETTE and
+05 --record CASSETTE; both stages may share one file) with no delay, so
+no API key or quota is used and the runs are deterministic.
+
+Each run's peak resident set size is read from the kernel's rusage for
+that child process (os.wait4). With --chunk-size (stream mode) the peak
+should stay flat across scales; in memory mode it grows with the number
+of variants. Results are saved to outputs/benchmarks/streaming_memory.csv.
+
+In-memory runs at 100x hold every result row and sequence at once and
+need several GB; leave them out with --modes stream.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
+CODE_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = BASE_DIR / 'outputs' / 'benchmarks'
+
+STAGE_INPUTS = {
+    '02': BASE_DIR / 'outputs' / '01_prepared_data' / 'mpra_variants_with_2kb_sequences.csv',
+    '05': BASE_DIR / 'outputs' / '02_alphagenome_predictions' / 'alphagenome_predictions_all_variants.csv',
+}
+
+DEFAULT_SCALES = [1, 10, 100]
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def replicate_table(source, target, scale, chunk_size, distinct_sequences=False):
+    """
+    Write `scale` copies of source to target, chunk by chunk. Copy r gets
+    variant_idx + r * n and a '_rep{r}' suffix on variant_name. With
+    distinct_sequences, copy r's sequences are also rotated by r bases, so
+    no two copies share a sequence string (no longer replayable requests).
+
+    Returns:
+        number of rows written
+    """
+    n = sum(len(chunk) for chunk in pd.read_csv(source, usecols=['variant_name'], chunksize=chunk_size))
+    first = True
+    for rep in range(scale):
+        offset = 0
+        for chunk in pd.read_csv(source, chunksize=chunk_size):
+            if 'variant_idx' not in chunk.columns:
+                chunk['variant_idx'] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+            offset += len(chunk)
+            chunk['variant_idx'] = chunk['variant_idx'] + rep * n
+            if rep:
+                chunk['variant_name'] = chunk['variant_name'].astype(str) + f'_rep{rep}'
+            if rep and distinct_sequences and 'sequence_2kb' in chunk.columns:
+                seq = chunk['sequence_2kb'].astype(str)
+                chunk['sequence_2kb'] = seq.str.slice(rep) + seq.str.slice(0, rep)
+            chunk.to_csv(target, mode='w' if first else 'a', header=first, index=False)
+            first = False
+    return scale * n
+
+
+def run_measured(cmd, log_file):
+    """Run a command; returns (exit code, wall seconds, peak RSS of the child in MB)."""
+    start = time.perf_counter()
+    with open(log_file, 'w') as log:
+        proc = subprocess.Popen(cmd, cwd=CODE_DIR, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = usage.ru_maxrss / (1024 * 1024) if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    return os.waitstatus_to_exitcode(status), elapsed, peak
+
+
+def stage_command(stage, input_file, output_dir, cassette, mode, chunk_size):
+    """Command line of one benchmark run (replayed responses, no delay)."""
+    common = ['--output-dir', str(output_dir), '--replay', str(cassette), '--replay-speed', '0']
+    if stage == '02':
+        cmd = [sys.executable, '02_run_alphagenome_predictions.py', '--input', str(input_file),
+               '--schedule', 'file', '--retry-rounds', '0'] + common
+    else:
+        cmd = [sys.executable, '05_wildtype_validation.py', '--predictions', str(input_file),
+               '--metrics-only', '--n-bootstrap', '100'] + common
+    if mode == 'stream':
+        cmd += ['--chunk-size', str(chunk_size)]
+    return cmd
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory of streamed vs in-memory prediction stages')
+    parser.add_argument('--cassette', type=Path, required=True,
+                        help='Cassette recorded on the real library by stages 02 and 05 (--record)')
+    parser.add_argument('--stages', nargs='+', default=['02', '05'], choices=sorted(STAGE_INPUTS))
+    parser.add_argument('--scales', nargs='+', type=int, default=DEFAULT_SCALES,
+                        help=f'Multiples of the library to run (default: {" ".join(map(str, DEFAULT_SCALES))})')
+    parser.add_argument('--modes', nargs='+', default=['stream', 'memory'], choices=['stream', 'memory'])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'--chunk-size of the stream runs (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--work-dir', type=Path, default=OUTPUT_DIR / 'streaming_memory_runs',
+                        help='Scratch directory for synthetic inputs and run outputs')
+    parser.add_argument('--keep', action='store_true', help='Keep the synthetic inputs and run outputs')
+    args = parser.parse_args()
+
+    if not args.cassette.exists():
+        print(f"ERROR: Cassette not found: {args.cassette}")
+        print("Record one with 02_run_alphagenome_predictions.py --record and 05_wildtype_validation.py --record")
+        sys.exit(1)
+    for stage in args.stages:
+        if not STAGE_INPUTS[stage].exists():
+            print(f"ERROR: Stage {stage} input not found: {STAGE_INPUTS[stage]}")
+            sys.exit(1)
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    (args.work_dir / 'logs').mkdir(exist_ok=True)
+
+    print("="*60)
+    print("STREAMING MEMORY BENCHMARK")
+    print("="*60)
+
+    rows = []
+    for stage in args.stages:
+        for scale in sorted(args.scales):
+            input_file = args.work_dir / f'input_{stage}_x{scale}.csv'
+            n_records = replicate_table(STAGE_INPUTS[stage], input_file, scale, args.chunk_size)
+            print(f"\nStage {stage} at {scale}x: {n_records:,} records")
+            for mode in args.modes:
+                name = f'{stage}_{mode}_x{scale}'
+                output_dir = args.work_dir / name
+                shutil.rmtree(output_dir, ignore_errors=True)
+                cmd = stage_command(stage, input_file, output_dir, args.cassette, mode, args.chunk_size)
+                code, elapsed, peak = run_measured(cmd, args.work_dir / 'logs' / f'{name}.log')
+                status = '✓' if code == 0 else f'⚠ exit {code}'
+                print(f"  {mode:<7s} peak RSS {peak:8.1f} MB | {elapsed:8.1f}s | {status}")
+                rows.append({'stage': stage, 'mode': mode, 'scale': scale, 'n_records': n_records,
+                             'chunk_size': args.chunk_size if mode == 'stream' else None,
+                             'peak_rss_mb': peak, 'wall_seconds': elapsed, 'exit_code': code})
+                if not args.keep:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+            if not args.keep:
+                input_file.unlink(missing_ok=True)
+
+    results = pd.DataFrame(rows)
+    results_file = OUTPUT_DIR / 'streaming_memory.csv'
+    results.to_csv(results_file, index=False)
+
+    print("\n" + "="*60)
+    print("Peak RSS growth from the smallest to the largest scale:")
+    print("="*60)
+    for (stage, mode), group in results[results['exit_code'] == 0].groupby(['stage', 'mode']):
+        group = group.sort_values('scale')
+        first, last = group.iloc[0], group.iloc[-1]
+        print(f"  Stage {stage} {mode:<7s} {first['peak_rss_mb']:8.1f} MB at {first['scale']}x -> "
+              f"{last['peak_rss_mb']:8.1f} MB at {last['scale']}x ({last['peak_rss_mb'] / first['peak_rss_mb']:.2f}x)")
+    print(f"\n✓ Saved to: {results_file} (run logs in {args.work_dir / 'logs'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading the prediction tables with and without the compact schema
+
+Every table the analysis stages read through table_schema.load_table is
+loaded in a fresh interpreter, once with default pd.read_csv dtypes and
+once with load_table (categorical labels, int32 coordinates, float32
+predictions, no sequences). For each load the script records:
+
+- wall time of the load (median over --repeats)
+- the DataFrame's own memory (memory_usage(deep=True), which counts every
+  row's strings even where the parser shares one object between rows
+  with the same value)
+- resident memory retained after the load, and the growth of the peak
+  RSS during it (which includes the parser's temporary buffers); both
+  are measured from the RSS just before the load (Linux /proc)
+
+--scales N writes the stage 02 table N times over (fresh variant_idx and
+variant_name, same labels, each copy's sequences rotated so every row's
+sequence is a distinct string) to see how both grow with the library.
+Results are saved to outputs/benchmarks/table_schema.csv.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from benchmark_streaming_memory import replicate_table
+
+BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
+CODE_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = BASE_DIR / 'outputs' / 'benchmarks'
+PRED_DIR = BASE_DIR / 'outputs' / '02_alphagenome_predictions'
+
+TABLES = {
+    'predictions': PRED_DIR / 'alphagenome_predictions_all_variants.csv',
+    'by_ontology': PRED_DIR / 'alphagenome_predictions_by_ontology.csv',
+    'track_summaries_dnase': PRED_DIR / 'track_summaries_dnase.csv',
+    'wildtype_comparison': BASE_DIR / 'outputs' / '05_wildtype_validation' / 'wildtype_vs_mutant_comparison.csv',
+}
+
+LOADERS = {
+    'default': 'pd.read_csv(path)',
+    'schema': 'load_table(path)',
+}
+
+# Run in a fresh interpreter (cwd = code/), prints one JSON line
+LOAD_SCRIPT = """
+import json, sys, time
+import pandas as pd
+from table_schema import load_table
+from chunked_tables import peak_rss_mb
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS')) / 1024
+
+path = sys.argv[1]
+before = rss_mb()
+start = time.perf_counter()
+df = {loader}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'retained_rss_mb': rss_mb() - before,
+                  'peak_rss_growth_mb': max(peak_rss_mb() - before, 0.0),
+                  'frame_mb': df.memory_usage(deep=True).sum() / 2**20,
+                  'rows': len(df), 'columns': df.shape[1]}}))
+"""
+
+
+def measure_load(path, mode, repeats):
+    """Median load time and memory of one table in one mode, each repeat in a fresh process."""
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', LOAD_SCRIPT.format(loader=LOADERS[mode]), str(path)],
+                                cwd=CODE_DIR, check=True, capture_output=True, text=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    runs = pd.DataFrame(runs)
+    return {
+        'rows': int(runs['rows'].iloc[0]),
+        'columns': int(runs['columns'].iloc[0]),
+        'seconds': float(runs['seconds'].median()),
+        'frame_mb': float(runs['frame_mb'].median()),
+        'retained_rss_mb': float(runs['retained_rss_mb'].median()),
+        'peak_rss_growth_mb': float(runs['peak_rss_growth_mb'].median()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load time and memory of the compact table schema')
+    parser.add_argument('--tables', nargs='+', default=sorted(TABLES), choices=sorted(TABLES))
+    parser.add_argument('--scales', nargs='+', type=int, default=[1],
+                        help='Multiples of the stage 02 table to load (default: 1)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--work-dir', type=Path, default=OUTPUT_DIR / 'table_schema_inputs',
+                        help='Scratch directory for replicated tables (--scales > 1)')
+    args = parser.parse_args()
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print("="*60)
+    print("TABLE SCHEMA BENCHMARK")
+    print("="*60)
+
+    targets = []
+    for name in args.tables:
+        if not TABLES[name].exists():
+            print(f"  ⚠ Skipping {name}: {TABLES[name]} not found")
+            continue
+        targets.append((name, 1, TABLES[name]))
+    if 'predictions' in [name for name, _, _ in targets]:
+        for scale in sorted(set(args.scales) - {1}):
+            args.work_dir.mkdir(parents=True, exist_ok=True)
+            path = args.work_dir / f'predictions_x{scale}.csv'
+            replicate_table(TABLES['predictions'], path, scale, chunk_size=10000, distinct_sequences=True)
+            targets.append(('predictions', scale, path))
+
+    rows = []
+    for name, scale, path in targets:
+        print(f"\n{name} ({scale}x, {path.stat().st_size / 2**20:.1f} MB on disk):")
+        for mode in LOADERS:
+            stats = measure_load(path, mode, args.repeats)
+            rows.append({'table': name, 'scale': scale, 'mode': mode, **stats})
+            print(f"  {mode:<8s} {stats['rows']:>9,} rows × {stats['columns']:>3} cols | "
+                  f"frame {stats['frame_mb']:7.1f} MB | RSS +{stats['retained_rss_mb']:7.1f} MB "
+                  f"(peak +{stats['peak_rss_growth_mb']:7.1f}) | "
+                  f"{stats['seconds']:6.2f}s")
+        if scale > 1:
+            path.unlink()
+
+    results = pd.DataFrame(rows)
+    results_file = OUTPUT_DIR / 'table_schema.csv'
+    results.to_csv(results_file, index=False)
+
+    print("\n" + "="*60)
+    print("Schema vs default (ratio, lower is better):")
+    print("="*60)
+    wide = results.pivot_table(index=['table', 'scale'], columns='mode',
+                               values=['frame_mb', 'retained_rss_mb', 'peak_rss_growth_mb', 'seconds'])
+    for (name, scale), row in wide.iterrows():
+        ratios = {m: row[(m, 'schema')] / row[(m, 'default')] if row[(m, 'default')] > 0 else np.nan
+                  for m in ['frame_mb', 'retained_rss_mb', 'peak_rss_growth_mb', 'seconds']}
+        print(f"  {name:<22s} {scale:>4}x  frame {ratios['frame_mb']:.2f}  RSS {ratios['retained_rss_mb']:.2f}  "
+              f"peak RSS {ratios['peak_rss_growth_mb']:.2f}  load time {ratios['seconds']:.2f}")
+    print(f"\n✓ Saved to: {results_file}")
+
+
+if __name__ == '__main__':
+    main()
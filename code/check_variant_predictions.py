@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Offline check of stage 02's variant-mode summaries
+
+predict_for_variant turns one predict_variant response into the ALT metric
+columns and the wt_* REF columns. This script runs it against a fake
+client whose REF and ALT tracks are distinct, position-dependent ramps
+(so a swapped allele or an unreversed minus strand changes every value)
+and compares the result with summaries computed here from the same
+arrays. It also checks the request itself (organism, ontology term,
+interval and variant) and that build_variant_requests reads REF at the
+window offset stage 01 inserted ALT, with a 1-based variant position.
+
+No API key, genome or network is needed. Exits non-zero on any mismatch.
+"""
+
+import importlib.util
+import os
+import sys
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from types import SimpleNamespace
+
+CODE_DIR = Path(__file__).resolve().parent
+
+# Output type -> (attribute on the response, number of tracks)
+OUTPUTS = {'dnase': ('dnase', 2), 'rna': ('rna_seq', 3), 'cage': ('cage', 2)}
+
+
+def load_stage02():
+    """Import 02_run_alphagenome_predictions.py as a module (its name is not importable)."""
+    os.environ.setdefault('ALPHA_GENOME_API_KEY', 'offline-check')
+    spec = importlib.util.spec_from_file_location('stage02', CODE_DIR / '02_run_alphagenome_predictions.py')
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(CODE_DIR))
+    spec.loader.exec_module(module)
+    return module
+
+
+def ramp_tracks(offset, n_tracks, length=2048):
+    """Tracks rising along the window, each track and allele on its own level."""
+    positions = np.arange(length, dtype=np.float64)[:, None]
+    values = offset + positions / length + np.arange(n_tracks)[None, :]
+    return SimpleNamespace(values=values, metadata=pd.DataFrame({'name': [f'track_{j}' for j in range(n_tracks)]}))
+
+
+def fake_allele_output(offset):
+    return SimpleNamespace(**{attr: ramp_tracks(offset + 10 * i, n_tracks)
+                              for i, (attr, n_tracks) in enumerate(OUTPUTS.values())})
+
+
+class FakeVariantClient:
+    """Stands in for the ClientPool: answers predict_variant with known REF/ALT tracks."""
+
+    def __init__(self):
+        self.reference = fake_allele_output(0.0)
+        self.alternate = fake_allele_output(100.0)
+        self.calls = []
+
+    def predict_variant(self, **request):
+        self.calls.append(request)
+        return SimpleNamespace(reference=self.reference, alternate=self.alternate)
+
+
+def expected_summaries(allele_output, strand, prefix):
+    expected = {}
+    for name, (attr, _) in OUTPUTS.items():
+        values = getattr(allele_output, attr).values
+        if strand == '-':
+            values = values[::-1]
+        expected[f'{prefix}{name}_mean'] = float(np.mean(values))
+        expected[f'{prefix}{name}_max'] = float(np.max(values))
+        expected[f'{prefix}{name}_center'] = float(np.mean(values[900:1100]))
+    return expected
+
+
+def compare(label, got, expected):
+    """Print one ✓/✗ line per check; returns the number of mismatches."""
+    bad = [key for key, value in expected.items() if not np.isclose(got.get(key, np.nan), value)]
+    if bad:
+        print(f"  ✗ {label}: {', '.join(f'{k} = {got.get(k)} (expected {expected[k]:.6f})' for k in bad)}")
+    else:
+        print(f"  ✓ {label}")
+    return len(bad)
+
+
+def check_summaries(stage02):
+    failures = 0
+    for strand in ['+', '-']:
+        client = FakeVariantClient()
+        stage02.dna_model = client
+        interval = stage02.genome.Interval(chromosome='chr1', start=1000, end=3048)
+        variant = stage02.genome.Variant(chromosome='chr1', position=2021,
+                                         reference_bases='A', alternate_bases='G')
+        preds = stage02.predict_for_variant(interval, variant, 'check_variant', strand)
+
+        if not preds['success']:
+            print(f"  ✗ strand {strand}: prediction failed ({preds['error']})")
+            failures += 1
+            continue
+        failures += compare(f"strand {strand}: ALT tracks fill the metric columns",
+                            preds, expected_summaries(client.alternate, strand, ''))
+        failures += compare(f"strand {strand}: REF tracks fill the wt_* columns",
+                            preds, expected_summaries(client.reference, strand, 'wt_'))
+
+        request = client.calls[0]
+        checks = {
+            'one request for REF and ALT': len(client.calls) == 1,
+            'mouse organism': request['organism'] == stage02.dna_client.Organism.MUS_MUSCULUS,
+            f'default ontology {stage02.DEFAULT_ONTOLOGY}': list(request['ontology_terms']) == [stage02.DEFAULT_ONTOLOGY],
+            'interval and variant passed through': request['interval'] is interval and request['variant'] is variant,
+        }
+        for label, ok in checks.items():
+            print(f"  {'✓' if ok else '✗'} strand {strand}: {label}")
+            failures += not ok
+    return failures
+
+
+def check_requests(stage02):
+    """REF is read at the ALT offset of the window; Variant positions are 1-based."""
+    rng = np.random.default_rng(0)
+    chromosome = ''.join(rng.choice(list('ACGT'), size=20000))
+    genome_ref = {stage02.CHR_MAP['chr1']: chromosome}
+    df = pd.DataFrame({'chromosome': ['chr1', 'chr1'], 'start': [5000, 8000], 'end': [5020, 8030],
+                       'variant_seq': ['acgtacgt', 'TTGCA']})
+    requests = stage02.build_variant_requests(df, genome_ref, verbose=False)
+
+    failures = 0
+    window_start, window_end, variant_start = stage02.window_coordinates(
+        df['start'].to_numpy(), df['end'].to_numpy(), df['variant_seq'].str.len().to_numpy()
+    )
+    for i, (interval, variant) in enumerate(requests):
+        ref_start = int(window_start[i] + variant_start[i])
+        alt = df['variant_seq'].iat[i].upper()
+        checks = {
+            'window matches stage 01': (interval.start, interval.end) == (int(window_start[i]), int(window_end[i])),
+            'REF read from the genome at the ALT offset': variant.reference_bases == chromosome[ref_start:ref_start + len(alt)],
+            'ALT is variant_seq (forward strand)': variant.alternate_bases == alt,
+            '1-based position': variant.position == ref_start + 1,
+        }
+        for label, ok in checks.items():
+            print(f"  {'✓' if ok else '✗'} record {i}: {label}")
+            failures += not ok
+    return failures
+
+
+def main():
+    print("="*60)
+    print("VARIANT-MODE SUMMARY CHECK (fake client, no API)")
+    print("="*60)
+    stage02 = load_stage02()
+
+    print("\nREF/ALT summaries of predict_for_variant:")
+    failures = check_summaries(stage02)
+    print("\nREF/ALT requests of build_variant_requests:")
+    failures += check_requests(stage02)
+
+    print("\n" + "="*60)
+    if failures:
+        print(f"✗ {failures} check(s) failed")
+        sys.exit(1)
+    print("✓ Variant-mode REF/ALT mapping is consistent")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Chunked CSV tables for the bounded-memory prediction passes
+
+With --chunk-size, stages 02 and 05 read their input with
+pd.read_csv(chunksize=...) and write each chunk's results before reading
+the next, so peak memory depends on the chunk size, not on the number of
+variants:
+
+- CsvAppender appends frames to a CSV file under a fixed header (taken from
+  the first frame, or from the file when a run resumes)
+- patch_csv rewrites a CSV chunk by chunk, replacing the rows of a few
+  records (the retry pass patches recovered records this way)
+- truncate_csv drops the rows a crashed run appended after its last saved
+  state, so a resumed run does not write those records twice
+- write_json_atomic replaces a state file in one step (temporary file +
+  os.replace), so a crash never leaves it half-written
+- join_sorted_chunks inner-joins two chunked tables sorted on the same key,
+  holding at most about one chunk of each at a time
+- column_summary computes count / min / max / mean / std over a stream of
+  frames with Chan's pairwise update, so summaries never need the whole
+  table in memory
+- peak_rss_mb reports the process's peak resident set size
+"""
+
+import json
+import os
+import resource
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class CsvAppender:
+    """Append DataFrames to one CSV file under a fixed set of columns."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.columns = None
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self.columns = list(pd.read_csv(self.path, nrows=0).columns)
+
+    def append(self, frame):
+        """
+        Write frame's rows. The first frame written sets the header; later
+        frames are aligned to it (missing columns are left empty, extra
+        columns dropped).
+        """
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            frame.to_csv(self.path, index=False)
+        else:
+            frame.reindex(columns=self.columns).to_csv(self.path, mode='a', header=False, index=False)
+
+    def reset(self):
+        """Delete the file so the next append starts a new table."""
+        self.path.unlink(missing_ok=True)
+        self.columns = None
+
+
+def patch_csv(path, fixed, keys, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replace the rows of a CSV whose key columns match rows of `fixed`,
+    reading and rewriting the file chunk_size rows at a time. Only the
+    columns `fixed` shares with the file are overwritten; records the file
+    does not contain yet are appended at the end.
+
+    Returns:
+        number of rows replaced
+    """
+    path = Path(path)
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    fixed = fixed.drop_duplicates(keys, keep='last').set_index(keys)
+    tmp_path = path.with_name(path.name + '.tmp')
+    found = set()
+    header = None
+    first = True
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        if header is None:
+            header = list(chunk.columns)
+            cols = [c for c in fixed.columns if c in header]
+        index = pd.MultiIndex.from_frame(chunk[keys]) if len(keys) > 1 else pd.Index(chunk[keys[0]])
+        hit = index.isin(fixed.index)
+        if hit.any():
+            chunk = chunk.astype({c: object for c in cols})
+            chunk.loc[hit, cols] = fixed.loc[index[hit], cols].to_numpy()
+            found.update(index[hit])
+        chunk.to_csv(tmp_path, mode='w' if first else 'a', header=first, index=False)
+        first = False
+    if header is None:
+        return 0
+    missing = fixed[~fixed.index.isin(list(found))].reset_index()
+    if len(missing):
+        missing.reindex(columns=header).to_csv(tmp_path, mode='a', header=False, index=False)
+    os.replace(tmp_path, path)
+    return len(found)
+
+
+def truncate_csv(path, key, last, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Drop the rows of a CSV whose key column is above last, reading and
+    rewriting the file chunk_size rows at a time.
+
+    Returns:
+        number of rows dropped
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return 0
+    tmp_path = path.with_name(path.name + '.tmp')
+    dropped = 0
+    first = True
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        keep = chunk[key] <= last
+        dropped += int((~keep).sum())
+        chunk[keep].to_csv(tmp_path, mode='w' if first else 'a', header=first, index=False)
+        first = False
+    if first:
+        return 0
+    if dropped:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+    return dropped
+
+
+def write_json_atomic(path, state):
+    """Write state as JSON to a temporary file and move it over path in one step."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def join_sorted_chunks(left_chunks, right_chunks, key):
+    """
+    Inner join of two streams of DataFrames that are both sorted ascending on
+    key (unique within each stream). Right rows are buffered only until the
+    left stream passes their key, so memory stays at about one chunk of each.
+
+    Yields:
+        one joined frame per left chunk (left columns first)
+    """
+    right_chunks = iter(right_chunks)
+    buffer = None
+    exhausted = False
+    last_left = last_right = None
+    for left in left_chunks:
+        if not len(left):
+            continue
+        keys = left[key].to_numpy()
+        if (last_left is not None and keys[0] <= last_left) or (keys[1:] <= keys[:-1]).any():
+            raise ValueError(f"left table is not sorted ascending on {key}")
+        last_left = keys[-1]
+        # Read right rows until they pass the end of this left chunk
+        while not exhausted and (buffer is None or not len(buffer) or buffer[key].iloc[-1] < last_left):
+            try:
+                right = next(right_chunks)
+            except StopIteration:
+                exhausted = True
+                break
+            if not len(right):
+                continue
+            right_keys = right[key].to_numpy()
+            if (last_right is not None and right_keys[0] <= last_right) or (right_keys[1:] <= right_keys[:-1]).any():
+                raise ValueError(f"right table is not sorted ascending on {key}")
+            last_right = right_keys[-1]
+            buffer = right if buffer is None else pd.concat([buffer, right], ignore_index=True)
+        if buffer is None:
+            continue
+        current = buffer[buffer[key] <= last_left]
+        buffer = buffer[buffer[key] > last_left].reset_index(drop=True)
+        yield left.merge(current, on=key, how='inner', sort=False)
+
+
+def column_summary(chunks, columns, where=None):
+    """
+    Count, min, max, mean and sample std of columns over an iterable of
+    DataFrames, in one pass. With where (a boolean column), only rows where
+    it is True are included. NaNs are skipped.
+
+    Returns:
+        (rows seen, rows where `where` holds, DataFrame indexed by column)
+    """
+    n_rows, n_where = 0, 0
+    stats = {c: {'count': 0, 'min': np.inf, 'max': -np.inf, 'mean': 0.0, 'm2': 0.0} for c in columns}
+    for chunk in chunks:
+        n_rows += len(chunk)
+        if where is not None:
+            mask = chunk[where].astype(bool)
+            n_where += int(mask.sum())
+            chunk = chunk[mask]
+        for c in columns:
+            values = chunk[c].to_numpy(float)
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+            s = stats[c]
+            n_b, mean_b = len(values), float(values.mean())
+            m2_b = float(((values - mean_b) ** 2).sum())
+            n = s['count'] + n_b
+            delta = mean_b - s['mean']
+            s['mean'] += delta * n_b / n
+            s['m2'] += m2_b + delta * delta * s['count'] * n_b / n
+            s['count'] = n
+            s['min'] = min(s['min'], float(values.min()))
+            s['max'] = max(s['max'], float(values.max()))
+    table = pd.DataFrame([
+        {'column': c, 'count': s['count'],
+         'min': s['min'] if s['count'] else np.nan, 'max': s['max'] if s['count'] else np.nan,
+         'mean': s['mean'] if s['count'] else np.nan,
+         'std': np.sqrt(s['m2'] / (s['count'] - 1)) if s['count'] > 1 else np.nan}
+        for c, s in stats.items()
+    ]).set_index('column')
+    return n_rows, n_where, table
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
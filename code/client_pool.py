@@ -0,0 +1,326 @@
+"""
+Pool of AlphaGenome clients across several API keys and channels
+
+ClientPool stands in for the single dna_client model in stages 02 and 05:
+predict_sequence / predict_sequences / predict_variant calls are routed
+through it.
+
+Keys: per key the pool tracks requests, errors and, when a per-key quota is
+given, the estimated remaining quota. Calls go to the least-loaded healthy
+key (fewest checked-out clients, then fewest requests so far). A key whose
+call fails with a quota or rate-limit error is quarantined for a cooldown
+and the call is retried on another key; keys that have used up their quota
+are skipped. A failed call is retried until it succeeds or retry_timeout
+seconds (default: three cooldowns) have passed, so with a single key the call waits out the
+quarantine rather than failing on the first quota error.
+
+Channels: each key gets channels_per_key client instances, each holding its
+own connection, which is reused for every request it serves. A request
+checks one client out for its duration, so concurrent workers (see
+prediction_batches.predict_batch) never share a client; when every client
+is busy, callers wait for one to be checked back in. A client whose call
+fails with a transport error is reconnected (a fresh client for the same
+key) and the call is retried on another client, backing off once every
+client has failed. check_health() probes idle clients and reconnects
+unhealthy ones.
+
+Errors are classified by their gRPC status code (RESOURCE_EXHAUSTED for
+quota; UNAVAILABLE or DEADLINE_EXCEEDED for transport) or, for errors
+raised outside gRPC, by exception type (ConnectionError, TimeoutError).
+Anything else is a bad request and is raised at once.
+
+usage() / report() give per-client request counts, reconnects, latency
+percentiles and utilization, to show whether channel count is a
+bottleneck. A Telemetry object (prediction_telemetry.py), if given, is told
+about every request, its latency and outcome, and every retry.
+
+Keys are read from ALPHA_GENOME_API_KEYS (comma-separated) plus the
+single-key ALPHA_GENOME_API_KEY / ALPHA_GENOME_KEY variables. Keys are only
+ever shown masked.
+"""
+
+import os
+import threading
+import time
+
+import pandas as pd
+from alphagenome.models import dna_client
+
+from prediction_telemetry import LatencyRecord
+
+# gRPC status codes (by name) meaning "this key is out of quota or rate limited"
+QUOTA_STATUS_CODES = ('RESOURCE_EXHAUSTED',)
+
+# gRPC status codes meaning "this client's connection is broken or timed out"
+TRANSPORT_STATUS_CODES = ('UNAVAILABLE', 'DEADLINE_EXCEEDED')
+
+# Seconds a key stays quarantined after a quota error
+DEFAULT_COOLDOWN = 300.0
+
+# A call keeps being retried for this many cooldowns (long enough to outlast a quarantine)
+RETRY_COOLDOWNS = 3
+
+# Longest pause between transport retries once every client has failed
+MAX_TRANSPORT_BACKOFF = 30.0
+
+# Client methods routed through the pool
+POOLED_METHODS = ('predict_sequence', 'predict_sequences', 'predict_variant', 'predict_interval', 'score_variant')
+
+
+def load_api_keys():
+    """All configured API keys, de-duplicated, in the order they were given."""
+    keys = [k.strip() for k in os.getenv('ALPHA_GENOME_API_KEYS', '').split(',')]
+    keys += [os.getenv('ALPHA_GENOME_API_KEY'), os.getenv('ALPHA_GENOME_KEY')]
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+def mask_key(key):
+    """Printable form of an API key (last four characters only)."""
+    return f"…{key[-4:]}" if len(key) > 4 else '…'
+
+
+def grpc_status(error):
+    """Name of the gRPC status code of an exception (grpc.RpcError), or None."""
+    code = getattr(error, 'code', None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            return None
+    return getattr(code, 'name', None)
+
+
+def is_quota_error(error):
+    """True if an exception is a quota / rate-limit rejection."""
+    return grpc_status(error) in QUOTA_STATUS_CODES
+
+
+def is_transport_error(error):
+    """True if an exception is a broken connection or timeout rather than a bad request."""
+    return isinstance(error, (ConnectionError, TimeoutError)) or grpc_status(error) in TRANSPORT_STATUS_CODES
+
+
+class KeyState:
+    """Usage counters and quarantine state of one API key."""
+
+    def __init__(self, key, quota=None):
+        self.key = key
+        self.quota = quota
+        self.requests = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.in_flight = 0
+        self.quarantined_until = 0.0
+
+    @property
+    def remaining(self):
+        """Estimated requests left on this key's quota (None if unlimited)."""
+        return None if self.quota is None else max(self.quota - self.requests, 0)
+
+    def available(self, now):
+        return now >= self.quarantined_until and (self.remaining is None or self.remaining > 0)
+
+
+class PooledClient:
+    """One client instance (connection) of a key, with its own latency record."""
+
+    def __init__(self, key_state, channel, create):
+        self.key_state = key_state
+        self.channel = channel
+        self._create = create
+        self.client = create(key_state.key)
+        self.checked_out = False
+        self.requests = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.busy_seconds = 0.0
+        self.latencies = LatencyRecord()
+
+    def reconnect(self):
+        """Replace the client (and its connection) with a fresh one for the same key."""
+        self.client = self._create(self.key_state.key)
+        self.reconnects += 1
+
+
+class ClientPool:
+    """
+    Routes AlphaGenome calls across API keys and client channels; use it
+    wherever a dna_client model is used (pool.predict_sequence(...)).
+    """
+
+    def __init__(self, api_keys, quota_per_key=None, cooldown=DEFAULT_COOLDOWN, channels_per_key=1,
+                 create=dna_client.create, telemetry=None, retry_timeout=None):
+        if not api_keys:
+            raise RuntimeError('Missing ALPHA_GENOME_API_KEY(S) in environment. Check the .env file.')
+        self.cooldown = cooldown
+        self.retry_timeout = RETRY_COOLDOWNS * cooldown if retry_timeout is None else retry_timeout
+        self.telemetry = telemetry
+        self.keys = [KeyState(key, quota_per_key) for key in api_keys]
+        self.clients = [
+            PooledClient(state, channel, create)
+            for state in self.keys for channel in range(max(channels_per_key, 1))
+        ]
+        self._condition = threading.Condition()
+        self._started = time.time()
+
+    @property
+    def n_clients(self):
+        return len(self.clients)
+
+    def _checkout(self, deadline=None):
+        """
+        Reserve an idle client of the least-loaded healthy key. Waits for a
+        client to be checked in when all are busy, or for a quarantine to end.
+        Returns None if no quarantine ends before deadline.
+        """
+        with self._condition:
+            while True:
+                now = time.time()
+                usable = [c for c in self.clients if c.key_state.available(now)]
+                if not usable:
+                    waiting = [s for s in self.keys if s.remaining is None or s.remaining > 0]
+                    if not waiting:
+                        raise RuntimeError('All API keys have used up their quota')
+                    wake = min(s.quarantined_until for s in waiting)
+                    if deadline is not None and wake > deadline:
+                        return None
+                    print(f"  ⚠ All API keys quarantined; waiting {wake - now:.0f}s")
+                    self._condition.wait(timeout=max(wake - now, 0.1))
+                    continue
+                idle = [c for c in usable if not c.checked_out]
+                if not idle:
+                    self._condition.wait(timeout=1.0)
+                    continue
+                pooled = min(idle, key=lambda c: (c.key_state.in_flight, c.key_state.requests, c.requests))
+                pooled.checked_out = True
+                pooled.key_state.in_flight += 1
+                return pooled
+
+    def _checkin(self, pooled, elapsed):
+        with self._condition:
+            pooled.checked_out = False
+            pooled.key_state.in_flight -= 1
+            pooled.key_state.requests += 1
+            pooled.requests += 1
+            pooled.busy_seconds += elapsed
+            pooled.latencies.add(elapsed)
+            self._condition.notify()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Run one client method on a pooled client. Quota errors quarantine the
+        key and transport errors reconnect the client; both are retried on the
+        next usable client until retry_timeout seconds have passed.
+        """
+        deadline = time.time() + self.retry_timeout
+        last_error = None
+        attempt = 0
+        while True:
+            if attempt and time.time() >= deadline:
+                break
+            pooled = self._checkout(deadline if attempt else None)
+            if pooled is None:
+                print(f"  ⚠ No API key leaves quarantine within the {self.retry_timeout:.0f}s retry window")
+                break
+            if self.telemetry is not None:
+                if attempt:
+                    self.telemetry.count_retries()
+                self.telemetry.request_started()
+            start = time.time()
+            failed = False
+            try:
+                return getattr(pooled.client, method)(*args, **kwargs)
+            except Exception as e:
+                last_error = e
+                failed = True
+                with self._condition:
+                    pooled.errors += 1
+                    pooled.key_state.errors += 1
+                if is_quota_error(e):
+                    with self._condition:
+                        pooled.key_state.quota_errors += 1
+                        pooled.key_state.quarantined_until = time.time() + self.cooldown
+                    print(f"  ⚠ API key {mask_key(pooled.key_state.key)} hit its quota; "
+                          f"quarantined for {self.cooldown:.0f}s")
+                elif is_transport_error(e):
+                    print(f"  ⚠ Client {mask_key(pooled.key_state.key)}#{pooled.channel} transport error "
+                          f"({e}); reconnecting")
+                    pooled.reconnect()
+                else:
+                    raise
+            finally:
+                elapsed = time.time() - start
+                self._checkin(pooled, elapsed)
+                if self.telemetry is not None:
+                    self.telemetry.request_finished(method, kwargs, elapsed, error=failed)
+            attempt += 1
+            # Every client has failed in turn: back off before the next round of transport retries
+            if is_transport_error(last_error) and attempt >= len(self.clients):
+                rounds = attempt // len(self.clients)
+                time.sleep(min(2.0 ** (rounds - 1), MAX_TRANSPORT_BACKOFF, max(deadline - time.time(), 0)))
+        raise last_error
+
+    def __getattr__(self, name):
+        if name in POOLED_METHODS:
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def check_health(self):
+        """
+        Probe every idle client with a lightweight metadata request and
+        reconnect those whose connection fails. Returns the number reconnected.
+        """
+        reconnected = 0
+        for pooled in self.clients:
+            with self._condition:
+                if pooled.checked_out:
+                    continue
+                pooled.checked_out = True
+            try:
+                probe = getattr(pooled.client, 'output_metadata', None)
+                if probe is not None:
+                    probe()
+            except Exception as e:
+                if is_transport_error(e):
+                    pooled.reconnect()
+                    reconnected += 1
+            finally:
+                with self._condition:
+                    pooled.checked_out = False
+                    self._condition.notify()
+        return reconnected
+
+    def usage(self):
+        """Per-client utilization and latency, with the key's quota state, as a DataFrame."""
+        now = time.time()
+        elapsed = max(now - self._started, 1e-9)
+        rows = []
+        for pooled in self.clients:
+            state = pooled.key_state
+            rows.append({
+                'api_key': mask_key(state.key),
+                'channel': pooled.channel,
+                'requests': pooled.requests,
+                'errors': pooled.errors,
+                'reconnects': pooled.reconnects,
+                'latency_mean': pooled.latencies.mean(),
+                'latency_p50': pooled.latencies.quantile(0.5),
+                'latency_p95': pooled.latencies.quantile(0.95),
+                'utilization': pooled.busy_seconds / elapsed,
+                'key_quota_errors': state.quota_errors,
+                'key_remaining_quota': state.remaining,
+                'key_quarantined': now < state.quarantined_until,
+            })
+        return pd.DataFrame(rows)
+
+    def report(self, output_file=None):
+        """Print pool utilization (and save it to output_file if given)."""
+        usage = self.usage()
+        print(f"\nAPI client pool ({len(self.keys)} keys × {len(self.clients) // len(self.keys)} channels, "
+              f"{int(usage['requests'].sum()):,} requests):")
+        print(usage.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        if len(self.clients) > 1 and (usage['utilization'] > 0.9).all():
+            print("  ⚠ Every client was busy >90% of the run; more channels may help")
+        if output_file is not None:
+            usage.to_csv(output_file, index=False)
+        return usage
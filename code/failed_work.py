@@ -0,0 +1,135 @@
+"""
+Failed-work queue and dead-letter file for stage 02 predictions
+
+A record whose prediction fails is kept with success=False and NaN
+predictions, and stage 03 drops it. To re-attempt those records instead,
+stage 02 adds every failure to a FailedWorkQueue, persisted as
+failed_queue.csv next to the checkpoints (so it survives a restart). At the
+end of the main pass the queued records are retried one request at a time
+in rounds with exponential backoff (backoff_delay); records that still fail
+after the last round are moved to dead_letter.csv with their error class,
+error message and attempt count. `--retry-failed` re-attempts only the
+dead-lettered records and patches them into the saved results.
+"""
+
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+FAILED_QUEUE_NAME = 'failed_queue.csv'
+DEAD_LETTER_NAME = 'dead_letter.csv'
+
+QUEUE_COLUMNS = [
+    'variant_idx', 'variant_id', 'variant_name', 'error_class', 'error', 'attempts', 'first_failed', 'last_failed',
+]
+
+# Retry rounds after the main pass; the wait before round r is
+# DEFAULT_BACKOFF * 2**(r-1) seconds, capped at MAX_BACKOFF
+DEFAULT_RETRY_ROUNDS = 3
+DEFAULT_BACKOFF = 10.0
+MAX_BACKOFF = 300.0
+
+
+class FailedWorkQueue:
+    """Failed records keyed by variant_idx, persisted as a CSV file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.items = {}
+        if self.path.exists():
+            self.extend(pd.read_csv(self.path))
+
+    def __len__(self):
+        return len(self.items)
+
+    def extend(self, frame):
+        """Add queue entries (rows with QUEUE_COLUMNS, e.g. a dead-letter file)."""
+        for item in frame.to_dict('records'):
+            self.items[int(item['variant_idx'])] = {column: item.get(column) for column in QUEUE_COLUMNS}
+
+    def add(self, result):
+        """Queue a failed result (a stage 02 result dict), counting the attempt."""
+        variant_idx = int(result['variant_idx'])
+        now = datetime.now().isoformat(timespec='seconds')
+        item = self.items.get(variant_idx) or {'variant_idx': variant_idx, 'attempts': 0, 'first_failed': now}
+        item.update({
+            'variant_id': result.get('variant_id'),
+            'variant_name': result.get('variant_name'),
+            'error_class': result.get('error_class') or 'Exception',
+            'error': result.get('error'),
+            'attempts': int(item['attempts']) + 1,
+            'last_failed': now,
+        })
+        self.items[variant_idx] = item
+
+    def remove(self, variant_idx):
+        self.items.pop(int(variant_idx), None)
+
+    def keep_only(self, variant_idx):
+        """Drop entries whose variant_idx is not in variant_idx."""
+        keep = set(int(i) for i in variant_idx)
+        self.items = {i: item for i, item in self.items.items() if i in keep}
+
+    def to_frame(self):
+        frame = pd.DataFrame(list(self.items.values()), columns=QUEUE_COLUMNS)
+        return frame.sort_values('variant_idx').reset_index(drop=True)
+
+    def save(self):
+        self.to_frame().to_csv(self.path, index=False)
+
+
+def backoff_delay(round_num, base_delay=DEFAULT_BACKOFF):
+    """Seconds to wait before retry round round_num (1-based)."""
+    return min(base_delay * 2 ** (round_num - 1), MAX_BACKOFF)
+
+
+def retry_queue(queue, attempt, rounds=DEFAULT_RETRY_ROUNDS, base_delay=DEFAULT_BACKOFF, wait_first=True):
+    """
+    Retry every queued record up to `rounds` times with exponential backoff.
+    attempt(variant_idx) makes one request and returns the record's result
+    dict; successes leave the queue, failures stay with their new error.
+    With wait_first=False the first round starts immediately.
+
+    Returns:
+        dict of variant_idx -> recovered result
+    """
+    recovered = {}
+    for round_num in range(1, rounds + 1):
+        if not len(queue):
+            break
+        delay = backoff_delay(round_num, base_delay) if wait_first or round_num > 1 else 0.0
+        print(f"  Retry round {round_num}/{rounds}: {len(queue):,} queued"
+              + (f", waiting {delay:g}s" if delay else ""))
+        time.sleep(delay)
+        for variant_idx in sorted(queue.items):
+            result = attempt(variant_idx)
+            if result['success']:
+                queue.remove(variant_idx)
+                recovered[variant_idx] = result
+            else:
+                queue.add(result)
+        queue.save()
+    return recovered
+
+
+def dead_letter(queue, path, resolved=()):
+    """
+    Move everything left in the queue to the dead-letter file, replacing
+    earlier entries for the same records and dropping resolved ones.
+
+    Returns:
+        the full dead-letter table
+    """
+    path = Path(path)
+    frame = queue.to_frame()
+    if path.exists():
+        earlier = pd.read_csv(path)
+        done = set(frame['variant_idx']) | set(int(i) for i in resolved)
+        frame = pd.concat([earlier[~earlier['variant_idx'].isin(done)], frame], ignore_index=True)
+    frame = frame.sort_values('variant_idx').reset_index(drop=True)
+    frame.to_csv(path, index=False)
+    queue.items.clear()
+    queue.save()
+    return frame
@@ -8,18 +8,20 @@ This script helps investigate individual sequence predictions to understand
 the negative correlation pattern.
 """
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+from table_schema import load_table
+
 BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
 PRED_FILE = BASE_DIR / 'outputs' / '02_alphagenome_predictions' / 'alphagenome_predictions_sample100.csv'
 OUTPUT_DIR = BASE_DIR / 'outputs' / '03_benchmark_results'
 
 def load_and_rank():
     """Load predictions and rank by MPRA activity."""
-    df = pd.read_csv(PRED_FILE)
+    # The detailed inspection prints the sequences, so keep them
+    df = load_table(PRED_FILE, sequences=True)
     df = df[df['success'] == True].copy()
     
     # Sort by MPRA activity
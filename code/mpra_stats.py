@@ -0,0 +1,401 @@
+"""
+Vectorized correlation engines shared by the analysis stages
+
+Every function here works on whole matrices of prediction columns at once
+instead of looping over metrics or strata and calling scipy per column.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats, linalg, sparse
+
+from variant_annotations import parent_enhancer_key, tf_incidence_matrix
+
+# Covariates available to the adjusted-correlation mode
+COVARIATES = ['pool', 'chromosome', 'strand', 'parent_enhancer', 'tf']
+
+# Residual variance below this fraction of the raw variance is treated as zero:
+# the covariates fully explain the column and no adjusted correlation exists
+RESIDUAL_VARIANCE_TOL = 1e-10
+
+
+def correlation_p_values(r, dof):
+    """Two-sided p-values for correlation coefficients with dof = n - 2 - k."""
+    r = np.asarray(r, float)
+    dof = np.broadcast_to(np.asarray(dof, float), r.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = r * np.sqrt(dof / (1.0 - r * r))
+        p = 2 * stats.t.sf(np.abs(t), dof)
+    p = np.where(np.abs(r) >= 1.0, 0.0, p)
+    return np.where(np.isnan(r) | (dof <= 0), np.nan, p)
+
+
+def pearson_columns(x, Y):
+    """
+    Pearson r between vector x and every column of Y in one pass.
+    Columns with zero variance get NaN.
+    """
+    x = np.asarray(x, float)
+    Y = np.asarray(Y, float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    xc = x - x.mean()
+    Yc = Y - Y.mean(axis=0)
+    num = xc @ Yc
+    den = np.sqrt((xc @ xc) * np.einsum('ij,ij->j', Yc, Yc))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = num / den
+    return np.where(den > 0, np.clip(r, -1.0, 1.0), np.nan)
+
+
+def rank_columns(A):
+    """Average ranks of each column (ties share the mean rank), as floats."""
+    return stats.rankdata(np.asarray(A, float), axis=0)
+
+
+def build_design_matrix(df, covariates=COVARIATES):
+    """
+    Build one covariate design matrix for the adjusted-correlation mode.
+
+    Categorical covariates (pool, chromosome, strand, parent_enhancer) are
+    one-hot encoded with the first level dropped; 'tf' adds one 0/1 column
+    per TF parsed from tf_info. An intercept column is always included.
+
+    Returns:
+        (X as a float ndarray of shape (n, p), list of column names)
+    """
+    blocks = [np.ones((len(df), 1))]
+    names = ['intercept']
+
+    for cov in covariates:
+        if cov == 'tf':
+            incidence, tf_names = tf_incidence_matrix(df['tf_info'])
+            blocks.append(incidence.toarray())
+            names += [f'tf={name}' for name in tf_names]
+            continue
+
+        if cov == 'parent_enhancer':
+            values = parent_enhancer_key(df)
+        elif cov in df.columns:
+            values = df[cov].astype(str)
+        else:
+            raise ValueError(f"Unknown covariate: {cov}")
+
+        dummies = pd.get_dummies(values, prefix=cov, prefix_sep='=', drop_first=True, dtype=float)
+        blocks.append(dummies.to_numpy())
+        names += list(dummies.columns)
+
+    return np.hstack(blocks), names
+
+
+def residualize(Y, X):
+    """
+    Residualize every column of Y on the column space of X with one pivoted QR.
+
+    Collinear covariates (e.g. parent enhancer nested in chromosome) are
+    dropped by the pivoting, so the projection is onto exactly col(X).
+
+    Returns:
+        (residual matrix with Y's shape, numerical rank of X)
+    """
+    Y = np.asarray(Y, float)
+    Q, R, _ = linalg.qr(X, mode='economic', pivoting=True)
+    diag = np.abs(np.diag(R))
+    rank = int(np.sum(diag > diag.max() * max(X.shape) * np.finfo(float).eps)) if len(diag) else 0
+    Q = Q[:, :rank]
+    return Y - Q @ (Q.T @ Y), rank
+
+
+def adjusted_correlations(df, mpra_col, pred_cols, covariates=COVARIATES):
+    """
+    Covariate-adjusted (partial) correlations of MPRA with every prediction column.
+
+    MPRA and all prediction columns (and their ranks, for partial Spearman)
+    are residualized on the shared design matrix in a single batched solve.
+    The Frisch-Waugh slope of MPRA on each prediction given the covariates is
+    reported as the adjusted regression coefficient.
+
+    Returns:
+        DataFrame with one row per prediction column.
+    """
+    cols = [mpra_col] + list(pred_cols)
+    valid = df[cols].notna().all(axis=1)
+    data = df.loc[valid]
+    n = len(data)
+
+    X, _ = build_design_matrix(data, covariates)
+    values = data[cols].to_numpy(float)
+    # Raw values and ranks go through the same solve
+    Y = np.hstack([values, rank_columns(values)])
+    resid, rank = residualize(Y, X)
+
+    k = len(cols)
+    raw_var = np.var(Y, axis=0)
+    resid_var = np.var(resid, axis=0)
+    explained = resid_var <= RESIDUAL_VARIANCE_TOL * np.where(raw_var > 0, raw_var, 1.0)
+    resid[:, explained] = 0.0
+
+    raw_r = pearson_columns(values[:, 0], values[:, 1:])
+    partial_r = pearson_columns(resid[:, 0], resid[:, 1:k])
+    partial_rho = pearson_columns(resid[:, k], resid[:, k + 1:])
+
+    # Slope of MPRA on prediction given covariates, and its standard error
+    e_y = resid[:, 0]
+    E_x = resid[:, 1:k]
+    sxx = np.einsum('ij,ij->j', E_x, E_x)
+    dof = n - rank - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (e_y @ E_x) / sxx
+        sse = (e_y @ e_y) - beta * beta * sxx
+        beta_se = np.sqrt(sse / dof / sxx)
+    beta = np.where(sxx > 0, beta, np.nan)
+    beta_se = np.where(sxx > 0, beta_se, np.nan)
+
+    # Partial correlation loses one degree of freedom per non-intercept covariate
+    partial_dof = n - 2 - (rank - 1)
+    return pd.DataFrame({
+        'column_name': list(pred_cols),
+        'n_samples': n,
+        'n_covariates': rank - 1,
+        'covariates': '+'.join(covariates),
+        'raw_pearson_r': raw_r,
+        'raw_pearson_p': correlation_p_values(raw_r, n - 2),
+        'partial_pearson_r': partial_r,
+        'partial_pearson_p': correlation_p_values(partial_r, partial_dof),
+        'partial_spearman_r': partial_rho,
+        'partial_spearman_p': correlation_p_values(partial_rho, partial_dof),
+        'adjusted_beta': beta,
+        'adjusted_beta_se': beta_se,
+        'prediction_explained_by_covariates': explained[1:k],
+    })
+
+
+def group_indicator(codes, n_groups):
+    """Sparse n × g indicator matrix: row i has a 1 in column codes[i]."""
+    n = len(codes)
+    return sparse.csr_matrix((np.ones(n), (np.arange(n), codes)), shape=(n, n_groups))
+
+
+def within_group_correlations(df, mpra_col, pred_cols, groups):
+    """
+    Within-group correlations of MPRA with every prediction column.
+
+    Each column is centered on its group mean (sparse averaging with a
+    group indicator matrix), and the per-group cross-products are summed in
+    one sparse product. From those sums come both the pooled within-group
+    correlation (between-group variance removed) and a per-group
+    correlation for every group, with no Python loop over groups. Spearman
+    versions use ranks taken within each group.
+
+    Args:
+        groups: Series aligned with df giving each row's group key
+
+    Returns:
+        (pooled DataFrame with one row per prediction column,
+         per-group DataFrame with one row per (group, prediction column))
+    """
+    pred_cols = list(pred_cols)
+    cols = [mpra_col] + pred_cols
+    valid = df[cols].notna().all(axis=1)
+    data = df.loc[valid, cols].astype(float)
+    codes, group_keys = pd.factorize(groups[valid])
+    n, n_groups, m = len(data), len(group_keys), len(pred_cols)
+
+    G = group_indicator(codes, n_groups)
+    sizes = np.bincount(codes, minlength=n_groups).astype(float)
+
+    def group_sums(values):
+        # Center within groups, then sum cross-products and squares per group
+        centered = values - (G.T @ values / sizes[:, None])[codes]
+        products = np.hstack([centered[:, :1] * centered[:, 1:], centered * centered])
+        sums = G.T @ products
+        return sums[:, :m], sums[:, m], sums[:, m + 1:]
+
+    values = data.to_numpy()
+    ranks = data.groupby(codes).rank().to_numpy()
+
+    tables = {}
+    for label, matrix in (('pearson', values), ('spearman', ranks)):
+        sxy, sxx, syy = group_sums(matrix)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            group_r = sxy / np.sqrt(sxx[:, None] * syy)
+            pooled_r = sxy.sum(axis=0) / np.sqrt(sxx.sum() * syy.sum(axis=0))
+        group_r = np.where((sxx[:, None] > 0) & (syy > 0), np.clip(group_r, -1.0, 1.0), np.nan)
+        pooled_r = np.where(syy.sum(axis=0) > 0, np.clip(pooled_r, -1.0, 1.0), np.nan)
+        tables[label] = (group_r, pooled_r, syy)
+
+    group_r, pooled_r, syy = tables['pearson']
+    group_rho, pooled_rho, _ = tables['spearman']
+
+    # Between-group correlation of the group means, for contrast
+    means = G.T @ values / sizes[:, None]
+    between_r = pearson_columns(means[:, 0], means[:, 1:])
+
+    # Pooled within-group r has n - n_groups - 1 degrees of freedom
+    pooled_dof = n - n_groups - 1
+    pooled = pd.DataFrame({
+        'column_name': pred_cols,
+        'n_samples': n,
+        'n_groups': n_groups,
+        'n_groups_with_prediction_variance': (syy > 0).sum(axis=0),
+        'within_pearson_r': pooled_r,
+        'within_pearson_p': correlation_p_values(pooled_r, pooled_dof),
+        'within_spearman_r': pooled_rho,
+        'within_spearman_p': correlation_p_values(pooled_rho, pooled_dof),
+        'between_pearson_r': between_r,
+        'between_pearson_p': correlation_p_values(between_r, n_groups - 2),
+    })
+
+    # Per-group table in long format: group-major, prediction columns inner
+    group_dof = np.repeat(sizes - 2, m).reshape(n_groups, m)
+    per_group = pd.DataFrame({
+        'group': np.repeat(np.asarray(group_keys), m),
+        'column_name': np.tile(pred_cols, n_groups),
+        'n_variants': np.repeat(sizes.astype(int), m),
+        'pearson_r': group_r.ravel(),
+        'pearson_p': correlation_p_values(group_r, group_dof).ravel(),
+        'spearman_r': group_rho.ravel(),
+        'spearman_p': correlation_p_values(group_rho, group_dof).ravel(),
+        'prediction_sd': np.sqrt(syy / np.maximum(sizes - 1, 1)[:, None]).ravel(),
+    })
+    return pooled, per_group
+
+
+def group_pearson(codes, x, Y, n_groups):
+    """
+    Pearson r of x with every column of Y inside each group, from bincount
+    group sums (no loop over groups).
+
+    Returns:
+        (r array of shape (n_groups, n_columns), group sizes)
+    """
+    Y = np.asarray(Y, float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    x = np.asarray(x, float)
+    sizes = np.bincount(codes, minlength=n_groups).astype(float)
+
+    def sums(values):
+        return np.stack([np.bincount(codes, weights=col, minlength=n_groups) for col in values.T], axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = np.bincount(codes, weights=x, minlength=n_groups) / sizes
+        mean_y = sums(Y) / sizes[:, None]
+        xc = x - mean_x[codes]
+        Yc = Y - mean_y[codes]
+        sxy = sums(xc[:, None] * Yc)
+        sxx = np.bincount(codes, weights=xc * xc, minlength=n_groups)
+        syy = sums(Yc * Yc)
+        r = sxy / np.sqrt(sxx[:, None] * syy)
+    valid = (sxx[:, None] > 0) & (syy > 0) & (sizes[:, None] > 2)
+    return np.where(valid, np.clip(r, -1.0, 1.0), np.nan), sizes
+
+
+def nan_correlations(x, Y):
+    """
+    Pearson and Spearman correlation of x with every column of Y, each
+    column using only the rows where both x and that column are present.
+
+    Columns sharing the same missing-value pattern (usually all of them)
+    are computed together in one vectorized pass.
+
+    Returns:
+        dict of arrays: n, pearson_r, pearson_p, spearman_r, spearman_p
+    """
+    x = np.asarray(x, float)
+    Y = np.asarray(Y, float)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    m = Y.shape[1]
+    out = {key: np.full(m, np.nan) for key in ('pearson_r', 'pearson_p', 'spearman_r', 'spearman_p')}
+    out['n'] = np.zeros(m, dtype=int)
+
+    valid = ~np.isnan(Y) & ~np.isnan(x)[:, None]
+    patterns, pattern_of = np.unique(valid.T, axis=0, return_inverse=True)
+    for p, rows in enumerate(patterns):
+        cols = np.flatnonzero(pattern_of.ravel() == p)
+        n = int(rows.sum())
+        out['n'][cols] = n
+        if n < 3:
+            continue
+        xs, Ys = x[rows], Y[np.ix_(rows, cols)]
+        r = pearson_columns(xs, Ys)
+        rho = pearson_columns(rank_columns(xs[:, None])[:, 0], rank_columns(Ys))
+        out['pearson_r'][cols] = r
+        out['pearson_p'][cols] = correlation_p_values(r, n - 2)
+        out['spearman_r'][cols] = rho
+        out['spearman_p'][cols] = correlation_p_values(rho, n - 2)
+    return out
+
+
+def steiger_z_test(r1, r2, r12, n):
+    """
+    Steiger's (1980) z-test for two dependent correlations sharing one variable.
+
+    r1 = corr(x, y1), r2 = corr(x, y2) and r12 = corr(y1, y2) on the same n
+    samples (e.g. MPRA vs WT and MPRA vs mutant predictions). Works
+    elementwise on arrays.
+
+    Returns:
+        (z, two-sided p)
+    """
+    r1, r2, r12 = (np.asarray(v, float) for v in (r1, r2, r12))
+    n = np.asarray(n, float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Covariance of the two Fisher z's, evaluated at the pooled r
+        r_bar = (r1 + r2) / 2
+        psi = r12 * (1 - 2 * r_bar ** 2) - 0.5 * r_bar ** 2 * (1 - 2 * r_bar ** 2 - r12 ** 2)
+        c = psi / (1 - r_bar ** 2) ** 2
+        z = (np.arctanh(r1) - np.arctanh(r2)) * np.sqrt(n - 3) / np.sqrt(2 - 2 * c)
+    # Identical columns (r12 = 1) cannot differ
+    z = np.where(np.isclose(r12, 1.0) & np.isclose(r1, r2), 0.0, z)
+    return z, 2 * stats.norm.sf(np.abs(z))
+
+
+def paired_bootstrap_correlations(x, Y1, Y2, n_boot=2000, seed=0, chunk_size=250):
+    """
+    Paired bootstrap of corr(x, Y1[:, j]) - corr(x, Y2[:, j]) for every column j.
+
+    Every replicate resamples rows once and that same resample is applied
+    to x, Y1 and Y2, so the dependence between the two correlations is
+    preserved. Replicates are processed in chunks: a (chunk, n) matrix of
+    resample counts times the per-row moment matrix gives the sums for all
+    columns of both Y1 and Y2 in one matrix product.
+
+    Returns:
+        dict of arrays (one entry per column): diff_ci_low, diff_ci_high,
+        bootstrap_p (two-sided, from the sign of the replicate differences),
+        and the full (n_boot, m) replicate matrix as 'replicates'
+    """
+    x = np.asarray(x, float)
+    Y = np.hstack([np.asarray(Y1, float), np.asarray(Y2, float)])
+    n, m = len(x), Y.shape[1] // 2
+    # Center first so the moment sums stay well conditioned
+    x = x - x.mean()
+    Y = Y - Y.mean(axis=0)
+    moments = np.hstack([x[:, None], (x * x)[:, None], Y, Y * Y, x[:, None] * Y])
+    k = Y.shape[1]
+
+    rng = np.random.default_rng(seed)
+    replicates = np.empty((n_boot, m))
+    for start in range(0, n_boot, chunk_size):
+        b = min(chunk_size, n_boot - start)
+        index = rng.integers(0, n, size=(b, n))
+        counts = np.zeros((b, n))
+        np.add.at(counts, (np.repeat(np.arange(b), n), index.ravel()), 1.0)
+        sums = counts @ moments
+        sx, sxx = sums[:, :1], sums[:, 1:2]
+        sy, syy, sxy = sums[:, 2:2 + k], sums[:, 2 + k:2 + 2 * k], sums[:, 2 + 2 * k:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = (sxy - sx * sy / n) / np.sqrt((sxx - sx * sx / n) * (syy - sy * sy / n))
+        replicates[start:start + b] = r[:, :m] - r[:, m:]
+
+    low, high = np.nanpercentile(replicates, [2.5, 97.5], axis=0)
+    frac_le = np.mean(replicates <= 0, axis=0)
+    frac_ge = np.mean(replicates >= 0, axis=0)
+    return {
+        'diff_ci_low': low,
+        'diff_ci_high': high,
+        'bootstrap_p': np.minimum(1.0, 2 * np.minimum(frac_le, frac_ge)),
+        'replicates': replicates,
+    }
@@ -0,0 +1,415 @@
+"""
+Pre-binned, cached figure rendering for the benchmark stages
+
+The analysis stages used to hand raw per-variant columns straight to
+matplotlib, which re-binned every hexbin, ROC curve and histogram on every
+run, serially, at 300 dpi. This module splits that work in two:
+
+1. Binning: hexbin counts, histogram edges/counts, thinned ROC points and
+   correlation matrices are computed with NumPy only and stored in a small
+   cache (.npz files) keyed by a hash of the input data and bin parameters.
+2. Rendering: figures are drawn from the pre-binned payloads in parallel
+   worker processes. A figure whose payload and dpi are unchanged since the
+   last run is not redrawn at all.
+
+Because renderers only ever see bin counts, the same figures can be drawn
+for millions of variants at the cost of a few thousand hexagons.
+"""
+
+import json
+import hashlib
+import math
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_DPI = 300
+DRAFT_DPI = 72
+
+# ROC curves are thinned to at most this many points before caching
+ROC_MAX_POINTS = 2000
+
+
+def data_hash(*arrays, **params):
+    """
+    Hash a set of arrays plus keyword parameters into a short hex key.
+    Used to key the bin cache and the rendered-figure manifest.
+    """
+    h = hashlib.sha1()
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(str(arr.dtype).encode())
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+class BinCache:
+    """
+    Small on-disk cache of pre-binned figure payloads.
+
+    Each entry is an .npz file named '{kind}_{key}.npz'. A JSON manifest
+    records which payload key and dpi each output figure was last rendered
+    from, so unchanged figures can be skipped entirely.
+    """
+
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.cache_dir / 'rendered.json'
+        self.manifest = {}
+        if self.enabled and self.manifest_file.exists():
+            with open(self.manifest_file) as f:
+                self.manifest = json.load(f)
+
+    def get_or_compute(self, kind, key, compute_fn):
+        """Return the cached payload for key, computing and storing it on a miss."""
+        cache_file = self.cache_dir / f'{kind}_{key}.npz'
+        if self.enabled and cache_file.exists():
+            self.hits += 1
+            with np.load(cache_file, allow_pickle=False) as npz:
+                return {name: npz[name] for name in npz.files}
+        self.misses += 1
+        payload = compute_fn()
+        if self.enabled:
+            np.savez_compressed(cache_file, **payload)
+        return payload
+
+    def is_current(self, output_file, key, dpi):
+        """True if output_file exists and was rendered from this key and dpi."""
+        entry = self.manifest.get(Path(output_file).name)
+        return (
+            self.enabled and Path(output_file).exists() and entry is not None
+            and entry['key'] == key and entry['dpi'] == dpi
+        )
+
+    def mark_rendered(self, output_file, key, dpi):
+        self.manifest[Path(output_file).name] = {'key': key, 'dpi': dpi}
+
+    def save_manifest(self):
+        if self.enabled:
+            with open(self.manifest_file, 'w') as f:
+                json.dump(self.manifest, f, indent=2)
+
+
+# =============================================================================
+# Binning (NumPy only, no matplotlib)
+# =============================================================================
+
+def _nonsingular(vmin, vmax, expander=0.1):
+    """Expand a degenerate (vmin == vmax) range the same way matplotlib does."""
+    if vmax - vmin <= 1e-12 * max(abs(vmin), abs(vmax), 1.0):
+        if vmin == 0:
+            return -expander, expander
+        return vmin - expander * abs(vmin), vmax + expander * abs(vmax)
+    return vmin, vmax
+
+
+def hexbin_counts(x, y, gridsize=50):
+    """
+    Count points per hexagon on the same lattice matplotlib's hexbin uses.
+
+    Returns a payload with the centers and counts of non-empty hexagons and
+    the extent of the grid. Rendering these centers with C=counts and
+    reduce_C_function=np.sum reproduces the original hexbin exactly.
+    """
+    x = np.asarray(x, float)
+    y = np.asarray(y, float)
+    nx = gridsize
+    ny = int(nx / math.sqrt(3))
+
+    xmin, xmax = _nonsingular(x.min(), x.max()) if len(x) else (0.0, 1.0)
+    ymin, ymax = _nonsingular(y.min(), y.max()) if len(y) else (0.0, 1.0)
+    extent = np.array([xmin, xmax, ymin, ymax], float)
+
+    padding = 1.e-9 * (xmax - xmin)
+    xmin -= padding
+    xmax += padding
+    sx = (xmax - xmin) / nx
+    sy = (ymax - ymin) / ny
+
+    ix = (x - xmin) / sx
+    iy = (y - ymin) / sy
+    ix1 = np.round(ix).astype(int)
+    iy1 = np.round(iy).astype(int)
+    ix2 = np.floor(ix).astype(int)
+    iy2 = np.floor(iy).astype(int)
+
+    nx1, ny1 = nx + 1, ny + 1
+    nx2, ny2 = nx, ny
+    i1 = np.where((0 <= ix1) & (ix1 < nx1) & (0 <= iy1) & (iy1 < ny1),
+                  ix1 * ny1 + iy1 + 1, 0)
+    i2 = np.where((0 <= ix2) & (ix2 < nx2) & (0 <= iy2) & (iy2 < ny2),
+                  ix2 * ny2 + iy2 + 1, 0)
+    d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+    d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+    bdist = d1 < d2
+
+    counts1 = np.bincount(i1[bdist], minlength=1 + nx1 * ny1)[1:]
+    counts2 = np.bincount(i2[~bdist], minlength=1 + nx2 * ny2)[1:]
+    counts = np.concatenate([counts1, counts2])
+
+    offsets = np.zeros((len(counts), 2), float)
+    offsets[:nx1 * ny1, 0] = np.repeat(np.arange(nx1), ny1)
+    offsets[:nx1 * ny1, 1] = np.tile(np.arange(ny1), nx1)
+    offsets[nx1 * ny1:, 0] = np.repeat(np.arange(nx2) + 0.5, ny2)
+    offsets[nx1 * ny1:, 1] = np.tile(np.arange(ny2), nx2) + 0.5
+    offsets[:, 0] = offsets[:, 0] * sx + xmin
+    offsets[:, 1] = offsets[:, 1] * sy + ymin
+
+    nonzero = counts > 0
+    return {
+        'centers': offsets[nonzero],
+        'counts': counts[nonzero].astype(float),
+        'extent': extent,
+        'gridsize': np.array(gridsize),
+    }
+
+
+def linear_fit(x, y):
+    """Least-squares line y = slope * x + intercept from first and second moments."""
+    x = np.asarray(x, float)
+    y = np.asarray(y, float)
+    x_mean, y_mean = x.mean(), y.mean()
+    sxx = np.sum((x - x_mean) ** 2)
+    slope = np.sum((x - x_mean) * (y - y_mean)) / sxx if sxx > 0 else 0.0
+    return slope, y_mean - slope * x_mean
+
+
+def scatter_bins(x, y, gridsize=50):
+    """Hexbin payload plus the linear-fit line used by the scatter figures."""
+    payload = hexbin_counts(x, y, gridsize=gridsize)
+    slope, intercept = linear_fit(x, y)
+    x_line = np.linspace(np.min(x), np.max(x), 100)
+    payload['fit_line'] = np.vstack([x_line, slope * x_line + intercept])
+    return payload
+
+
+def histogram_bins(values, bins=50):
+    """Histogram counts and edges for one column."""
+    counts, edges = np.histogram(np.asarray(values, float), bins=bins)
+    return {'counts': counts.astype(float), 'edges': edges}
+
+
+def roc_points(y_true, y_score, max_points=ROC_MAX_POINTS):
+    """
+    ROC curve computed with a single sort, thinned to at most max_points.
+    The AUC is taken from the full-resolution curve before thinning.
+    """
+    y_true = np.asarray(y_true, bool)
+    y_score = np.asarray(y_score, float)
+    order = np.argsort(-y_score, kind='mergesort')
+    y_sorted = y_true[order]
+    score_sorted = y_score[order]
+
+    # Keep only the last index of each run of tied scores
+    distinct = np.r_[np.flatnonzero(np.diff(score_sorted)), len(score_sorted) - 1]
+    tps = np.cumsum(y_sorted)[distinct]
+    fps = (distinct + 1) - tps
+    tpr = np.r_[0.0, tps / max(tps[-1], 1)]
+    fpr = np.r_[0.0, fps / max(fps[-1], 1)]
+    roc_auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    if len(fpr) > max_points:
+        keep = np.unique(np.linspace(0, len(fpr) - 1, max_points).astype(int))
+        fpr, tpr = fpr[keep], tpr[keep]
+    return {'fpr': fpr, 'tpr': tpr, 'auc': np.array(roc_auc)}
+
+
+# =============================================================================
+# Rendering (runs in worker processes)
+# =============================================================================
+
+def import_pyplot():
+    """
+    Import pyplot with a headless backend and the stage-wide style.
+    Plotting stacks are only imported here, the first time a figure is drawn.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_style('whitegrid')
+    plt.rcParams['figure.figsize'] = (10, 6)
+    plt.rcParams['font.size'] = 10
+    return plt
+
+
+def _save(fig, plt, output_file, dpi):
+    plt.tight_layout()
+    plt.savefig(output_file, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+
+
+def render_scatter(payload, meta, output_file, dpi):
+    """Hexbin of MPRA vs prediction with linear fit and statistics box."""
+    plt = import_pyplot()
+    fig, ax = plt.subplots(figsize=(10, 10))
+
+    centers = payload['centers']
+    hexbin = ax.hexbin(centers[:, 0], centers[:, 1], C=payload['counts'],
+                       reduce_C_function=np.sum, gridsize=int(payload['gridsize']),
+                       extent=tuple(payload['extent']), cmap='YlOrRd', alpha=0.8)
+    cb = plt.colorbar(hexbin, ax=ax)
+    cb.set_label('Count', fontsize=11)
+
+    x_line, y_line = payload['fit_line']
+    ax.plot(x_line, y_line, "b-", alpha=0.8, linewidth=2, label='Linear fit')
+
+    ax.set_xlabel('MPRA Activity (log2 RNA/DNA)', fontsize=13)
+    ax.set_ylabel(f'AlphaGenome {meta["pred_col"].replace("_", " ").title()}', fontsize=13)
+    ax.set_title(meta['title'], fontsize=15, fontweight='bold', pad=15)
+
+    corr_stats = meta['corr_stats']
+    stats_text = f"N = {corr_stats['n_samples']:,}\n"
+    stats_text += f"Pearson r = {corr_stats['pearson_r']:.4f}\n"
+    stats_text += f"  p = {corr_stats['pearson_p']:.2e}\n"
+    stats_text += f"Spearman ρ = {corr_stats['spearman_r']:.4f}\n"
+    stats_text += f"  p = {corr_stats['spearman_p']:.2e}"
+    ax.text(0.05, 0.95, stats_text, transform=ax.transAxes,
+            fontsize=11, verticalalignment='top', family='monospace',
+            bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.9, pad=0.8))
+
+    ax.legend(fontsize=11)
+    ax.grid(True, alpha=0.3)
+    _save(fig, plt, output_file, dpi)
+
+
+def render_roc(payload, meta, output_file, dpi):
+    """ROC curve from pre-computed (thinned) FPR/TPR points."""
+    plt = import_pyplot()
+    fig, ax = plt.subplots(figsize=(8, 8))
+    ax.plot(payload['fpr'], payload['tpr'], color='darkorange', lw=2,
+            label=f'ROC curve (AUC = {float(payload["auc"]):.3f})')
+    ax.plot([0, 1], [0, 1], color='navy', lw=2, linestyle='--', label='Random classifier')
+
+    ax.set_xlim([0.0, 1.0])
+    ax.set_ylim([0.0, 1.05])
+    ax.set_xlabel('False Positive Rate', fontsize=12)
+    ax.set_ylabel('True Positive Rate', fontsize=12)
+    ax.set_title(meta['title'], fontsize=14, fontweight='bold')
+    ax.legend(loc="lower right", fontsize=11)
+    ax.grid(True, alpha=0.3)
+    _save(fig, plt, output_file, dpi)
+
+
+def render_heatmap(payload, meta, output_file, dpi):
+    """Annotated heatmap of a pre-computed correlation matrix."""
+    plt = import_pyplot()
+    import pandas as pd
+    import seaborn as sns
+    corr_matrix = pd.DataFrame(payload['matrix'], index=meta['labels'], columns=meta['labels'])
+    fig, ax = plt.subplots(figsize=(12, 10))
+    sns.heatmap(corr_matrix, annot=True, fmt='.3f', cmap='coolwarm', center=0,
+                square=True, linewidths=1, cbar_kws={"shrink": 0.8},
+                annot_kws={"size": 10}, ax=ax)
+    ax.set_title(meta['title'], fontsize=15, fontweight='bold', pad=20)
+    _save(fig, plt, output_file, dpi)
+
+
+def render_histogram_grid(payload, meta, output_file, dpi):
+    """Grid of histograms drawn from pre-computed counts and edges."""
+    plt = import_pyplot()
+    nrows, ncols = meta['grid']
+    fig, axes = plt.subplots(nrows, ncols, figsize=(5 * ncols, 5 * nrows))
+    axes = np.atleast_1d(axes).flatten()
+
+    for idx, name in enumerate(meta['names']):
+        ax = axes[idx]
+        edges = payload[f'edges_{idx}']
+        ax.hist(edges[:-1], bins=edges, weights=payload[f'counts_{idx}'],
+                alpha=0.7, edgecolor='black')
+        ax.set_xlabel(name, fontsize=10)
+        ax.set_ylabel('Frequency', fontsize=10)
+        ax.set_title(f'Distribution: {name} (N={meta["n"]:,})', fontsize=11, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+    for ax in axes[len(meta['names']):]:
+        ax.set_visible(False)
+    _save(fig, plt, output_file, dpi)
+
+
+def render_barh(payload, meta, output_file, dpi):
+    """Horizontal bar chart of per-group correlations (red negative, green positive)."""
+    plt = import_pyplot()
+    values = payload['values']
+    fig, ax = plt.subplots(figsize=(14, 10))
+    colors = ['red' if r < 0 else 'green' for r in values]
+    ax.barh(range(len(values)), values, color=colors, alpha=0.7)
+    ax.set_yticks(range(len(values)))
+    ax.set_yticklabels(meta['labels'], fontsize=9)
+    ax.set_xlabel(meta.get('xlabel', 'Pearson Correlation (r)'), fontsize=12)
+    ax.set_title(meta['title'], fontsize=14, fontweight='bold', pad=15)
+    ax.axvline(x=0, color='black', linestyle='--', linewidth=1)
+    ax.grid(True, alpha=0.3, axis='x')
+    _save(fig, plt, output_file, dpi)
+
+
+RENDERERS = {
+    'scatter': render_scatter,
+    'roc': render_roc,
+    'heatmap': render_heatmap,
+    'histogram_grid': render_histogram_grid,
+    'barh': render_barh,
+}
+
+
+def _render_job(job):
+    """Worker entry point: render one figure and return its file name."""
+    RENDERERS[job['kind']](job['payload'], job['meta'], job['output_file'], job['dpi'])
+    return Path(job['output_file']).name
+
+
+class FigureJob:
+    """One figure to render: renderer kind, payload key, payload and metadata."""
+
+    def __init__(self, kind, key, payload, meta, output_file):
+        self.kind = kind
+        self.key = key
+        self.payload = payload
+        self.meta = meta
+        self.output_file = Path(output_file)
+
+
+def render_figures(jobs, cache, dpi=DEFAULT_DPI, workers=None):
+    """
+    Render FigureJobs in parallel worker processes.
+
+    Figures already rendered from the same payload key and dpi are skipped.
+    Returns (rendered_names, skipped_names).
+    """
+    pending = []
+    skipped = []
+    for job in jobs:
+        # The render key covers both the binned data and the figure text
+        render_key = data_hash(job.key, meta=job.meta)
+        if cache.is_current(job.output_file, render_key, dpi):
+            skipped.append(job.output_file.name)
+            continue
+        pending.append((job, render_key))
+
+    rendered = []
+    if pending:
+        payloads = [{
+            'kind': job.kind,
+            'payload': job.payload,
+            'meta': job.meta,
+            'output_file': str(job.output_file),
+            'dpi': dpi,
+        } for job, _ in pending]
+
+        if workers == 1 or len(pending) == 1:
+            rendered = [_render_job(p) for p in payloads]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(_render_job, payloads))
+
+        for job, render_key in pending:
+            cache.mark_rendered(job.output_file, render_key, dpi)
+        cache.save_manifest()
+
+    return rendered, skipped
@@ -0,0 +1,123 @@
+"""
+Batched AlphaGenome sequence predictions
+
+Stages 02 and 05 can submit sequences in groups through the client's
+multi-sequence interface (predict_sequences) instead of one predict_sequence
+call per sequence and output type. predict_batch() sends one group, and if
+the group call fails, or returns an error for some members, only those
+members are retried one at a time. When the model is a ClientPool with
+several clients (client_pool.py), the members are instead fanned out as
+individual requests over a thread pool, each worker checking its own client
+out of the pool. Every batch's wall-clock latency is
+appended to a CSV log; latency_summary() compares batch sizes so the best
+one can be picked from measured runs. No batch size is recommended by
+default: batching stays opt-in (--batch-size 1) until those logs show a
+size that helps against the live API.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+# The client's worker threads per predict_sequences call
+DEFAULT_MAX_WORKERS = 5
+
+LATENCY_COLUMNS = [
+    'timestamp', 'batch_size', 'n_sequences', 'max_workers', 'batch_seconds', 'seconds_per_sequence',
+    'n_retried', 'n_failed_after_retry', 'batch_error',
+]
+
+
+def predict_batch(dna_model, sequences, requested_outputs, ontology_terms, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Predict a group of sequences with one predict_sequences call, or with
+    one predict_sequence request per member spread over the clients of a
+    multi-client pool (up to max_workers at a time).
+
+    Members the batch call did not return (the whole call raised, or its
+    entry is an exception) are retried individually with predict_sequence.
+
+    Returns:
+        (list with one output or Exception per sequence, latency stats dict)
+    """
+    start = time.time()
+    batch_error = None
+    n_clients = getattr(dna_model, 'n_clients', 1)
+    try:
+        if n_clients > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, n_clients)) as executor:
+                futures = [executor.submit(
+                    dna_model.predict_sequence, sequence=sequence,
+                    requested_outputs=requested_outputs, ontology_terms=ontology_terms,
+                ) for sequence in sequences]
+            outputs = [f.exception() or f.result() for f in futures]
+        else:
+            outputs = list(dna_model.predict_sequences(
+                sequences=list(sequences),
+                requested_outputs=requested_outputs,
+                ontology_terms=ontology_terms,
+                progress_bar=False,
+                max_workers=max_workers,
+            ))
+        if len(outputs) != len(sequences):
+            raise ValueError(f"predict_sequences returned {len(outputs)} outputs for {len(sequences)} sequences")
+    except Exception as e:
+        batch_error = str(e)
+        outputs = [None] * len(sequences)
+
+    failed = [i for i, output in enumerate(outputs) if output is None or isinstance(output, Exception)]
+    for i in failed:
+        try:
+            outputs[i] = dna_model.predict_sequence(
+                sequence=sequences[i],
+                requested_outputs=requested_outputs,
+                ontology_terms=ontology_terms,
+            )
+        except Exception as e:
+            outputs[i] = e
+
+    elapsed = time.time() - start
+    stats = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'n_sequences': len(sequences),
+        'max_workers': max_workers,
+        'batch_seconds': elapsed,
+        'seconds_per_sequence': elapsed / max(len(sequences), 1),
+        'n_retried': len(failed),
+        'n_failed_after_retry': sum(isinstance(output, Exception) for output in outputs),
+        'batch_error': batch_error,
+    }
+    return outputs, stats
+
+
+def log_batch_latency(log_file, stats, batch_size):
+    """
+    Append one batch's latency stats to a CSV log (header written once).
+    batch_size is the configured size; the last batch of a run may be smaller.
+    """
+    log_file = Path(log_file)
+    pd.DataFrame([{**stats, 'batch_size': batch_size}], columns=LATENCY_COLUMNS).to_csv(
+        log_file, mode='a', header=not log_file.exists(), index=False
+    )
+
+
+def latency_summary(log_file):
+    """
+    Median and p90 latency per sequence for every (batch size, workers)
+    setting in the log, fastest first. Returns None if there is no log.
+    """
+    log_file = Path(log_file)
+    if not log_file.exists():
+        return None
+    log = pd.read_csv(log_file)
+    summary = log.groupby(['batch_size', 'max_workers']).agg(
+        n_batches=('batch_seconds', 'size'),
+        median_batch_seconds=('batch_seconds', 'median'),
+        median_seconds_per_sequence=('seconds_per_sequence', 'median'),
+        p90_seconds_per_sequence=('seconds_per_sequence', lambda s: s.quantile(0.9)),
+        retried=('n_retried', 'sum'),
+        failed=('n_failed_after_retry', 'sum'),
+    ).reset_index()
+    return summary.sort_values('median_seconds_per_sequence').reset_index(drop=True)
@@ -0,0 +1,118 @@
+"""
+Prediction scheduling for stage 02
+
+In file order, stage 02 predicts all of Pool6 before any of Pool7 (and the
+chromosomes and TFs in the order the library was laid out), so a partial
+run is a biased sample and stage 03 on it is meaningless. schedule_order()
+orders the records by a policy instead:
+
+    file        input order (the default, and the original behavior)
+    stratified  proportional interleaving across strata (default: pool,
+                chromosome and primary TF). Every stratum is shuffled
+                (seeded) and consumed at a rate proportional to its size,
+                so every prefix of the schedule - every checkpoint, and
+                every --max-variants budget - has close to the full
+                library's composition
+    priority    records of the priority TFs (e.g. pparg) first, then the
+                rest; each part in stratified order
+
+The order is deterministic for a given input, policy and seed, so a
+resumed run continues the same schedule. stratified and priority are
+opt-in: runs started before they existed were in file order, and a
+resumed run must keep its original order.
+"""
+
+import numpy as np
+import pandas as pd
+
+from variant_annotations import extract_tf_names
+
+SCHEDULE_POLICIES = ('file', 'stratified', 'priority')
+DEFAULT_POLICY = 'file'
+
+# Stratum columns; 'tf' is the first TF name parsed from tf_info
+DEFAULT_STRATA = ('pool', 'chromosome', 'tf')
+DEFAULT_SEED = 0
+
+
+def stratum_labels(df, strata=DEFAULT_STRATA):
+    """String stratum label of every record (columns joined with '|')."""
+    parts = []
+    for column in strata:
+        if column == 'tf':
+            parts.append(df['tf_info'].map(lambda t: extract_tf_names(t)[0]))
+        else:
+            parts.append(df[column].astype(str))
+    labels = parts[0].astype(str)
+    for part in parts[1:]:
+        labels = labels + '|' + part.astype(str)
+    return labels.reset_index(drop=True)
+
+
+def has_priority_tf(df, priority_tfs):
+    """True for records whose tf_info names any of priority_tfs (case-insensitive)."""
+    wanted = set(tf.lower() for tf in priority_tfs)
+    return df['tf_info'].map(lambda t: bool(wanted & set(extract_tf_names(t)))).to_numpy()
+
+
+def stratified_ranks(labels, rng):
+    """
+    Interleaving key of every record: (position within its shuffled stratum
+    + jitter) / stratum size, so each stratum is spread evenly over [0, 1).
+    """
+    codes, _ = pd.factorize(labels)
+    order = rng.permutation(len(codes))
+    shuffled = codes[order]
+    position = np.empty(len(codes), dtype=np.float64)
+    # Rank of each record within its stratum, in shuffled order
+    position[order] = pd.Series(shuffled).groupby(shuffled).cumcount().to_numpy()
+    sizes = np.bincount(codes)[codes]
+    return (position + rng.random(len(codes))) / sizes
+
+
+def schedule_order(df, policy=DEFAULT_POLICY, strata=DEFAULT_STRATA, priority_tfs=None, seed=DEFAULT_SEED):
+    """
+    Row positions of df in the order they should be predicted.
+
+    Returns:
+        int64 array, a permutation of range(len(df))
+    """
+    if policy == 'file':
+        return np.arange(len(df), dtype=np.int64)
+    if policy not in SCHEDULE_POLICIES:
+        raise ValueError(f"Unknown schedule policy {policy!r}")
+
+    rng = np.random.default_rng(seed)
+    ranks = stratified_ranks(stratum_labels(df, strata), rng)
+    if policy == 'priority':
+        if not priority_tfs:
+            raise ValueError("The priority policy needs at least one priority TF")
+        # Priority records get ranks in [0, 1), the rest in [1, 2)
+        ranks = ranks + (~has_priority_tf(df, priority_tfs)).astype(np.float64)
+    return np.argsort(ranks, kind='stable').astype(np.int64)
+
+
+def composition(df, strata=DEFAULT_STRATA):
+    """Share of records per stratum column value, one row per (column, value)."""
+    rows = []
+    for column in strata:
+        values = df['tf_info'].map(lambda t: extract_tf_names(t)[0]) if column == 'tf' else df[column]
+        for value, share in values.value_counts(normalize=True).items():
+            rows.append({'stratum': column, 'value': value, 'share': share})
+    return pd.DataFrame(rows)
+
+
+def composition_table(sample, full, strata=DEFAULT_STRATA):
+    """Stratum shares of a sample next to those of the full set."""
+    merged = composition(full, strata).merge(composition(sample, strata), on=['stratum', 'value'],
+                                             how='left', suffixes=('_full', '_sample'))
+    return merged.fillna({'share_sample': 0.0})
+
+
+def composition_gap(prefix, full, strata=DEFAULT_STRATA):
+    """
+    Largest absolute difference in stratum shares between a prefix of the
+    schedule and the full set (0 = perfectly representative).
+    """
+    merged = composition_table(prefix, full, strata)
+    return float((merged['share_full'] - merged['share_sample']).abs().max())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Sharded stage 02 runs and manifest-based merge
+
+`02_run_alphagenome_predictions.py --shard i/N` predicts only the variants
+whose stable hash of variant_name falls in shard i (0 <= i < N), writing
+its checkpoints and results under outputs/02_alphagenome_predictions/shards/
+shard_{i:03d}_of_{N:03d}/ (e.g. shard_000_of_004/) together with a
+manifest.json (assigned and written row counts, a checksum of the
+variant_idx set, SHA-256 of every result file and the run options). Shards can run on different nodes or with different API
+keys.
+
+variant_name is the hash key because variant_id is shared by every mutant
+of a site: hashing it would put whole enhancers into single shards.
+
+The merge step re-derives the expected assignment from the stage 01 input,
+checks every manifest and file checksum, refuses incomplete or inconsistent
+shard sets, and writes the combined files stage 03 reads:
+
+    python prediction_shards.py --n-shards 4
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Set paths
+BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
+DATA_DIR = BASE_DIR / 'outputs' / '01_prepared_data'
+OUTPUT_DIR = BASE_DIR / 'outputs' / '02_alphagenome_predictions'
+SHARD_ROOT = OUTPUT_DIR / 'shards'
+
+# Column whose hash assigns a record to a shard (unique per construct)
+SHARD_KEY = 'variant_name'
+MANIFEST_NAME = 'manifest.json'
+
+# Per-variant result files a shard may write, concatenated on merge
+PREDICTIONS_FILE = 'alphagenome_predictions_all_variants.csv'
+MERGED_FILES = [
+    PREDICTIONS_FILE,
+    'alphagenome_predictions_by_ontology.csv',
+    'track_summaries_dnase.csv',
+    'track_summaries_rna.csv',
+    'track_summaries_cage.csv',
+    'batch_latency.csv',
+]
+
+
+def parse_shard(spec):
+    """'i/N' -> (i, N), with 0 <= i < N."""
+    try:
+        index, n_shards = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {spec!r}")
+    if n_shards < 1 or not 0 <= index < n_shards:
+        raise argparse.ArgumentTypeError(f"shard index must satisfy 0 <= i < N, got {spec!r}")
+    return index, n_shards
+
+
+def shard_of(keys, n_shards):
+    """
+    Shard number of every key. Uses BLAKE2b rather than hash(), which is
+    salted per process, so every node computes the same assignment.
+    """
+    return np.array([
+        int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big') % n_shards
+        for key in keys
+    ], dtype=np.int64)
+
+
+def shard_directory(index, n_shards):
+    """Output directory of one shard."""
+    return SHARD_ROOT / f'shard_{index:03d}_of_{n_shards:03d}'
+
+
+def file_sha256(path):
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def index_checksum(variant_idx):
+    """Order-independent checksum of a set of variant_idx values."""
+    values = np.sort(np.asarray(variant_idx, dtype=np.int64))
+    return hashlib.sha256(values.tobytes()).hexdigest()
+
+
+def write_manifest(run_dir, index, n_shards, assigned_idx, results_df, options):
+    """Record what one shard was assigned and what it wrote."""
+    files = {name: file_sha256(run_dir / name) for name in MERGED_FILES if (run_dir / name).exists()}
+    manifest = {
+        'shard': index,
+        'n_shards': n_shards,
+        'shard_key': SHARD_KEY,
+        'n_assigned': int(len(assigned_idx)),
+        'assigned_sha256': index_checksum(assigned_idx),
+        'n_rows': int(len(results_df)),
+        'n_success': int(results_df['success'].sum()),
+        'rows_sha256': index_checksum(results_df['variant_idx']),
+        'files': files,
+        'options': options,
+        'completed': datetime.now().isoformat(),
+    }
+    with open(run_dir / MANIFEST_NAME, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def expected_assignment(n_shards):
+    """
+    Re-derive every shard's records from the stage 01 input.
+
+    Returns:
+        DataFrame with variant_idx, shard and whether the sequence is
+        predictable (2048bp; stage 02 skips the others)
+    """
+    prepared = pd.read_csv(DATA_DIR / 'mpra_variants_with_2kb_sequences.csv')
+    if 'variant_idx' not in prepared.columns:
+        prepared['variant_idx'] = np.arange(len(prepared), dtype=np.int64)
+    return pd.DataFrame({
+        'variant_idx': prepared['variant_idx'].to_numpy(),
+        'shard': shard_of(prepared[SHARD_KEY], n_shards),
+        'predictable': prepared['sequence_2kb'].map(lambda s: isinstance(s, str) and len(s) == 2048).to_numpy(),
+    })
+
+
+def validate_shards(n_shards):
+    """
+    Check that all N shards are present, consistent and complete.
+
+    Returns:
+        (list of manifests ordered by shard, list of problems; empty if valid)
+    """
+    problems = []
+    manifests = []
+    expected = expected_assignment(n_shards)
+    options = None
+
+    for index in range(n_shards):
+        run_dir = shard_directory(index, n_shards)
+        manifest_file = run_dir / MANIFEST_NAME
+        if not manifest_file.exists():
+            problems.append(f"shard {index}: no manifest (not run or not finished)")
+            continue
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        manifests.append(manifest)
+
+        if manifest['n_shards'] != n_shards or manifest['shard'] != index or manifest['shard_key'] != SHARD_KEY:
+            problems.append(f"shard {index}: manifest is for shard {manifest['shard']}/{manifest['n_shards']} "
+                            f"keyed on {manifest['shard_key']}")
+            continue
+        if options is None:
+            options = manifest['options']
+        elif manifest['options'] != options:
+            problems.append(f"shard {index}: run options {manifest['options']} differ from shard 0's {options}")
+
+        for name, checksum in manifest['files'].items():
+            path = run_dir / name
+            if not path.exists():
+                problems.append(f"shard {index}: {name} listed in manifest but missing")
+            elif file_sha256(path) != checksum:
+                problems.append(f"shard {index}: {name} checksum mismatch (modified after the run?)")
+
+        mine = expected[expected['shard'] == index]
+        if manifest['assigned_sha256'] != index_checksum(mine['variant_idx']):
+            problems.append(f"shard {index}: assignment differs from the current stage 01 input "
+                            f"({manifest['n_assigned']} assigned vs {len(mine)} expected)")
+            continue
+
+        rows = pd.read_csv(run_dir / PREDICTIONS_FILE, usecols=['variant_idx'])['variant_idx']
+        if rows.duplicated().any():
+            problems.append(f"shard {index}: {int(rows.duplicated().sum())} duplicated variant_idx")
+        foreign = np.setdiff1d(rows, mine['variant_idx'])
+        missing = np.setdiff1d(mine.loc[mine['predictable'], 'variant_idx'], rows)
+        if len(foreign):
+            problems.append(f"shard {index}: {len(foreign)} rows belong to other shards")
+        if len(missing):
+            problems.append(f"shard {index}: {len(missing)} assigned variants missing "
+                            f"(first: {missing[:5].tolist()})")
+
+    return manifests, problems
+
+
+def merge_shards(n_shards):
+    """Validate all shards and write the combined stage 02 outputs."""
+    manifests, problems = validate_shards(n_shards)
+    if problems:
+        return problems
+
+    first_dir = shard_directory(0, n_shards)
+    for name in MERGED_FILES:
+        parts = [shard_directory(i, n_shards) / name for i in range(n_shards)]
+        parts = [p for p in parts if p.exists()]
+        if not parts:
+            continue
+        merged = pd.concat([pd.read_csv(p) for p in parts], ignore_index=True)
+        if 'variant_idx' in merged.columns and name != 'batch_latency.csv':
+            sort_cols = ['variant_idx', 'ontology_term'] if 'ontology_term' in merged.columns else ['variant_idx']
+            merged = merged.sort_values(sort_cols, kind='stable')
+        merged.to_csv(OUTPUT_DIR / name, index=False)
+        print(f"✓ {name}: {len(merged):,} rows from {len(parts)} shards")
+
+    # Track metadata is identical across shards; take shard 0's
+    if (first_dir / 'track_metadata.csv').exists():
+        pd.read_csv(first_dir / 'track_metadata.csv').to_csv(OUTPUT_DIR / 'track_metadata.csv', index=False)
+
+    merged_manifest = {
+        'n_shards': n_shards,
+        'shard_key': SHARD_KEY,
+        'n_rows': sum(m['n_rows'] for m in manifests),
+        'n_success': sum(m['n_success'] for m in manifests),
+        'options': manifests[0]['options'],
+        'shards': manifests,
+        'merged': datetime.now().isoformat(),
+    }
+    with open(OUTPUT_DIR / 'merge_manifest.json', 'w') as f:
+        json.dump(merged_manifest, f, indent=2)
+    return []
+
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='Validate and merge sharded stage 02 runs')
+    parser.add_argument('--n-shards', type=int, required=True,
+                        help='Number of shards the run was split into (N in --shard i/N)')
+    parser.add_argument('--check-only', action='store_true',
+                        help='Validate the shards without writing merged files')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("="*60)
+    print(f"Merging {args.n_shards} Stage 02 Shards")
+    print("="*60)
+
+    if args.check_only:
+        manifests, problems = validate_shards(args.n_shards)
+    else:
+        problems = merge_shards(args.n_shards)
+
+    if problems:
+        print(f"\n⚠ Shard set is not complete ({len(problems)} problems):")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+
+    if args.check_only:
+        print(f"\n✓ All {args.n_shards} shards present, consistent and complete")
+    else:
+        print(f"\n✓ Merged outputs written to {OUTPUT_DIR}")
+        print("\nNext step: Run 03_benchmark_correlations.py")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Throughput and latency telemetry for the prediction engine
+
+Telemetry collects, for one stage 02 run:
+
+- per-request latency for every (client method, output types) pair, as
+  p50 / p95 / p99 and as a Prometheus histogram
+- requests per second, requests in flight, errors and retries
+- cache hit rate (variant-mode requests shared between records)
+- records done, live throughput and the ETA derived from it
+
+ClientPool reports every request it makes (client_pool.py); stage 02
+reports records, retries and cache lookups. Every `interval` seconds (and
+at the end) one JSON line is appended to telemetry.jsonl and a snapshot
+is written in Prometheus textfile format, atomically, so node_exporter's
+textfile collector can pick it up.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Upper bounds (seconds) of the Prometheus latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+# Latencies kept per (method, output) pair for the quantiles; count, sum and
+# histogram buckets are exact whatever the number of requests
+RESERVOIR_SIZE = 10000
+
+DEFAULT_INTERVAL = 30.0
+TELEMETRY_FILE = 'telemetry.jsonl'
+PROMETHEUS_FILE = 'alphagenome_predictions.prom'
+
+METRIC_PREFIX = 'alphagenome_prediction'
+
+
+def format_duration(seconds):
+    """H:MM:SS from a number of seconds; hours keep counting past 24 (e.g. 31:05:00)."""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+def output_label(kwargs):
+    """Output types of a request, e.g. 'dnase' or 'dnase+rna_seq+cage'."""
+    outputs = kwargs.get('requested_outputs') or []
+    return '+'.join(str(getattr(o, 'name', o)).lower() for o in outputs) or 'none'
+
+
+class LatencyRecord:
+    """
+    Latencies of one kind of request in bounded memory: exact count, sum and
+    histogram buckets, and a uniform reservoir sample (Algorithm R) of at
+    most `size` values for the quantiles. Not thread-safe; callers lock.
+    """
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=0):
+        self.size = size
+        self.count = 0
+        self.sum = 0.0
+        self.buckets = np.zeros(len(LATENCY_BUCKETS), dtype=np.int64)
+        self.sample = []
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.buckets += np.asarray(LATENCY_BUCKETS) >= seconds
+        if len(self.sample) < self.size:
+            self.sample.append(seconds)
+        else:
+            slot = int(self._rng.integers(self.count))
+            if slot < self.size:
+                self.sample[slot] = seconds
+
+    def __len__(self):
+        return self.count
+
+    def mean(self):
+        return self.sum / self.count if self.count else float('nan')
+
+    def quantile(self, q):
+        return float(np.quantile(self.sample, q)) if self.sample else float('nan')
+
+
+class Telemetry:
+    """Thread-safe counters and latency records, flushed to JSONL and a Prometheus textfile."""
+
+    def __init__(self, jsonl_path=None, prometheus_path=None, interval=DEFAULT_INTERVAL, records_total=0):
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self.interval = interval
+        self.records_total = records_total
+        self.records_done = 0
+        self.latencies = {}
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.in_flight = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._last_flush = self._started
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method, kwargs, seconds, error=False):
+        """Record one finished request; kwargs are the client call's keyword arguments."""
+        output = output_label(kwargs)
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.errors += int(error)
+            self.latencies.setdefault((method, output), LatencyRecord()).add(seconds)
+
+    def count_retries(self, n=1):
+        with self._lock:
+            self.retries += n
+
+    def cache_lookup(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def record_done(self, n=1):
+        with self._lock:
+            self.records_done += n
+
+    def throughput(self):
+        """Records per second since the run started."""
+        return self.records_done / max(time.time() - self._started, 1e-9)
+
+    def eta_seconds(self):
+        """Seconds left at the live throughput (None before the first record)."""
+        rate = self.throughput()
+        if self.records_done == 0 or rate <= 0:
+            return None
+        return max(self.records_total - self.records_done, 0) / rate
+
+    def snapshot(self):
+        """Current telemetry as a JSON-serializable dict."""
+        with self._lock:
+            elapsed = max(time.time() - self._started, 1e-9)
+            latency = {}
+            for (method, output), record in sorted(self.latencies.items()):
+                latency[f'{method}:{output}'] = {
+                    'method': method,
+                    'output': output,
+                    'count': record.count,
+                    'sum': record.sum,
+                    **{f'p{int(q * 100)}': record.quantile(q) for q in QUANTILES},
+                    'buckets': [int(b) for b in record.buckets],
+                }
+            lookups = self.cache_hits + self.cache_misses
+            snapshot = {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'elapsed_seconds': elapsed,
+                'records_done': self.records_done,
+                'records_total': self.records_total,
+                'records_per_second': self.records_done / elapsed,
+                'requests': self.requests,
+                'requests_per_second': self.requests / elapsed,
+                'in_flight': self.in_flight,
+                'errors': self.errors,
+                'retries': self.retries,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_hit_rate': self.cache_hits / lookups if lookups else None,
+                'latency': latency,
+            }
+        snapshot['eta_seconds'] = self.eta_seconds()
+        return snapshot
+
+    def prometheus_text(self, snapshot):
+        """Snapshot in Prometheus text exposition format."""
+        p = METRIC_PREFIX
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {p}_{name} {help_text}')
+            lines.append(f'# TYPE {p}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'{p}_{name}{{{label_text}}} {value}' if label_text else f'{p}_{name} {value}')
+
+        metric('records_done', 'gauge', 'Records predicted so far', [({}, snapshot['records_done'])])
+        metric('records_total', 'gauge', 'Records scheduled in this run', [({}, snapshot['records_total'])])
+        metric('records_per_second', 'gauge', 'Live record throughput', [({}, snapshot['records_per_second'])])
+        metric('eta_seconds', 'gauge', 'Estimated seconds left at the live throughput',
+               [({}, snapshot['eta_seconds'] if snapshot['eta_seconds'] is not None else 'NaN')])
+        metric('requests_total', 'counter', 'API requests made', [({}, snapshot['requests'])])
+        metric('requests_per_second', 'gauge', 'API requests per second', [({}, snapshot['requests_per_second'])])
+        metric('in_flight_requests', 'gauge', 'API requests in flight', [({}, snapshot['in_flight'])])
+        metric('request_errors_total', 'counter', 'API requests that raised', [({}, snapshot['errors'])])
+        metric('retries_total', 'counter', 'Request and record retries', [({}, snapshot['retries'])])
+        metric('cache_hits_total', 'counter', 'Records served from a shared request', [({}, snapshot['cache_hits'])])
+        metric('cache_misses_total', 'counter', 'Records that needed their own request',
+               [({}, snapshot['cache_misses'])])
+
+        histogram = []
+        quantiles = []
+        for entry in snapshot['latency'].values():
+            labels = {'method': entry['method'], 'output': entry['output']}
+            for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+                histogram.append(({**labels, 'le': f'{bound:g}'}, count))
+            histogram.append(({**labels, 'le': '+Inf'}, entry['count']))
+            quantiles += [({**labels, 'quantile': f'{q:g}'}, entry[f'p{int(q * 100)}']) for q in QUANTILES]
+        lines.append(f'# HELP {p}_request_duration_seconds API request latency')
+        lines.append(f'# TYPE {p}_request_duration_seconds histogram')
+        for labels, count in histogram:
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f'{p}_request_duration_seconds_bucket{{{label_text}}} {count}')
+        for entry in snapshot['latency'].values():
+            label_text = f'method="{entry["method"]}",output="{entry["output"]}"'
+            lines.append(f'{p}_request_duration_seconds_sum{{{label_text}}} {entry["sum"]}')
+            lines.append(f'{p}_request_duration_seconds_count{{{label_text}}} {entry["count"]}')
+        metric('request_latency_quantile_seconds', 'gauge', 'API request latency quantiles', quantiles)
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Append a JSON line and rewrite the Prometheus textfile."""
+        snapshot = self.snapshot()
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, 'a') as f:
+                f.write(json.dumps(snapshot) + '\n')
+        if self.prometheus_path is not None:
+            # Write then rename, so the textfile collector never reads a partial file
+            tmp_path = self.prometheus_path.with_name(self.prometheus_path.name + '.tmp')
+            tmp_path.write_text(self.prometheus_text(snapshot))
+            os.replace(tmp_path, self.prometheus_path)
+        self._last_flush = time.time()
+        return snapshot
+
+    def maybe_flush(self):
+        """flush() if `interval` seconds have passed since the last one."""
+        if time.time() - self._last_flush >= self.interval:
+            return self.flush()
+        return None
+
+    def progress_line(self):
+        """One-line live status for the progress printout."""
+        snapshot = self.snapshot()
+        p95 = max((entry['p95'] for entry in snapshot['latency'].values()), default=float('nan'))
+        eta = snapshot['eta_seconds']
+        eta_str = format_duration(eta) if eta is not None else '--:--:--'
+        return (f"{snapshot['records_per_second']:.2f} rec/s | {snapshot['requests_per_second']:.2f} req/s | "
+                f"p95 {p95:.2f}s | in flight {snapshot['in_flight']} | errors {snapshot['errors']} | "
+                f"retries {snapshot['retries']} | ETA: {eta_str}")
@@ -58,6 +58,7 @@ def main():
         ('03_benchmark_correlations.py', 'Benchmark Analysis'),
         ('04_pparg_paradox_investigation.py', 'PPARγ Paradox Investigation'),
         ('05_wildtype_validation.py', 'Wildtype Validation'),
+        ('06_mutant_wt_pairing.py', 'Mutant vs WT Construct Pairing'),
     ]
     
     # Run each step
@@ -93,6 +94,9 @@ def main():
     print("    - wildtype_vs_mutant_correlations.png")
     print("    - mutation_effect_distributions.png")
     print("    - correlation_comparison_summary.csv")
+    print("  06_mutant_wt_pairing/")
+    print("    - mutant_wt_pairs.csv")
+    print("    - delta_correlations.csv")
     print("\n" + "="*70)
 
 if __name__ == '__main__':
@@ -0,0 +1,99 @@
+"""
+Fixed-width DNA sequences as uint8 arrays, and the variant window arithmetic
+
+Stage 01 builds each 2048bp input by taking a genomic window centered on the
+variant site, overwriting the middle with variant_seq, and reverse
+complementing the whole window for minus-strand variants. window_coordinates()
+is that arithmetic, shared by stage 01 (one variant at a time) and by the
+batch wild-type reconstruction in stage 05 (NumPy arrays of all variants),
+so both agree on exactly where each variant sits.
+"""
+
+import numpy as np
+
+# AlphaGenome input length (2KB)
+WINDOW_SIZE = 2048
+
+# Complement lookup on ASCII codes; anything that is not ACGT becomes N
+_COMPLEMENT = np.full(256, ord('N'), dtype=np.uint8)
+for _base, _comp in zip(b'ACGTacgt', b'TGCATGCA'):
+    _COMPLEMENT[_base] = _comp
+
+
+def window_coordinates(start, end, variant_len, window_size=WINDOW_SIZE):
+    """
+    Genomic window and variant position used by stage 01.
+
+    Works on scalars or NumPy arrays. All coordinates are 0-based; the
+    variant occupies [variant_start, variant_start + variant_len) of the
+    forward-strand window.
+
+    Returns:
+        (window_start, window_end, variant_start_in_window)
+    """
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    variant_len = np.asarray(variant_len, dtype=np.int64)
+    center = (start + end) // 2
+    window_start = center - window_size // 2
+    window_end = center + window_size // 2
+
+    # Windows that would run off the chromosome start are pinned at 0
+    clipped = window_start < 0
+    window_start = np.where(clipped, 0, window_start)
+    window_end = np.where(clipped, window_size, window_end)
+
+    variant_start = (center - window_start) - variant_len // 2
+    return window_start, window_end, variant_start
+
+
+def oriented_variant_offset(variant_start, variant_len, strand, window_size=WINDOW_SIZE):
+    """
+    Offset of the variant in the final (strand-oriented) sequence_2kb.
+    Minus-strand windows are reverse complemented, which mirrors the offset.
+    """
+    variant_start = np.asarray(variant_start, dtype=np.int64)
+    minus = np.asarray(strand) == '-'
+    return np.where(minus, window_size - (variant_start + variant_len), variant_start)
+
+
+def encode_sequences(sequences, width=WINDOW_SIZE):
+    """
+    Pack equal-length sequences into an (n, width) uint8 array of ASCII codes.
+    Sequences of any other length are left as 'N' rows and flagged.
+
+    Returns:
+        (array, boolean mask of rows with the expected length)
+    """
+    sequences = list(sequences)
+    ok = np.array([isinstance(s, str) and len(s) == width for s in sequences], dtype=bool)
+    array = np.full((len(sequences), width), ord('N'), dtype=np.uint8)
+    if ok.any():
+        joined = ''.join(s for s, good in zip(sequences, ok) if good).upper().encode('ascii')
+        array[ok] = np.frombuffer(joined, dtype=np.uint8).reshape(-1, width)
+    return array, ok
+
+
+def decode_sequences(array):
+    """Turn an (n, width) uint8 array back into a list of strings."""
+    width = array.shape[1]
+    raw = np.ascontiguousarray(array).tobytes().decode('ascii')
+    return [raw[i:i + width] for i in range(0, len(raw), width)]
+
+
+def reverse_complement_array(array):
+    """Reverse complement every row of a uint8 sequence array."""
+    return _COMPLEMENT[array[..., ::-1]]
+
+
+def gather_windows(array, offsets, length):
+    """The length-bp slice starting at offsets[i] of every row i (fancy indexing)."""
+    columns = np.asarray(offsets)[:, None] + np.arange(length)
+    return array[np.arange(len(array))[:, None], columns]
+
+
+def scatter_windows(array, offsets, values):
+    """Write values[i] into row i of array starting at offsets[i] (in place)."""
+    columns = np.asarray(offsets)[:, None] + np.arange(values.shape[1])
+    array[np.arange(len(array))[:, None], columns] = values
+    return array
@@ -0,0 +1,127 @@
+"""
+Sequential early stopping for stage 02
+
+Stage 02 pays API quota for every variant even when the benchmark
+correlations have long been pinned down. With stopping targets such as
+dnase_center=0.05 (the Pearson 95% CI of dnase_center vs MPRA must be at
+most 0.05 wide), stage 02 checks the confidence intervals of the running
+correlations after every batch of records and stops once every target is
+met. Records are drawn in the stratified schedule order
+(prediction_schedule.py), so the sample at the stopping point is a
+representative, seeded prefix of the schedule and can be reproduced with
+the same --schedule-seed / --strata and --max-variants set to the number
+of records predicted.
+
+Intervals are analytic: Fisher z with SE 1/sqrt(n-3) for Pearson r and the
+Bonett-Wright SE sqrt((1 + r^2/2)/(n-3)) for Spearman rho. rho is
+estimated on the streaming rank sketch, so its n is the number of pairs
+the sketch retains, not the number predicted. They are not adjusted for
+repeated looks, so a minimum sample size is enforced before the first
+check.
+"""
+
+import argparse
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MIN_VARIANTS = 200
+DEFAULT_CHECK_EVERY = 50
+
+STOPPING_FILE = 'early_stopping.json'
+STOPPING_TRACE_FILE = 'early_stopping_trace.csv'
+
+
+def parse_target(spec):
+    """'metric[:pearson|spearman]=width' -> (metric, method, width)."""
+    try:
+        name, width = spec.split('=')
+        metric, _, method = name.partition(':')
+        method = method or 'pearson'
+        width = float(width)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"target must look like dnase_center=0.05, got {spec!r}")
+    if method not in ('pearson', 'spearman') or width <= 0:
+        raise argparse.ArgumentTypeError(f"target needs method pearson or spearman and a positive width, got {spec!r}")
+    return metric, method, width
+
+
+def fisher_ci(r, n, confidence=DEFAULT_CONFIDENCE, spearman=False):
+    """Confidence interval of a correlation from n pairs via Fisher's z."""
+    if np.isnan(r) or n < 4:
+        return np.nan, np.nan
+    r = float(np.clip(r, -0.999999, 0.999999))
+    se = np.sqrt((1 + r * r / 2) / (n - 3)) if spearman else 1 / np.sqrt(n - 3)
+    z = np.arctanh(r)
+    half = stats.norm.ppf(0.5 + confidence / 2) * se
+    return float(np.tanh(z - half)), float(np.tanh(z + half))
+
+
+class StoppingRule:
+    """CI-width targets checked against StratifiedAccumulators."""
+
+    def __init__(self, targets, confidence=DEFAULT_CONFIDENCE, min_variants=DEFAULT_MIN_VARIANTS):
+        self.targets = list(targets)
+        self.confidence = confidence
+        self.min_variants = min_variants
+        self.trace = []
+
+    def intervals(self, accumulators):
+        """Current CI of every target, one row per target."""
+        rows = []
+        for metric, method, target in self.targets:
+            acc = accumulators.accumulators.get((metric, 'all', 'all'))
+            n = acc.n if acc is not None else 0
+            if acc is None:
+                r = np.nan
+            elif method == 'pearson':
+                r = acc.pearson()[0]
+            else:
+                # rho comes from the sketch's sample, so its CI has the sample's size
+                sketch = accumulators.sketches[(metric, 'all', 'all')]
+                r = sketch.spearman()
+                n = min(n, len(sketch.x))
+            low, high = fisher_ci(r, n, self.confidence, spearman=method == 'spearman')
+            width = high - low
+            rows.append({
+                'metric': metric, 'method': method, 'n_samples': n, 'r': r,
+                'ci_low': low, 'ci_high': high, 'ci_width': width, 'target_width': target,
+                'met': bool(n >= self.min_variants and width <= target),
+            })
+        return pd.DataFrame(rows)
+
+    def check(self, accumulators, n_predicted):
+        """Record the current intervals; True once every target is met."""
+        intervals = self.intervals(accumulators)
+        intervals.insert(0, 'n_predicted', n_predicted)
+        self.trace.append(intervals)
+        return bool(intervals['met'].all())
+
+    def trace_frame(self):
+        return pd.concat(self.trace, ignore_index=True) if self.trace else pd.DataFrame()
+
+
+def write_stopping_record(path, rule, stopped, n_predicted, n_scheduled, last_variant_idx,
+                          intervals, composition_df, schedule_options):
+    """JSON record of where and why the run stopped, with its sample composition."""
+    record = {
+        'stopped_early': bool(stopped),
+        'n_predicted': int(n_predicted),
+        'n_scheduled': int(n_scheduled),
+        'last_variant_idx': None if last_variant_idx is None else int(last_variant_idx),
+        'confidence': rule.confidence,
+        'min_variants': rule.min_variants,
+        'targets': [{'metric': m, 'method': method, 'width': w} for m, method, w in rule.targets],
+        'schedule': schedule_options,
+        'reproduce_with': f"--max-variants {int(n_predicted)}",
+        'intervals': intervals.replace({np.nan: None}).to_dict('records'),
+        'composition': composition_df.to_dict('records'),
+        'completed': datetime.now().isoformat(),
+    }
+    with open(path, 'w') as f:
+        json.dump(record, f, indent=2)
+    return record
@@ -0,0 +1,372 @@
+"""
+Online, mergeable correlation accumulators
+
+Stage 03 needs every prediction before it can compute anything. These
+accumulators let stage 02 fold each prediction in as it lands, so a partial
+benchmark summary can be refreshed at every checkpoint without re-reading
+the results written so far.
+
+- CorrelationAccumulator: Welford-style running means and co-moments for an
+  exact streaming Pearson r. Two accumulators merge exactly (Chan et al.).
+- RankSketch: a bottom-k hash sample of (x, y) pairs. Keeping the k items
+  with the smallest key hash gives a uniform sample that merges exactly
+  (union, then keep the k smallest), and Spearman's rho on the sample
+  approximates the full-data rho.
+- StratifiedAccumulators: one accumulator + sketch per (metric, stratum)
+  pair, with JSON state for checkpoint/resume.
+- PairedBootstrapAccumulator: a Poisson bootstrap of corr(x, Y1) -
+  corr(x, Y2), the streaming counterpart of
+  mpra_stats.paired_bootstrap_correlations.
+"""
+
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from variant_annotations import extract_tf_names
+
+# Sample size kept by each rank sketch
+DEFAULT_SKETCH_SIZE = 2048
+
+# Metrics benchmarked against MPRA (same as stage 03)
+PREDICTION_METRICS = [
+    ('dnase_center', 'DNase (Center)'),
+    ('dnase_mean', 'DNase (Mean)'),
+    ('rna_center', 'RNA-seq (Center)'),
+    ('rna_mean', 'RNA-seq (Mean)'),
+    ('cage_center', 'CAGE (Center)'),
+    ('cage_mean', 'CAGE (Mean)'),
+]
+
+# Column strata reported alongside the overall correlation; every TF name
+# parsed from tf_info is reported as a 'tf_name' stratum as well
+STRATA = ['strand', 'chromosome', 'pool']
+
+
+def correlation_p_value(r, n):
+    """Two-sided p-value for a correlation coefficient r from n pairs (t distribution)."""
+    if np.isnan(r) or n < 3:
+        return np.nan
+    if abs(r) >= 1.0:
+        return 0.0
+    t = r * np.sqrt((n - 2) / (1 - r * r))
+    return float(2 * stats.t.sf(abs(t), n - 2))
+
+
+class CorrelationAccumulator:
+    """Running mean, variance and covariance of (x, y) pairs."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+
+    def update(self, x, y):
+        """Add one (x, y) pair."""
+        self.n += 1
+        dx = x - self.mean_x
+        self.mean_x += dx / self.n
+        dy = y - self.mean_y
+        self.mean_y += dy / self.n
+        # Use the updated mean for one factor and the old for the other
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_xy += dx * (y - self.mean_y)
+
+    @classmethod
+    def from_arrays(cls, x, y):
+        """Accumulator of many (x, y) pairs at once (merge it into a running one)."""
+        acc = cls()
+        x = np.asarray(x, float)
+        y = np.asarray(y, float)
+        if len(x):
+            acc.n = len(x)
+            acc.mean_x, acc.mean_y = float(x.mean()), float(y.mean())
+            dx, dy = x - acc.mean_x, y - acc.mean_y
+            acc.m2_x, acc.m2_y, acc.c_xy = float(dx @ dx), float(dy @ dy), float(dx @ dy)
+        return acc
+
+    def merge(self, other):
+        """Fold another accumulator into this one (exact)."""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        self.m2_x += other.m2_x + dx * dx * self.n * other.n / n
+        self.m2_y += other.m2_y + dy * dy * self.n * other.n / n
+        self.c_xy += other.c_xy + dx * dy * self.n * other.n / n
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.n = n
+        return self
+
+    def pearson(self):
+        """Pearson r and two-sided p-value (t distribution)."""
+        if self.n < 3 or self.m2_x <= 0 or self.m2_y <= 0:
+            return np.nan, np.nan
+        r = self.c_xy / np.sqrt(self.m2_x * self.m2_y)
+        r = float(np.clip(r, -1.0, 1.0))
+        return r, correlation_p_value(r, self.n)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, state):
+        acc = cls()
+        acc.__dict__.update(state)
+        return acc
+
+
+def key_priority(key):
+    """Deterministic priority in [0, 1) for a variant key."""
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') / 2.0 ** 64
+
+
+class RankSketch:
+    """Bottom-k hash sample of (x, y) pairs for approximate Spearman rho."""
+
+    def __init__(self, k=DEFAULT_SKETCH_SIZE):
+        self.k = k
+        self.n_seen = 0
+        self.priority = []
+        self.x = []
+        self.y = []
+
+    def update(self, key, x, y):
+        """Offer one keyed pair to the sketch."""
+        self.n_seen += 1
+        self.priority.append(key_priority(key))
+        self.x.append(x)
+        self.y.append(y)
+        # Prune lazily so updates stay amortized O(1)
+        if len(self.priority) >= 2 * self.k:
+            self._prune()
+
+    def _prune(self):
+        if len(self.priority) <= self.k:
+            return
+        keep = np.argsort(self.priority, kind='stable')[:self.k]
+        self.priority = [self.priority[i] for i in keep]
+        self.x = [self.x[i] for i in keep]
+        self.y = [self.y[i] for i in keep]
+
+    def merge(self, other):
+        """Union of two sketches, keeping the k smallest priorities (exact)."""
+        self.n_seen += other.n_seen
+        self.priority += other.priority
+        self.x += other.x
+        self.y += other.y
+        self._prune()
+        return self
+
+    def spearman(self):
+        """Spearman rho on the sampled pairs."""
+        self._prune()
+        if len(self.x) < 3:
+            return np.nan
+        return float(stats.spearmanr(self.x, self.y)[0])
+
+    def to_dict(self):
+        self._prune()
+        return {'k': self.k, 'n_seen': self.n_seen,
+                'priority': self.priority, 'x': self.x, 'y': self.y}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state['k'])
+        sketch.n_seen = state['n_seen']
+        sketch.priority = list(state['priority'])
+        sketch.x = list(state['x'])
+        sketch.y = list(state['y'])
+        return sketch
+
+
+def record_strata(record):
+    """(stratum, value) pairs a result record belongs to, including 'all'."""
+    strata = [('all', 'all')]
+    for name in STRATA:
+        if name in record and not pd.isna(record[name]):
+            strata.append((name, str(record[name])))
+    for tf_name in set(extract_tf_names(record.get('tf_info'))):
+        if tf_name != 'unknown':
+            strata.append(('tf_name', tf_name))
+    return strata
+
+
+class StratifiedAccumulators:
+    """
+    Accumulator and rank sketch for every (metric, stratum, value) triple.
+
+    Records are the per-variant result dicts built in stage 02: they carry
+    the MPRA value, prediction columns and the stratum columns.
+    """
+
+    def __init__(self, mpra_col='mpra_log2_ratio', metrics=PREDICTION_METRICS,
+                 sketch_size=DEFAULT_SKETCH_SIZE):
+        self.mpra_col = mpra_col
+        self.metrics = list(metrics)
+        self.sketch_size = sketch_size
+        self.accumulators = {}
+        self.sketches = {}
+        self.state = {}
+
+    def _slot(self, metric, stratum, value):
+        key = (metric, stratum, value)
+        if key not in self.accumulators:
+            self.accumulators[key] = CorrelationAccumulator()
+            self.sketches[key] = RankSketch(self.sketch_size)
+        return key
+
+    def update(self, record, key=None):
+        """Fold one prediction record into every matching accumulator."""
+        x = record.get(self.mpra_col)
+        if x is None or pd.isna(x):
+            return
+        key = key if key is not None else record.get('variant_name', record.get('variant_id'))
+        strata = record_strata(record)
+        for metric, _ in self.metrics:
+            y = record.get(metric)
+            if y is None or pd.isna(y):
+                continue
+            for stratum, value in strata:
+                slot = self._slot(metric, stratum, value)
+                self.accumulators[slot].update(float(x), float(y))
+                self.sketches[slot].update(key, float(x), float(y))
+
+    def merge(self, other):
+        """Fold another StratifiedAccumulators into this one."""
+        for slot, acc in other.accumulators.items():
+            self._slot(*slot)
+            self.accumulators[slot].merge(acc)
+            self.sketches[slot].merge(other.sketches[slot])
+        return self
+
+    def summary(self, min_samples=10):
+        """Partial benchmark summary as a DataFrame (one row per slot)."""
+        names = dict(self.metrics)
+        rows = []
+        for slot, acc in self.accumulators.items():
+            metric, stratum, value = slot
+            if acc.n < min_samples and stratum != 'all':
+                continue
+            pearson_r, pearson_p = acc.pearson()
+            # rho is estimated on the sketch; its p-value uses the full n
+            spearman_r = self.sketches[slot].spearman()
+            spearman_p = correlation_p_value(spearman_r, acc.n)
+            rows.append({
+                'prediction_metric': names.get(metric, metric),
+                'column_name': metric,
+                'stratum': stratum,
+                'stratum_value': value,
+                'n_samples': acc.n,
+                'pearson_r': pearson_r,
+                'pearson_p': pearson_p,
+                'spearman_r_approx': spearman_r,
+                'spearman_p_approx': spearman_p,
+                'spearman_sketch_n': len(self.sketches[slot].x),
+            })
+        summary = pd.DataFrame(rows)
+        if len(summary) > 0:
+            order = {m: i for i, (m, _) in enumerate(self.metrics)}
+            summary['_order'] = summary['column_name'].map(order)
+            summary['_all'] = summary['stratum'] != 'all'
+            summary = summary.sort_values(['_all', 'stratum', 'stratum_value', '_order'])
+            summary = summary.drop(columns=['_order', '_all']).reset_index(drop=True)
+        return summary
+
+    def save(self, path, **extra):
+        """Write accumulator state (plus any extra fields) as JSON."""
+        state = {
+            **extra,
+            'mpra_col': self.mpra_col,
+            'metrics': self.metrics,
+            'sketch_size': self.sketch_size,
+            'slots': [
+                {'slot': list(slot),
+                 'accumulator': self.accumulators[slot].to_dict(),
+                 'sketch': self.sketches[slot].to_dict()}
+                for slot in self.accumulators
+            ],
+        }
+        with open(path, 'w') as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, path):
+        """Restore accumulator state written by save()."""
+        with open(path) as f:
+            state = json.load(f)
+        accs = cls(state['mpra_col'], [tuple(m) for m in state['metrics']], state['sketch_size'])
+        for entry in state['slots']:
+            slot = tuple(entry['slot'])
+            accs.accumulators[slot] = CorrelationAccumulator.from_dict(entry['accumulator'])
+            accs.sketches[slot] = RankSketch.from_dict(entry['sketch'])
+        accs.state = {k: v for k, v in state.items()
+                      if k not in ('mpra_col', 'metrics', 'sketch_size', 'slots')}
+        return accs
+
+
+class PairedBootstrapAccumulator:
+    """
+    Streaming paired bootstrap of corr(x, Y1[:, j]) - corr(x, Y2[:, j]).
+
+    A multinomial resample needs every row at once, so rows are instead
+    given an independent Poisson(1) weight per replicate (the Poisson
+    bootstrap), shared by x, Y1 and Y2 to keep the pairing. Each replicate
+    keeps only its weighted moment sums, so memory is n_boot x columns
+    whatever the number of rows. Values are shifted by the first chunk's
+    means so the sums stay well conditioned.
+    """
+
+    def __init__(self, n_boot=2000, seed=0):
+        self.n_boot = n_boot
+        self.rng = np.random.default_rng(seed)
+        self.shift = None
+        self.sums = None
+        self.n = 0
+
+    def update(self, x, Y1, Y2):
+        """Add rows (complete cases only): x of length n, Y1 and Y2 of shape (n, m)."""
+        x = np.asarray(x, float)
+        if not len(x):
+            return
+        Y = np.hstack([np.asarray(Y1, float), np.asarray(Y2, float)])
+        if self.shift is None:
+            self.shift = (x.mean(), Y.mean(axis=0))
+        x = x - self.shift[0]
+        Y = Y - self.shift[1]
+        moments = np.hstack([np.ones((len(x), 1)), x[:, None], (x * x)[:, None], Y, Y * Y, x[:, None] * Y])
+        weights = self.rng.poisson(1.0, size=(self.n_boot, len(x))).astype(float)
+        sums = weights @ moments
+        self.sums = sums if self.sums is None else self.sums + sums
+        self.n += len(x)
+
+    def result(self):
+        """Same keys as mpra_stats.paired_bootstrap_correlations."""
+        k = (self.sums.shape[1] - 3) // 3
+        m = k // 2
+        w, sx, sxx = self.sums[:, :1], self.sums[:, 1:2], self.sums[:, 2:3]
+        sy, syy, sxy = self.sums[:, 3:3 + k], self.sums[:, 3 + k:3 + 2 * k], self.sums[:, 3 + 2 * k:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = (sxy - sx * sy / w) / np.sqrt((sxx - sx * sx / w) * (syy - sy * sy / w))
+        replicates = r[:, :m] - r[:, m:]
+        low, high = np.nanpercentile(replicates, [2.5, 97.5], axis=0)
+        frac_le = np.mean(replicates <= 0, axis=0)
+        frac_ge = np.mean(replicates >= 0, axis=0)
+        return {
+            'diff_ci_low': low,
+            'diff_ci_high': high,
+            'bootstrap_p': np.minimum(1.0, 2 * np.minimum(frac_le, frac_ge)),
+            'replicates': replicates,
+        }
@@ -0,0 +1,93 @@
+"""
+Compact dtypes for the prediction tables loaded by the analysis stages
+
+With default dtypes, the stage 02 table loads every string as its own
+Python object, every coordinate as int64 and every prediction as float64,
+and the 2kb sequences (the bulk of the file) come along even though no
+analysis reads them. load_table() reads a table with:
+
+- chromosome, strand, pool and tf_info as categoricals (each value stored
+  once, rows hold small integer codes)
+- start and end as int32 (mm9 coordinates are < 2^31)
+- prediction columns - the dnase/rna/cage summaries, their wt_ and delta_
+  counterparts, per-track summaries such as dnase_center[3] and
+  per-ontology columns such as dnase_center@EFO:0002067 - as float32, the
+  precision AlphaGenome returns its tracks in
+- the 2kb sequence columns dropped unless sequences=True
+
+read_table_chunks() reads a table with the same schema chunk by chunk.
+
+MPRA measurements, identifiers, variant_seq (16 bp) and everything else
+keep the default dtypes. Numeric code that needs float64 (correlations,
+regressions) converts with .to_numpy(float) as before.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ['chromosome', 'strand', 'pool', 'tf_info']
+COORDINATE_COLUMNS = ['start', 'end']
+SEQUENCE_COLUMNS = ['sequence_2kb', 'wt_sequence_2kb', 'sequence']
+
+# e.g. dnase_center, wt_rna_max, delta_cage_mean, dnase_mean[12], rna_max@UBERON:0001157
+PREDICTION_COLUMN = re.compile(r'(wt_|delta_)?(dnase|rna|cage)_(mean|max|center)(\[\d+\])?(@.+)?')
+
+
+def is_prediction_column(name):
+    return PREDICTION_COLUMN.fullmatch(name) is not None
+
+
+def column_dtypes(columns):
+    """read_csv dtype mapping for the schema's columns among `columns`."""
+    dtypes = {}
+    for column in columns:
+        if column in CATEGORICAL_COLUMNS:
+            dtypes[column] = 'category'
+        elif is_prediction_column(column):
+            dtypes[column] = np.float32
+    return dtypes
+
+
+def load_table(path, sequences=False, usecols=None, **read_csv_kwargs):
+    """
+    Read a prediction table with the compact schema.
+
+    Args:
+        path: CSV file
+        sequences: keep the 2kb sequence columns (dropped by default)
+        usecols: only read these columns (default: all)
+        **read_csv_kwargs: passed on to pd.read_csv
+
+    Returns:
+        DataFrame with columns in file order
+    """
+    header = list(pd.read_csv(path, nrows=0).columns)
+    columns = [c for c in header
+               if (usecols is None or c in usecols) and (sequences or c not in SEQUENCE_COLUMNS)]
+    df = pd.read_csv(path, usecols=columns, dtype=column_dtypes(columns), **read_csv_kwargs)
+    return compact_coordinates(df)
+
+
+def compact_coordinates(df):
+    for column in COORDINATE_COLUMNS:
+        # Coordinates with missing values stay float64
+        if column in df.columns and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = df[column].astype(np.int32)
+    return df
+
+
+def read_table_chunks(path, chunk_size, sequences=False, usecols=None):
+    """
+    load_table() chunk_size rows at a time. Categoricals are per chunk, so
+    their categories can differ between chunks.
+
+    Yields:
+        DataFrames with columns in file order
+    """
+    header = list(pd.read_csv(path, nrows=0).columns)
+    columns = [c for c in header
+               if (usecols is None or c in usecols) and (sequences or c not in SEQUENCE_COLUMNS)]
+    for chunk in pd.read_csv(path, usecols=columns, dtype=column_dtypes(columns), chunksize=chunk_size):
+        yield compact_coordinates(chunk)
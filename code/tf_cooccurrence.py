@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+TF co-occurrence matrix and TF-pair-conditioned correlations
+
+Each MPRA construct carries one or more TF motifs (parsed from tf_info).
+With A the sparse variant × TF incidence matrix:
+
+- The full TF × TF co-occurrence matrix is the sparse product Aᵀ·A
+  (diagonal = number of variants per TF).
+- For every TF pair (i, j) with at least --min-support shared variants, the
+  variants carrying both TFs are the columns of the pair incidence matrix
+  P = A[:, I] ∘ A[:, J]. Per-pair sums of x, y, x², y² and x·y for MPRA and
+  all prediction columns come from one sparse product Pᵀ·[...], which gives
+  the Pearson r of every prediction column with MPRA conditioned on every
+  pair at once.
+
+Used by stage 04 (co-regulator hypothesis) and runnable on its own:
+
+    python tf_cooccurrence.py --min-support 20
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+
+from variant_annotations import tf_incidence_matrix
+from mpra_stats import correlation_p_values
+
+# Set paths
+BASE_DIR = Path('/mnt/work_1/gest9386/CU_Boulder/rotations/LAYER/GSE84888_MPRA')
+DATA_DIR = BASE_DIR / 'outputs' / '02_alphagenome_predictions'
+OUTPUT_DIR = BASE_DIR / 'outputs' / '04_pparg_results' / 'tf_cooccurrence'
+
+MPRA_COL = 'mpra_log2_ratio'
+PREDICTION_COLUMNS = ['dnase_center', 'dnase_mean', 'rna_center', 'rna_mean', 'cage_center', 'cage_mean']
+
+# Pairs sharing fewer variants than this get no conditioned correlation
+DEFAULT_MIN_SUPPORT = 10
+
+
+def cooccurrence_matrix(incidence, tf_names):
+    """TF × TF co-occurrence counts as a DataFrame, from the sparse product AᵀA."""
+    counts = (incidence.T @ incidence).toarray().astype(int)
+    return pd.DataFrame(counts, index=tf_names, columns=tf_names)
+
+
+def partner_counts(cooccurrence, tf):
+    """Co-occurring TFs of one TF, most frequent first (excluding the TF itself)."""
+    counts = cooccurrence.loc[tf].drop(tf)
+    return counts[counts > 0].sort_values(ascending=False)
+
+
+def supported_pairs(incidence, min_support=DEFAULT_MIN_SUPPORT):
+    """Index arrays (I, J), I < J, of TF pairs sharing at least min_support variants."""
+    counts = sparse.triu(incidence.T @ incidence, k=1).tocoo()
+    keep = counts.data >= min_support
+    return counts.row[keep], counts.col[keep]
+
+
+def pair_conditioned_correlations(df, mpra_col=MPRA_COL, pred_cols=PREDICTION_COLUMNS,
+                                  min_support=DEFAULT_MIN_SUPPORT, incidence=None, tf_names=None):
+    """
+    Pearson r of each prediction column with MPRA among variants carrying
+    both TFs of a pair, for every pair with enough support, in one batch.
+
+    Returns:
+        DataFrame with one row per (tf_a, tf_b, column_name)
+    """
+    pred_cols = list(pred_cols)
+    cols = [mpra_col] + pred_cols
+    valid = df[cols].notna().all(axis=1).to_numpy()
+    if incidence is None:
+        incidence, tf_names = tf_incidence_matrix(df['tf_info'])
+    incidence = incidence.tocsc()[valid]
+    values = df.loc[valid, cols].to_numpy(float)
+    # Center globally so the raw-moment formulas below do not lose precision
+    values = values - values.mean(axis=0)
+
+    I, J = supported_pairs(incidence, min_support)
+    if len(I) == 0:
+        return pd.DataFrame(columns=['tf_a', 'tf_b', 'column_name', 'n_variants',
+                                     'pearson_r', 'pearson_p'])
+
+    # Pair incidence: variant carries both TFs of pair k
+    pairs = incidence[:, I].multiply(incidence[:, J]).tocsc()
+
+    x, Y = values[:, :1], values[:, 1:]
+    moments = np.hstack([np.ones((len(values), 1)), x, x * x, Y, Y * Y, x * Y])
+    sums = pairs.T @ moments
+    m = len(pred_cols)
+    n = sums[:, 0]
+    sx, sxx = sums[:, 1], sums[:, 2]
+    sy, syy, sxy = sums[:, 3:3 + m], sums[:, 3 + m:3 + 2 * m], sums[:, 3 + 2 * m:]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx[:, None] * sy / n[:, None]
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n[:, None]
+        r = cov / np.sqrt(var_x[:, None] * var_y)
+    tol = 1e-12 * len(values)
+    r = np.where((var_x[:, None] > tol) & (var_y > tol), np.clip(r, -1.0, 1.0), np.nan)
+    p = correlation_p_values(r, (n - 2)[:, None])
+
+    names = np.asarray(tf_names)
+    return pd.DataFrame({
+        'tf_a': np.repeat(names[I], m),
+        'tf_b': np.repeat(names[J], m),
+        'column_name': np.tile(pred_cols, len(I)),
+        'n_variants': np.repeat(n.astype(int), m),
+        'pearson_r': r.ravel(),
+        'pearson_p': p.ravel(),
+    })
+
+
+def parse_args():
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description='TF co-occurrence and pair-conditioned correlations')
+    parser.add_argument('--min-support', type=int, default=DEFAULT_MIN_SUPPORT,
+                        help=f'Minimum shared variants per TF pair (default: {DEFAULT_MIN_SUPPORT})')
+    parser.add_argument('--metrics', nargs='+', default=PREDICTION_COLUMNS,
+                        help='Prediction columns to correlate with MPRA')
+    parser.add_argument('--tf', default=None,
+                        help='Also print the partners and pair correlations of this TF')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    print("="*60)
+    print("TF Co-occurrence Analysis")
+    print("="*60)
+
+    print("\nLoading predictions...")
+    df = pd.read_csv(DATA_DIR / 'alphagenome_predictions_all_variants.csv')
+    incidence, tf_names = tf_incidence_matrix(df['tf_info'])
+    print(f"✓ {len(df):,} variants, {len(tf_names)} TFs, {incidence.nnz:,} TF annotations")
+
+    cooccurrence = cooccurrence_matrix(incidence, tf_names)
+    cooccurrence.to_csv(OUTPUT_DIR / 'tf_cooccurrence_matrix.csv')
+    n_pairs = int((np.triu(cooccurrence.to_numpy(), k=1) > 0).sum())
+    print(f"✓ Co-occurrence matrix: {n_pairs} co-occurring TF pairs")
+
+    pair_corr = pair_conditioned_correlations(
+        df, MPRA_COL, args.metrics, args.min_support, incidence, tf_names
+    )
+    pair_corr.to_csv(OUTPUT_DIR / 'tf_pair_correlations.csv', index=False)
+    n_supported = len(pair_corr) // max(len(args.metrics), 1)
+    print(f"✓ Pair-conditioned correlations: {n_supported} pairs with ≥{args.min_support} variants")
+
+    if args.tf:
+        print(f"\nPartners of {args.tf}:")
+        print(partner_counts(cooccurrence, args.tf).head(10).to_string())
+        tf_pairs = pair_corr[(pair_corr['tf_a'] == args.tf) | (pair_corr['tf_b'] == args.tf)]
+        print(tf_pairs.to_string(index=False))
+
+    print(f"\n✓ Saved: tf_cooccurrence_matrix.csv, tf_pair_correlations.csv to {OUTPUT_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+All-TF hypothesis battery
+
+Stage 04 started as a PPARγ-only deep dive. This module runs the same
+hypothesis battery for every TF in the library, so any TF whose
+predictions anti-correlate with MPRA (the next "paradox") shows up in one
+table instead of needing its own script.
+
+Shared group indices (TF incidence and co-occurrence, chromosome codes,
+wild-type mask) are built once by build_tf_index(). TFs are then spread
+across worker processes, each of which slices the shared arrays by row
+index instead of re-filtering the DataFrame with str.contains. Every
+hypothesis produces one consolidated table with a 'tf' column:
+
+    h1_prediction_distribution  predictions, TF vs other variants
+    h2_mpra_distribution        MPRA activity, TF vs other variants
+    h3_partner_split            correlation with / without each co-occurring TF
+    h4_chromosome_correlations  per-chromosome correlation
+    h5_genomic_span             genomic span of the TF's variants per chromosome
+    h6_quartiles                predictions across MPRA activity quartiles
+    h9_adjusted_correlations    covariate-adjusted correlations
+    summary                     one row per TF, incl. h7 (inverted Q4 vs Q1)
+                                and h8 (mutant-only correlation)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
+
+from variant_annotations import tf_incidence_matrix
+from tf_cooccurrence import cooccurrence_matrix, partner_counts
+from mpra_stats import (
+    adjusted_correlations, correlation_p_values, group_pearson, pearson_columns,
+)
+
+MPRA_COL = 'mpra_log2_ratio'
+
+# Metrics compared between a TF's variants and the rest (hypotheses 1 and 6)
+DISTRIBUTION_METRICS = ['dnase_center', 'cage_center', 'rna_center']
+
+# Metrics reported in the covariate-adjusted hypothesis
+ADJUSTED_METRICS = ['dnase_center', 'dnase_mean', 'rna_center', 'rna_mean', 'cage_center', 'cage_mean']
+ADJUSTED_COVARIATES = ['pool', 'chromosome', 'strand', 'parent_enhancer']
+
+QUARTILE_LABELS = ['Q1_Low', 'Q2', 'Q3', 'Q4_High']
+
+# Subsets smaller than this get no correlation (too few points)
+MIN_VARIANTS = 10
+
+HYPOTHESES = [
+    'h1_prediction_distribution',
+    'h2_mpra_distribution',
+    'h3_partner_split',
+    'h4_chromosome_correlations',
+    'h5_genomic_span',
+    'h6_quartiles',
+    'h9_adjusted_correlations',
+    'summary',
+]
+
+# Shared context for worker processes (set once per process)
+_CONTEXT = None
+
+
+def build_tf_index(df, metric='dnase_center', min_variants=MIN_VARIANTS):
+    """
+    Precompute everything the hypotheses share, once for all TFs.
+
+    Returns a dict with the DataFrame, the MPRA/prediction arrays, the
+    per-TF row indices (from the sparse TF incidence matrix), the TF × TF
+    co-occurrence matrix, chromosome codes and the wild-type mask.
+    """
+    df = df.reset_index(drop=True)
+    incidence, tf_names = tf_incidence_matrix(df['tf_info'], min_variants=min_variants)
+    incidence = incidence.tocsc()
+    tf_rows = {
+        name: np.sort(incidence.indices[incidence.indptr[j]:incidence.indptr[j + 1]])
+        for j, name in enumerate(tf_names)
+    }
+    chrom_codes, chrom_names = pd.factorize(df['chromosome'])
+    return {
+        'df': df,
+        'metric': metric,
+        'mpra': df[MPRA_COL].to_numpy(float),
+        'pred': df[DISTRIBUTION_METRICS].to_numpy(float),
+        'primary': df[metric].to_numpy(float),
+        'start': df['start'].to_numpy(),
+        'tf_rows': tf_rows,
+        'cooccurrence': cooccurrence_matrix(incidence, tf_names),
+        'chrom_codes': chrom_codes,
+        'chrom_names': np.asarray(chrom_names),
+        'wt_mask': df['tf_info'].str.contains('wt', case=False, na=False).to_numpy(),
+        'min_variants': min_variants,
+    }
+
+
+def _pearson(x, y):
+    """Pearson r and p for one pair of vectors (NaN when too few points)."""
+    if len(x) < 3:
+        return np.nan, np.nan
+    r = pearson_columns(x, y)[0]
+    return r, correlation_p_values(r, len(x) - 2)[()]
+
+
+def _ttest(a, b):
+    if len(a) < 2 or len(b) < 2:
+        return np.nan, np.nan
+    t_stat, p_val = stats.ttest_ind(a, b)
+    return t_stat, p_val
+
+
+def mpra_quartiles(values):
+    """Quartile codes 0-3 with the same bin edges as pd.qcut(values, 4)."""
+    edges = np.quantile(values, [0.25, 0.5, 0.75])
+    return np.searchsorted(edges, values, side='left')
+
+
+def run_tf(tf, ctx):
+    """Run the full hypothesis battery for one TF. Returns {hypothesis: rows}."""
+    rows = ctx['tf_rows'][tf]
+    other = np.ones(len(ctx['mpra']), dtype=bool)
+    other[rows] = False
+    mpra, pred, primary = ctx['mpra'], ctx['pred'], ctx['primary']
+    tf_mpra, tf_primary = mpra[rows], primary[rows]
+    out = {name: [] for name in HYPOTHESES}
+
+    # H1: prediction distributions
+    for j, col in enumerate(DISTRIBUTION_METRICS):
+        t_stat, p_val = _ttest(pred[rows, j], pred[other, j])
+        out['h1_prediction_distribution'].append({
+            'tf': tf, 'metric': col, 'n_tf': len(rows), 'n_other': int(other.sum()),
+            'tf_mean': pred[rows, j].mean(), 'tf_std': pred[rows, j].std(ddof=1),
+            'other_mean': pred[other, j].mean(), 'other_std': pred[other, j].std(ddof=1),
+            't_stat': t_stat, 'p_value': p_val,
+        })
+
+    # H2: MPRA distribution
+    t_stat, p_val = _ttest(tf_mpra, mpra[other])
+    out['h2_mpra_distribution'].append({
+        'tf': tf, 'n_tf': len(rows), 'mean': tf_mpra.mean(), 'median': np.median(tf_mpra),
+        'std': tf_mpra.std(ddof=1), 'min': tf_mpra.min(), 'max': tf_mpra.max(),
+        'other_mean': mpra[other].mean(), 'other_median': np.median(mpra[other]),
+        't_stat': t_stat, 'p_value': p_val,
+    })
+
+    # H3: split by every co-occurring TF (e.g. PPARγ with / without RXR)
+    for partner in partner_counts(ctx['cooccurrence'], tf).index:
+        with_partner = np.isin(rows, ctx['tf_rows'][partner], assume_unique=True)
+        n_with = int(with_partner.sum())
+        r_with, p_with = _pearson(tf_primary[with_partner], tf_mpra[with_partner])
+        r_without, p_without = _pearson(tf_primary[~with_partner], tf_mpra[~with_partner])
+        out['h3_partner_split'].append({
+            'tf': tf, 'partner': partner, 'n_with': n_with, 'n_without': len(rows) - n_with,
+            'mpra_mean_with': tf_mpra[with_partner].mean(),
+            'mpra_mean_without': tf_mpra[~with_partner].mean() if n_with < len(rows) else np.nan,
+            'pearson_r_with': r_with, 'pearson_p_with': p_with,
+            'pearson_r_without': r_without, 'pearson_p_without': p_without,
+        })
+
+    # H4 + H5: per-chromosome correlation and genomic span, from group sums
+    codes, chrom_idx = pd.factorize(ctx['chrom_codes'][rows])
+    chrom_r, sizes = group_pearson(codes, tf_primary, tf_mpra, len(chrom_idx))
+    chrom_r = chrom_r[:, 0]
+    chrom_p = correlation_p_values(chrom_r, sizes - 2)
+    n_groups = len(chrom_idx)
+    mpra_means = np.bincount(codes, weights=tf_mpra, minlength=n_groups) / sizes
+    pred_means = np.bincount(codes, weights=tf_primary, minlength=n_groups) / sizes
+    starts = ctx['start'][rows]
+    start_min = np.full(n_groups, np.iinfo(np.int64).max)
+    start_max = np.full(n_groups, np.iinfo(np.int64).min)
+    np.minimum.at(start_min, codes, starts)
+    np.maximum.at(start_max, codes, starts)
+    for g, chrom in enumerate(ctx['chrom_names'][chrom_idx]):
+        out['h4_chromosome_correlations'].append({
+            'tf': tf, 'chromosome': chrom, 'n': int(sizes[g]),
+            'pearson_r': chrom_r[g], 'pearson_p': chrom_p[g],
+            'mpra_mean': mpra_means[g], 'prediction_mean': pred_means[g],
+        })
+        out['h5_genomic_span'].append({
+            'tf': tf, 'chromosome': chrom, 'count': int(sizes[g]),
+            'min': int(start_min[g]), 'max': int(start_max[g]),
+            'span_kb': (start_max[g] - start_min[g]) / 1000,
+        })
+
+    # H6: predictions across MPRA activity quartiles
+    quartile = mpra_quartiles(tf_mpra)
+    q_sizes = np.bincount(quartile, minlength=4)
+    for q, label in enumerate(QUARTILE_LABELS):
+        in_q = quartile == q
+        row = {'tf': tf, 'mpra_quartile': label, 'n': int(q_sizes[q])}
+        for j, col in enumerate(DISTRIBUTION_METRICS):
+            values = pred[rows[in_q], j]
+            row[f'{col}_mean'] = values.mean() if len(values) else np.nan
+            row[f'{col}_std'] = values.std(ddof=1) if len(values) > 1 else np.nan
+        row['mpra_mean'] = tf_mpra[in_q].mean() if q_sizes[q] else np.nan
+        row['mpra_min'] = tf_mpra[in_q].min() if q_sizes[q] else np.nan
+        row['mpra_max'] = tf_mpra[in_q].max() if q_sizes[q] else np.nan
+        out['h6_quartiles'].append(row)
+
+    # H7: does the primary prediction fall from the lowest to the highest quartile?
+    q1_pred = tf_primary[quartile == 0].mean() if q_sizes[0] else np.nan
+    q4_pred = tf_primary[quartile == 3].mean() if q_sizes[3] else np.nan
+
+    # H8: wild-type vs mutant constructs within the TF subset
+    is_wt = ctx['wt_mask'][rows]
+    mut_r, mut_p = _pearson(tf_primary[~is_wt], tf_mpra[~is_wt])
+
+    # H9: covariate-adjusted correlation
+    adjusted = adjusted_correlations(ctx['df'].iloc[rows], MPRA_COL, ADJUSTED_METRICS, ADJUSTED_COVARIATES)
+    adjusted.insert(0, 'tf', tf)
+    out['h9_adjusted_correlations'] = adjusted.to_dict('records')
+
+    r_val, p_val = _pearson(tf_primary, tf_mpra)
+    rho = stats.spearmanr(tf_primary, tf_mpra)[0] if len(rows) > 2 else np.nan
+    primary_adjusted = adjusted.set_index('column_name').loc[ctx['metric'], 'partial_pearson_r'] \
+        if ctx['metric'] in ADJUSTED_METRICS else np.nan
+    out['summary'].append({
+        'tf': tf, 'metric': ctx['metric'], 'n_tf': len(rows), 'n_other': int(other.sum()),
+        'pearson_r': r_val, 'pearson_p': p_val, 'spearman_r': rho,
+        'partial_pearson_r': primary_adjusted,
+        'tf_prediction_mean': tf_primary.mean(), 'other_prediction_mean': primary[other].mean(),
+        'tf_mpra_mean': tf_mpra.mean(), 'other_mpra_mean': mpra[other].mean(),
+        'q1_prediction_mean': q1_pred, 'q4_prediction_mean': q4_pred,
+        'q4_minus_q1': q4_pred - q1_pred, 'inverted': bool(q4_pred < q1_pred),
+        'n_wt': int(is_wt.sum()), 'n_mutant': int((~is_wt).sum()),
+        'mutant_pearson_r': mut_r, 'mutant_pearson_p': mut_p,
+        'paradox': bool(r_val < 0 and p_val < 0.05),
+    })
+    return out
+
+
+def _init_worker(ctx):
+    global _CONTEXT
+    _CONTEXT = ctx
+
+
+def _run_tf_worker(tf):
+    return run_tf(tf, _CONTEXT)
+
+
+def run_battery(df, tfs=None, metric='dnase_center', workers=None, min_variants=MIN_VARIANTS):
+    """
+    Run every hypothesis for every TF (or the given subset of TFs).
+
+    The shared index is built once and handed to each worker process at
+    start-up; tasks are just TF names. Returns {hypothesis: DataFrame}, each
+    with a 'tf' column, the summary sorted by Pearson r (most negative first).
+    """
+    ctx = build_tf_index(df, metric=metric, min_variants=min_variants)
+    if tfs is None:
+        tfs = sorted(ctx['tf_rows'])
+    else:
+        missing = [tf for tf in tfs if tf not in ctx['tf_rows']]
+        if missing:
+            raise ValueError(f"TFs with fewer than {min_variants} variants or not in library: {missing}")
+
+    if workers == 1 or len(tfs) == 1:
+        results = [run_tf(tf, ctx) for tf in tfs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ctx,)) as executor:
+            results = list(executor.map(_run_tf_worker, tfs, chunksize=max(1, len(tfs) // 16)))
+
+    tables = {
+        name: pd.DataFrame([row for result in results for row in result[name]])
+        for name in HYPOTHESES
+    }
+    tables['summary'] = tables['summary'].sort_values('pearson_r').reset_index(drop=True)
+    return tables
@@ -0,0 +1,98 @@
+"""
+Annotations derived from MPRA variant names
+
+Shared by the prediction and analysis stages so every stage parses TF names
+from tf_info the same way.
+"""
+
+import pandas as pd
+from scipy import sparse
+
+
+def extract_tf_names(tf_str):
+    """
+    Extract TF names from a tf_info string, filtering out numeric position codes.
+
+    Format examples: "err1_82_92_atf3", "lxr_vbp_4_1", "myb_24_38_rar"
+    We want the non-numeric TF names (atf3, lxr, vbp, myb, rar).
+    Wild-type constructs return ['wt'].
+    """
+    if pd.isna(tf_str) or tf_str == 'wt':
+        return ['wt']
+
+    parts = tf_str.split('_')
+    # Filter out numeric-only parts (position codes)
+    tf_names = [p for p in parts if not p.isdigit() and p.isalpha()]
+    return tf_names if tf_names else ['unknown']
+
+
+def parent_enhancer_key(df):
+    """
+    Key identifying the parent enhancer of each variant.
+
+    All affinity-gradient mutants of one enhancer share its genomic site
+    (chromosome, start, end, strand), so the site coordinates identify the
+    parent. Returns a string Series aligned with df.
+    """
+    return (
+        df['chromosome'].astype(str) + ':' +
+        df['start'].astype(str) + '-' +
+        df['end'].astype(str) + ':' +
+        df['strand'].astype(str)
+    )
+
+
+def parent_sequence_id(df):
+    """
+    Library sequence ID of each variant's parent enhancer (e.g. 'PPREwt_129',
+    'MAC_chr13'): the first two fields of variant_name. Used as a readable
+    label next to parent_enhancer_key().
+    """
+    return df['variant_name'].str.split('_', n=2).str[:2].str.join('_')
+
+
+def construct_parent_name(df):
+    """
+    Name of the parent (wild-type) construct of each MPRA construct.
+
+    Mutant names are '{parent}_{tf_info}'. Wild-type constructs are either
+    the bare parent name (MAC_...) or '{parent}_wt' (PPREwt_...), so
+    stripping a trailing '_{tf_info}' gives the parent for every row.
+    """
+    return pd.Series([
+        name[:-len(tf) - 1] if isinstance(tf, str) and name.endswith('_' + tf) else name
+        for name, tf in zip(df['variant_name'], df['tf_info'])
+    ], index=df.index)
+
+
+def is_wildtype_construct(df):
+    """True for wild-type constructs (tf_info 'wt')."""
+    return df['tf_info'].fillna('').str.lower().eq('wt')
+
+
+def tf_incidence_matrix(tf_info, min_variants=1):
+    """
+    Sparse variant × TF incidence matrix built from tf_info strings.
+
+    Entry (i, j) is 1 if TF j appears in the tf_info of variant i. Wild-type
+    and unparseable entries ('wt', 'unknown') get no TF column.
+
+    Returns:
+        (scipy.sparse.csr_matrix of shape (n_variants, n_tfs), list of TF names)
+    """
+    tf_lists = [set(extract_tf_names(t)) - {'wt', 'unknown'} for t in tf_info]
+    tf_names = sorted(set().union(*tf_lists)) if tf_lists else []
+    tf_index = {name: j for j, name in enumerate(tf_names)}
+
+    pairs = [(i, tf_index[name]) for i, names in enumerate(tf_lists) for name in names]
+    rows = [i for i, _ in pairs]
+    cols = [j for _, j in pairs]
+    incidence = sparse.csr_matrix(
+        ([1.0] * len(pairs), (rows, cols)), shape=(len(tf_lists), len(tf_names))
+    )
+
+    if min_variants > 1:
+        keep = [j for j, n in enumerate(incidence.getnnz(axis=0)) if n >= min_variants]
+        incidence = incidence[:, keep]
+        tf_names = [tf_names[j] for j in keep]
+    return incidence, tf_names